@@ -57,6 +57,28 @@ INSERT INTO `CITY` (`Name`, `Latitude`, `Longitude`, `Country`, `Region`) VALUES
 
 -- --------------------------------------------------------
 
+--
+-- Hôtels de la chaîne. Shard : instance MySQL qui porte les chambres et réservations de
+-- l'hôtel (DB_SHARDS, voir streamlit-app/shards.py) ; la table est présente sur chaque
+-- instance, celle du shard 1 fait foi. MovingTo : shard cible d'un déplacement en cours
+-- (shards.py --move) ; les réservations de l'hôtel sont alors refusées en écriture.
+--
+
+CREATE TABLE `HOTEL` (
+  `CodH` int NOT NULL,
+  `Name` varchar(64) NOT NULL,
+  `City_Address` varchar(32) NOT NULL,
+  `Shard` int NOT NULL DEFAULT 1,
+  `MovingTo` int DEFAULT NULL,
+  PRIMARY KEY (`CodH`),
+  FOREIGN KEY (`City_Address`) REFERENCES `CITY` (`Name`)
+);
+
+INSERT INTO `HOTEL` (`CodH`, `Name`, `City_Address`, `Shard`) VALUES
+(1, 'Grand Hotel Ville1', 'Ville1', 1);
+
+-- --------------------------------------------------------
+
 CREATE TABLE `TRAVEL_AGENCY` (
   `CodA` int NOT NULL,
   `WebSite` varchar(32) DEFAULT NULL,
@@ -98,7 +120,10 @@ CREATE TABLE `ROOM` (
   `Floor` int NOT NULL,
   `SurfaceArea` int NOT NULL,
   `Type` varchar(32) NOT NULL,
-  PRIMARY KEY (`CodR`)
+  `HOTEL_CodH` int NOT NULL DEFAULT 1,
+  PRIMARY KEY (`CodR`),
+  KEY `idx_room_hotel` (`HOTEL_CodH`),
+  FOREIGN KEY (`HOTEL_CodH`) REFERENCES `HOTEL` (`CodH`)
 );
 --
 -- Dump des donnÈes pour la table `ROOM`
@@ -194,7 +219,12 @@ CREATE TABLE `BOOKING` (
   `EndDate` varchar(32) NOT NULL,
   `Cost` double NOT NULL,
   `TRAVEL_AGENCY_CodA` int NOT NULL,
+  `HOTEL_CodH` int NOT NULL DEFAULT 1,
   PRIMARY KEY (ROOM_CodR, StartDate),
+  KEY `idx_booking_start` (StartDate),
+  KEY `idx_booking_hotel_start` (HOTEL_CodH, StartDate),
+  KEY `idx_booking_agency_start` (TRAVEL_AGENCY_CodA, StartDate),
+  KEY `idx_booking_cost` (Cost),
   FOREIGN KEY (ROOM_CodR) REFERENCES ROOM(CodR),
   FOREIGN KEY (TRAVEL_AGENCY_CodA) REFERENCES TRAVEL_AGENCY(CodA)
 );
@@ -219,3 +249,132 @@ INSERT INTO `BOOKING` (`ROOM_CodR`, `StartDate`, `EndDate`, `Cost`, `TRAVEL_AGEN
 (8, '2023-12-11', '2023-12-14', 710, 4);
 
 -- --------------------------------------------------------
+
+--
+-- Archive des réservations des années clôturées (alimentée par streamlit-app/archive.py)
+-- Partitionnée par année de StartDate ; sans clés étrangères, que MySQL interdit sur
+-- les tables partitionnées. archive.py ajoute une partition par année archivée.
+--
+
+CREATE TABLE `BOOKING_ARCHIVE` (
+  `ROOM_CodR` int NOT NULL,
+  `StartDate` varchar(32) NOT NULL,
+  `EndDate` varchar(32) NOT NULL,
+  `Cost` double NOT NULL,
+  `TRAVEL_AGENCY_CodA` int NOT NULL,
+  `HOTEL_CodH` int NOT NULL DEFAULT 1,
+  PRIMARY KEY (ROOM_CodR, StartDate)
+)
+PARTITION BY RANGE COLUMNS (StartDate) (
+  PARTITION p_old VALUES LESS THAN ('2023-01-01'),
+  PARTITION p_max VALUES LESS THAN (MAXVALUE)
+);
+
+-- --------------------------------------------------------
+
+--
+-- Journal des modifications (CDC), alimenté par les triggers ci-dessous et lu par streamlit-app/changefeed.py
+--
+
+CREATE TABLE `CHANGE_LOG` (
+  `Seq` bigint NOT NULL AUTO_INCREMENT,
+  `TableName` varchar(32) NOT NULL,
+  `Op` char(1) NOT NULL,
+  `RowKey` varchar(64) NOT NULL,
+  `ChangedAt` timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+  PRIMARY KEY (`Seq`),
+  KEY `idx_change_log_changed_at` (`ChangedAt`)
+);
+
+-- A key change on UPDATE is logged as a delete of the old key followed by an upsert of the new one
+CREATE TRIGGER `trg_booking_ins` AFTER INSERT ON `BOOKING` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('BOOKING', 'I', CONCAT(NEW.ROOM_CodR, '|', NEW.StartDate));
+CREATE TRIGGER `trg_booking_upd` AFTER UPDATE ON `BOOKING` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey)
+  SELECT 'BOOKING', 'D', CONCAT(OLD.ROOM_CodR, '|', OLD.StartDate) FROM DUAL
+  WHERE OLD.ROOM_CodR <> NEW.ROOM_CodR OR OLD.StartDate <> NEW.StartDate
+  UNION ALL
+  SELECT 'BOOKING', 'U', CONCAT(NEW.ROOM_CodR, '|', NEW.StartDate) FROM DUAL;
+CREATE TRIGGER `trg_booking_del` AFTER DELETE ON `BOOKING` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('BOOKING', 'D', CONCAT(OLD.ROOM_CodR, '|', OLD.StartDate));
+
+CREATE TRIGGER `trg_room_ins` AFTER INSERT ON `ROOM` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('ROOM', 'I', NEW.CodR);
+CREATE TRIGGER `trg_room_upd` AFTER UPDATE ON `ROOM` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey)
+  SELECT 'ROOM', 'D', OLD.CodR FROM DUAL WHERE OLD.CodR <> NEW.CodR
+  UNION ALL
+  SELECT 'ROOM', 'U', NEW.CodR FROM DUAL;
+CREATE TRIGGER `trg_room_del` AFTER DELETE ON `ROOM` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('ROOM', 'D', OLD.CodR);
+
+CREATE TRIGGER `trg_agency_ins` AFTER INSERT ON `TRAVEL_AGENCY` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('TRAVEL_AGENCY', 'I', NEW.CodA);
+CREATE TRIGGER `trg_agency_upd` AFTER UPDATE ON `TRAVEL_AGENCY` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey)
+  SELECT 'TRAVEL_AGENCY', 'D', OLD.CodA FROM DUAL WHERE OLD.CodA <> NEW.CodA
+  UNION ALL
+  SELECT 'TRAVEL_AGENCY', 'U', NEW.CodA FROM DUAL;
+CREATE TRIGGER `trg_agency_del` AFTER DELETE ON `TRAVEL_AGENCY` FOR EACH ROW
+  INSERT INTO CHANGE_LOG (TableName, Op, RowKey) VALUES ('TRAVEL_AGENCY', 'D', OLD.CodA);
+
+-- A booking belongs to its room's hotel: writers only give the room.
+-- While the hotel is being moved to another shard (HOTEL.MovingTo), its bookings are
+-- read-only, except for the mover's own connections (@hotel_move set).
+DELIMITER $$
+CREATE TRIGGER `trg_booking_hotel_ins` BEFORE INSERT ON `BOOKING` FOR EACH ROW
+BEGIN
+  SET NEW.HOTEL_CodH = COALESCE((SELECT HOTEL_CodH FROM ROOM WHERE CodR = NEW.ROOM_CodR), NEW.HOTEL_CodH);
+  IF @hotel_move IS NULL AND (SELECT MovingTo FROM HOTEL WHERE CodH = NEW.HOTEL_CodH) IS NOT NULL THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Hotel en cours de deplacement : reessayez dans quelques instants';
+  END IF;
+END$$
+CREATE TRIGGER `trg_booking_hotel_upd` BEFORE UPDATE ON `BOOKING` FOR EACH ROW
+BEGIN
+  SET NEW.HOTEL_CodH = COALESCE((SELECT HOTEL_CodH FROM ROOM WHERE CodR = NEW.ROOM_CodR), NEW.HOTEL_CodH);
+  IF @hotel_move IS NULL AND (SELECT COUNT(MovingTo) FROM HOTEL WHERE CodH IN (OLD.HOTEL_CodH, NEW.HOTEL_CodH)) > 0 THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Hotel en cours de deplacement : reessayez dans quelques instants';
+  END IF;
+END$$
+CREATE TRIGGER `trg_booking_hotel_del` BEFORE DELETE ON `BOOKING` FOR EACH ROW
+BEGIN
+  IF @hotel_move IS NULL AND (SELECT MovingTo FROM HOTEL WHERE CodH = OLD.HOTEL_CodH) IS NOT NULL THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Hotel en cours de deplacement : reessayez dans quelques instants';
+  END IF;
+END$$
+DELIMITER ;
+
+--
+-- Tables de synthèse (rafraîchies en arrière-plan par streamlit-app/refresher.py)
+--
+
+CREATE TABLE `MV_AGENCY_PERF` (
+  `agence` int NOT NULL,
+  `total_reservations` int NOT NULL,
+  `chiffre_affaires` double NOT NULL,
+  PRIMARY KEY (`agence`)
+);
+
+CREATE TABLE `MV_PREMIUM_ROOMS` (
+  `Mois` varchar(7) NOT NULL,
+  `ROOM_CodR` int NOT NULL,
+  `Type` varchar(32) NOT NULL,
+  `Floor` int NOT NULL,
+  `SurfaceArea` int NOT NULL,
+  `Cout_Moyen` double DEFAULT NULL,
+  PRIMARY KEY (`Mois`, `ROOM_CodR`)
+);
+
+CREATE TABLE `MV_DASHBOARD_TOTALS` (
+  `total_rooms` int NOT NULL,
+  `total_bookings` int NOT NULL,
+  `total_agencies` int NOT NULL,
+  `revenue` double NOT NULL
+);
+
+CREATE TABLE `MV_FRESHNESS` (
+  `ViewName` varchar(32) NOT NULL,
+  `RefreshedAt` datetime NOT NULL,
+  `DurationMs` int NOT NULL,
+  PRIMARY KEY (`ViewName`)
+);
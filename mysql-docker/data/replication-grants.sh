@@ -0,0 +1,9 @@
+#!/bin/bash
+# Runs once on the first start of the primary, after the image has created MYSQL_USER.
+# The app user reads `SHOW REPLICA STATUS` on replicas to check their lag. Granted here
+# rather than on the replica: the user and its grants reach replicas through replication.
+set -e
+
+mysql -uroot -p"$MYSQL_ROOT_PASSWORD" <<SQL
+GRANT REPLICATION CLIENT ON *.* TO '${MYSQL_USER}'@'%';
+SQL
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Runs once on the first start of the mysql-replica container (docker-compose profile "replica").
+# Schema, data and the app user (with its grants, see ../data/replication-grants.sh)
+# arrive through GTID replication from the primary.
+set -e
+
+mysql -uroot -p"$MYSQL_ROOT_PASSWORD" <<SQL
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'mysql',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'root',
+    SOURCE_PASSWORD = '${MYSQL_ROOT_PASSWORD}',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+START REPLICA;
+SQL
@@ -0,0 +1,14 @@
+--
+-- Shard supplémentaire (docker-compose profile "shards") : même schéma et mêmes tables de
+-- référence que le shard 1 (1-schema.sql), sans chambres ni réservations. Les hôtels y
+-- arrivent par python shards.py --move HOTEL SHARD.
+--
+
+USE `hotel`;
+
+DELETE FROM `BOOKING`;
+DELETE FROM `BOOKING_ARCHIVE`;
+DELETE FROM `HAS_AMENITIES`;
+DELETE FROM `HAS_SPACES`;
+DELETE FROM `ROOM`;
+DELETE FROM `CHANGE_LOG`;
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+
+import pandas as pd
+
+import shards
+from archive import ALL_BOOKINGS
+from startup import lazy_import
+
+duckdb = lazy_import("duckdb")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.environ.get("ANALYTICS_SNAPSHOT_DIR", os.path.join(BASE_DIR, ".cache", "analytics"))
+ANALYTICS_SNAPSHOT_TTL = int(os.environ.get("ANALYTICS_SNAPSHOT_TTL", 300))
+
+MANIFEST = os.path.join(SNAPSHOT_DIR, "manifest.json")
+PARTITIONS_DIR = os.path.join(SNAPSHOT_DIR, "booking")
+
+logger = logging.getLogger(__name__)
+
+_refresh_lock = threading.Lock()
+_duck = {"conn": None, "version": None}
+_duck_lock = threading.Lock()
+
+# ======================== SNAPSHOT (MySQL -> Parquet) ========================
+# Snapshot reads run in the background and scan whole months: no statement budget.
+# BOOKING and BOOKING_ARCHIVE joined with ROOM and TRAVEL_AGENCY, one Parquet file per
+# StartDate month; the Archived column lets queries keep to the hot years.
+# A refresh compares per-month checksums and only rewrites the months that changed.
+# With several shards, each month gathers its rows from all of them; the checksums merge
+# exactly (counts add up, BIT_XOR of CRCs is associative).
+_MONTH_MERGE = {"by": ["ym"], "agg": {"n": "sum", "crc": "bit_xor"}}
+
+def sql_month_checksums(where_sql=""):
+    return f"""
+SELECT
+    LEFT(B.StartDate, 7) AS ym,
+    COUNT(*) AS n,
+    BIT_XOR(CRC32(CONCAT_WS('|', B.ROOM_CodR, B.StartDate, B.EndDate, B.Cost, B.TRAVEL_AGENCY_CodA, B.Archived))) AS crc
+FROM {ALL_BOOKINGS} B
+{where_sql}
+GROUP BY ym
+"""
+
+sql_dimension_checksum = """
+SELECT
+    (SELECT BIT_XOR(CRC32(CONCAT_WS('|', CodR, Floor, SurfaceArea, Type))) FROM ROOM) AS rooms,
+    (SELECT BIT_XOR(CRC32(CONCAT_WS('|', CodA, City_Address))) FROM TRAVEL_AGENCY) AS agencies
+"""
+
+sql_month_rows = f"""
+SELECT
+    B.ROOM_CodR,
+    B.StartDate,
+    B.EndDate,
+    B.Cost,
+    B.TRAVEL_AGENCY_CodA,
+    B.Archived,
+    R.Type,
+    R.Floor,
+    R.SurfaceArea,
+    T.City_Address
+FROM {ALL_BOOKINGS} B
+JOIN ROOM R ON B.ROOM_CodR = R.CodR
+JOIN TRAVEL_AGENCY T ON B.TRAVEL_AGENCY_CodA = T.CodA
+WHERE LEFT(B.StartDate, 7) = %s
+"""
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"months": {}, "dimensions": None, "refreshed_at": 0}
+
+
+def _write_manifest(manifest):
+    tmp = f"{MANIFEST}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST)
+
+
+def _partition_path(ym):
+    return os.path.join(PARTITIONS_DIR, f"{ym}.parquet")
+
+
+def _write_partition(ym, route="replica"):
+    df = shards.gather(sql_month_rows, [ym], route=route, timeout=None)
+    df["StartDate"] = pd.to_datetime(df["StartDate"], format="%Y-%m-%d", errors="coerce")
+    df["EndDate"] = pd.to_datetime(df["EndDate"], format="%Y-%m-%d", errors="coerce")
+    df["Archived"] = df["Archived"].astype(bool)
+    tmp = f"{_partition_path(ym)}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, _partition_path(ym))
+
+
+def refresh_snapshot():
+    # Returns the number of month partitions rewritten or removed
+    os.makedirs(PARTITIONS_DIR, exist_ok=True)
+    with _refresh_lock, open(os.path.join(SNAPSHOT_DIR, ".lock"), "w") as lock_file:
+        # Another process on this host may be refreshing the same snapshot
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        manifest = _read_manifest()
+        sums = shards.query(sql_month_checksums(), route="replica", timeout=None, **_MONTH_MERGE)
+        current = {row.ym: [int(row.n), int(row.crc)] for row in sums.itertuples()}
+        dims = shards.query(
+            sql_dimension_checksum, route="replica", agg={"rooms": "bit_xor", "agencies": "max"}
+        ).iloc[0]
+        dimensions = [int(dims["rooms"] or 0), int(dims["agencies"] or 0)]
+
+        if dimensions != manifest["dimensions"]:
+            stale = set(current)
+        else:
+            stale = {ym for ym, sig in current.items() if manifest["months"].get(ym) != sig}
+        removed = set(manifest["months"]) - set(current)
+
+        for ym in sorted(stale):
+            _write_partition(ym)
+        for ym in removed:
+            try:
+                os.remove(_partition_path(ym))
+            except FileNotFoundError:
+                pass
+
+        _write_manifest({"months": current, "dimensions": dimensions, "refreshed_at": time.time()})
+
+    if stale or removed:
+        logger.info("analytics snapshot: %d month(s) rewritten, %d removed", len(stale), len(removed))
+    return len(stale) + len(removed)
+
+
+def patch_months(months):
+    # Incremental update from the change feed: rewrite only the given StartDate months
+    if not months or snapshot_age() is None:
+        return 0
+    placeholders = ", ".join(["%s"] * len(months))
+    with _refresh_lock, open(os.path.join(SNAPSHOT_DIR, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        manifest = _read_manifest()
+        sums = shards.query(
+            sql_month_checksums(f"WHERE LEFT(B.StartDate, 7) IN ({placeholders})"),
+            sorted(months),
+            route="primary",
+            timeout=None,
+            **_MONTH_MERGE,
+        )
+        current = {row.ym: [int(row.n), int(row.crc)] for row in sums.itertuples()}
+
+        for ym in months:
+            if ym in current:
+                _write_partition(ym, route="primary")
+                manifest["months"][ym] = current[ym]
+            else:
+                manifest["months"].pop(ym, None)
+                try:
+                    os.remove(_partition_path(ym))
+                except FileNotFoundError:
+                    pass
+
+        manifest["refreshed_at"] = time.time()
+        _write_manifest(manifest)
+    return len(months)
+
+
+def mark_stale():
+    # ROOM or TRAVEL_AGENCY changed: every partition embeds their columns, rebuild in the background
+    if snapshot_age() is not None:
+        threading.Thread(target=_refresh_in_background, name="analytics-snapshot", daemon=True).start()
+
+
+def snapshot_age():
+    refreshed_at = _read_manifest()["refreshed_at"]
+    return None if not refreshed_at else max(0.0, time.time() - refreshed_at)
+
+
+def _refresh_in_background():
+    try:
+        refresh_snapshot()
+    except Exception as e:
+        logger.warning("analytics snapshot refresh failed: %s", e)
+
+
+def ensure_snapshot():
+    # Builds the snapshot synchronously the first time, then refreshes it in the background
+    age = snapshot_age()
+    if age is None:
+        refresh_snapshot()
+    elif age > ANALYTICS_SNAPSHOT_TTL and not _refresh_lock.locked():
+        threading.Thread(target=_refresh_in_background, name="analytics-snapshot", daemon=True).start()
+
+
+# ======================== QUERIES (DuckDB) ========================
+
+# Used while the snapshot has no partition yet: read_parquet fails on an empty glob
+_EMPTY_BOOKINGS = """
+SELECT
+    NULL::INTEGER AS ROOM_CodR, NULL::TIMESTAMP AS StartDate, NULL::TIMESTAMP AS EndDate,
+    NULL::DOUBLE AS Cost, NULL::INTEGER AS TRAVEL_AGENCY_CodA, NULL::BOOLEAN AS Archived, NULL::VARCHAR AS Type,
+    NULL::INTEGER AS Floor, NULL::INTEGER AS SurfaceArea, NULL::VARCHAR AS City_Address
+WHERE false
+"""
+
+
+def _cursor():
+    # One in-process DuckDB database; the view is recreated when the snapshot changes
+    version = _read_manifest()["refreshed_at"]
+    with _duck_lock:
+        if _duck["conn"] is None:
+            _duck["conn"] = duckdb.connect(database=":memory:")
+        if _duck["version"] != version:
+            if any(name.endswith(".parquet") for name in os.listdir(PARTITIONS_DIR)):
+                glob = os.path.join(PARTITIONS_DIR, "*.parquet").replace("'", "''")
+                source = f"read_parquet('{glob}')"
+            else:
+                source = f"({_EMPTY_BOOKINGS})"
+            _duck["conn"].execute(f"""
+                CREATE OR REPLACE VIEW bookings AS
+                SELECT
+                    *,
+                    CAST(StartDate AS DATE) AS start_d,
+                    CAST(EndDate AS DATE) AS end_d,
+                    Cost / NULLIF(date_diff('day', CAST(StartDate AS DATE), CAST(EndDate AS DATE)), 0) AS daily
+                FROM {source}
+            """)
+            _duck["version"] = version
+        return _duck["conn"].cursor()
+
+
+def _where(agence=None, date_debut=None, date_fin=None, include_archive=False):
+    clauses = ["1=1"] if include_archive else ["NOT Archived"]
+    params = []
+    if agence is not None:
+        clauses.append("TRAVEL_AGENCY_CodA = ?")
+        params.append(int(agence))
+    if date_debut:
+        clauses.append("start_d >= ?")
+        params.append(date_debut)
+    if date_fin:
+        clauses.append("end_d <= ?")
+        params.append(date_fin)
+    return "WHERE " + " AND ".join(clauses), params
+
+
+def run_analytics(sql, params=None) -> pd.DataFrame:
+    ensure_snapshot()
+    return _cursor().execute(sql, params or []).df()
+
+
+def record_batches(sql, params=None, rows=100_000):
+    # Streaming variant for large scans: an Arrow reader yielding `rows` rows at a time
+    ensure_snapshot()
+    return _cursor().execute(sql, params or []).fetch_record_batch(rows)
+
+
+def snapshot_version():
+    # Changes whenever the snapshot is refreshed or patched
+    return _read_manifest()["refreshed_at"]
+
+
+def monthly(agence=None, date_debut=None, date_fin=None, include_archive=False):
+    where, params = _where(agence, date_debut, date_fin, include_archive)
+    return run_analytics(f"""
+        SELECT
+            strftime(start_d, '%Y-%m') AS YM,
+            AVG(daily) AS Cout_Journalier_Moyen
+        FROM bookings
+        {where}
+        GROUP BY YM
+        ORDER BY YM
+    """, params)
+
+
+def premium(agence=None, date_debut=None, date_fin=None, include_archive=False):
+    where, params = _where(agence, date_debut, date_fin, include_archive)
+    return run_analytics(f"""
+        SELECT
+            strftime(start_d, '%Y-%m') AS Mois,
+            ROOM_CodR,
+            ANY_VALUE(Type) AS Type,
+            ANY_VALUE(Floor) AS Floor,
+            ANY_VALUE(SurfaceArea) AS SurfaceArea,
+            AVG(daily) AS Cout_Moyen
+        FROM bookings
+        {where}
+        GROUP BY Mois, ROOM_CodR
+        ORDER BY Cout_Moyen DESC NULLS LAST
+    """, params)
+
+
+def agency_perf(agence=None, date_debut=None, date_fin=None, include_archive=False):
+    where, params = _where(agence, date_debut, date_fin, include_archive)
+    return run_analytics(f"""
+        SELECT
+            TRAVEL_AGENCY_CodA AS Agence,
+            COUNT(*) AS Nb_Reservations,
+            SUM(Cost) AS CA
+        FROM bookings
+        {where}
+        GROUP BY TRAVEL_AGENCY_CodA
+        ORDER BY CA DESC
+    """, params)
@@ -0,0 +1,501 @@
+import os
+import json
+import time
+import base64
+import contextlib
+import hashlib
+import logging
+import contextvars
+from datetime import date
+from urllib.parse import parse_qsl
+from email.utils import formatdate, parsedate_to_datetime
+
+import pandas as pd
+from mysql.connector import Error
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+import db
+import shards
+import revenue
+import analytics
+import changefeed
+from db import run_query, DatabaseUnavailable, QueryTimeout
+from refresher import read_view
+from utils import setup_logging, set_context
+
+# JSON API for partner agencies, served apart from the Streamlit UI:
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 2
+# Every key is bound to one agency (API_KEYS="3:key-for-agency-3,7:key-for-agency-7");
+# an agency only sees and changes its own bookings.
+# Lists are read from every shard and merged (shards.query); a booking is read and
+# written on the shard of its room's hotel.
+API_KEYS = {
+    key.strip(): int(code)
+    for code, _, key in (entry.partition(":") for entry in os.environ.get("API_KEYS", "").split(","))
+    if key.strip()
+}
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 50))
+API_MAX_PAGE_SIZE = 500
+API_MAX_BATCH = int(os.environ.get("API_MAX_BATCH", 100))
+
+logger = logging.getLogger(__name__)
+
+# Agency of the request being handled, read by the read-your-writes session provider
+_agency_var = contextvars.ContextVar("api_agency", default=None)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ======================== SQL QUERIES ========================
+
+sql_free_rooms = """
+SELECT R.CodR AS room, R.Type AS type, R.Floor AS floor, R.SurfaceArea AS surface
+FROM ROOM R
+WHERE R.CodR > %s {type_filter}
+  AND R.CodR NOT IN (
+      SELECT ROOM_CodR FROM BOOKING WHERE NOT (EndDate <= %s OR StartDate >= %s)
+  )
+ORDER BY R.CodR
+LIMIT %s
+"""
+
+# Keyset pagination along idx_booking_agency_start (TRAVEL_AGENCY_CodA, StartDate)
+sql_agency_bookings = """
+SELECT ROOM_CodR AS room, StartDate AS start, EndDate AS end, Cost AS cost
+FROM BOOKING
+WHERE TRAVEL_AGENCY_CodA = %s AND StartDate >= %s AND StartDate < %s
+  AND (StartDate, ROOM_CodR) > (%s, %s)
+ORDER BY StartDate, ROOM_CodR
+LIMIT %s
+"""
+
+sql_booking = """
+SELECT ROOM_CodR AS room, StartDate AS start, EndDate AS end, Cost AS cost
+FROM BOOKING
+WHERE ROOM_CodR = %s AND StartDate = %s AND TRAVEL_AGENCY_CodA = %s
+"""
+
+# Availability is checked by the insert itself, not in a separate request
+sql_create = """
+INSERT INTO BOOKING (ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA)
+SELECT %s, %s, %s, %s, %s FROM DUAL
+WHERE NOT EXISTS (
+    SELECT 1 FROM BOOKING WHERE ROOM_CodR = %s AND NOT (EndDate <= %s OR StartDate >= %s)
+)
+"""
+
+# MySQL cannot read the updated table in a subquery; the derived table is materialized first
+sql_update = """
+UPDATE BOOKING SET EndDate = %s, Cost = %s
+WHERE ROOM_CodR = %s AND StartDate = %s AND TRAVEL_AGENCY_CodA = %s
+  AND NOT EXISTS (
+      SELECT 1 FROM (SELECT StartDate, EndDate FROM BOOKING WHERE ROOM_CodR = %s) other
+      WHERE other.StartDate <> %s AND NOT (other.EndDate <= %s OR other.StartDate >= %s)
+  )
+"""
+
+sql_cancel = """
+DELETE FROM BOOKING
+WHERE ROOM_CodR = %s AND StartDate = %s AND TRAVEL_AGENCY_CodA = %s
+"""
+
+
+# ======================== HELPERS ========================
+
+def _date(value, name):
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} : date AAAA-MM-JJ attendue")
+
+
+def _int(value, name, default=None):
+    if value is None and default is not None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} : entier attendu")
+
+
+def _number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} : nombre attendu")
+    if number < 0:
+        raise ApiError(400, f"{name} : doit être positif")
+    return number
+
+
+def _period(params, required=True):
+    start, end = params.get("start"), params.get("end")
+    if not required and start is None and end is None:
+        return None, None
+    start, end = _date(start, "start"), _date(end, "end")
+    if end <= start:
+        raise ApiError(400, "end doit être postérieure à start")
+    return start, end
+
+
+def _limit(params):
+    return max(1, min(_int(params.get("limit"), "limit", API_PAGE_SIZE), API_MAX_PAGE_SIZE))
+
+
+# Cursors are opaque to clients: the last key of the page, base64-encoded
+def _encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, default):
+    if not cursor:
+        return default
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ApiError(400, "cursor invalide")
+
+
+def _page(records, limit, key):
+    more = len(records) > limit
+    records = records[:limit]
+    return {"data": records, "next_cursor": _encode_cursor(key(records[-1])) if more else None}
+
+
+def _records(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _write(sql, params, room):
+    try:
+        return shards.execute(sql, params, room=room)
+    except Error as e:
+        if getattr(e, "errno", None) == 1062:
+            raise ApiError(409, "Une réservation existe déjà pour cette chambre à cette date")
+        if getattr(e, "errno", None) == 1452:
+            raise ApiError(422, "Chambre inconnue")
+        if getattr(e, "errno", None) == 1644:
+            # SIGNAL from the BOOKING triggers: the hotel is being moved to another shard
+            raise ApiError(503, "Hôtel en cours de migration, réessayez dans quelques instants")
+        raise
+
+
+# ======================== HANDLERS ========================
+# handler(agency, params, body) -> (status, payload). Reads declare the tables they
+# depend on (READS) so conditional requests are answered from a version lookup alone.
+
+def availability(agency, params, body):
+    start, end = _period(params)
+    limit = _limit(params)
+    after = _decode_cursor(params.get("cursor"), 0)
+    type_filter, type_params = "", []
+    if params.get("type"):
+        type_filter, type_params = "AND R.Type = %s", [params["type"]]
+    df = shards.query(
+        sql_free_rooms.format(type_filter=type_filter),
+        [int(after)] + type_params + [start, end, limit + 1],
+        ttl=10, order="room", limit=limit + 1,
+    )
+    return 200, _page(_records(df), limit, lambda r: r["room"])
+
+
+def list_bookings(agency, params, body):
+    start, end = _period(params, required=False)
+    limit = _limit(params)
+    after = _decode_cursor(params.get("cursor"), ["", 0])
+    df = shards.query(
+        sql_agency_bookings,
+        [agency, start or "0000-00-00", end or "9999-12-31", after[0], after[1], limit + 1],
+        ttl=10, order=["start", "room"], limit=limit + 1,
+    )
+    return 200, _page(_records(df), limit, lambda r: [r["start"], r["room"]])
+
+
+def get_booking(agency, params, body):
+    room, start = _int(params.get("room"), "room"), _date(params.get("start"), "start")
+    with shards.using(shards.shard_of_room(room)):
+        df = run_query(sql_booking, [room, start, agency], qclass="point")
+    if df.empty:
+        raise ApiError(404, "Réservation introuvable")
+    return 200, _records(df)[0]
+
+
+def create_booking(agency, params, body):
+    room = _int(body.get("room"), "room")
+    start, end = _period(body)
+    cost = _number(body.get("cost"), "cost")
+    if not _write(sql_create, (room, start, end, cost, agency, room, start, end), room):
+        raise ApiError(409, "Chambre non disponible sur cette période")
+    return 201, {"room": room, "start": start, "end": end, "cost": cost}
+
+
+def update_booking(agency, params, body):
+    room, start = _int(params.get("room"), "room"), _date(params.get("start"), "start")
+    current = get_booking(agency, params, body)[1]
+    end = _date(body.get("end", current["end"]), "end")
+    cost = _number(body.get("cost", current["cost"]), "cost")
+    if end <= start:
+        raise ApiError(400, "end doit être postérieure à start")
+    if not _write(sql_update, (end, cost, room, start, agency, room, start, start, end), room):
+        # The row exists (read above): either unchanged or now overlapping another stay
+        if end != current["end"] or cost != current["cost"]:
+            raise ApiError(409, "Chambre non disponible sur cette période")
+    return 200, {"room": room, "start": start, "end": end, "cost": cost}
+
+
+def cancel_booking(agency, params, body):
+    room, start = _int(params.get("room"), "room"), _date(params.get("start"), "start")
+    if not _write(sql_cancel, (room, start, agency), room):
+        raise ApiError(404, "Réservation introuvable")
+    return 204, None
+
+
+def performance(agency, params, body):
+    # Per-night monthly figures (revenue.py) plus the lifetime totals summary table
+    start, end = _period(params, required=False)
+    totals = read_view("agency_perf")
+    totals = totals[totals["agence"] == agency]
+    monthly = revenue.metrics(grain="mois", agence=agency, date_debut=start, date_fin=end)
+    return 200, {
+        "agency": agency,
+        "bookings": int(totals["total_reservations"].iloc[0]) if not totals.empty else 0,
+        "revenue": float(totals["chiffre_affaires"].iloc[0]) if not totals.empty else 0.0,
+        "monthly": _records(monthly[["Periode", "Nuits", "CA", "ADR"]].rename(columns={
+            "Periode": "month", "Nuits": "nights", "CA": "revenue", "ADR": "adr",
+        })),
+    }
+
+
+READS = {
+    availability: ("BOOKING", "ROOM"),
+    list_bookings: ("BOOKING",),
+    get_booking: ("BOOKING",),
+    performance: ("BOOKING", "ROOM", "TRAVEL_AGENCY", "MV_AGENCY_PERF"),
+}
+# Reads that also come from the analytics snapshot (revenue.py), versioned apart
+SNAPSHOT_READS = (performance,)
+
+# (method, path) -> handler, for /v1/batch sub-requests
+ROUTES = {
+    ("GET", "/v1/availability"): availability,
+    ("GET", "/v1/bookings"): list_bookings,
+    ("POST", "/v1/bookings"): create_booking,
+    ("GET", "/v1/bookings/{room}/{start}"): get_booking,
+    ("PATCH", "/v1/bookings/{room}/{start}"): update_booking,
+    ("DELETE", "/v1/bookings/{room}/{start}"): cancel_booking,
+    ("GET", "/v1/performance"): performance,
+}
+
+
+def _call(handler, agency, params, body):
+    # Runs on a worker thread: the db layer is blocking
+    set_context(section=handler.__name__)
+    _agency_var.set(agency)
+    try:
+        return handler(agency, params, body)
+    except ApiError as e:
+        return e.status, {"error": e.message}
+    except QueryTimeout:
+        return 504, {"error": "Délai de requête dépassé"}
+    except DatabaseUnavailable as e:
+        return 503, {"error": str(e)}
+
+
+def _fresh_call(handler, agency, params, body):
+    # The validators were read first: the body comes from the database as it is now, not
+    # from this worker's cache or a replica that may still be behind them. Otherwise the
+    # ETag could run ahead of the body, and clients would get 304s on stale data.
+    with db.fresh():
+        return _call(handler, agency, params, body)
+
+
+def _resolve(method, path):
+    # "/v1/bookings/12/2025-01-03" -> (update_booking, {"room": "12", "start": "2025-01-03"})
+    parts = path.rstrip("/").split("/")
+    for (route_method, pattern), handler in ROUTES.items():
+        pattern_parts = pattern.split("/")
+        if route_method != method or len(pattern_parts) != len(parts):
+            continue
+        params = {}
+        for expected, actual in zip(pattern_parts, parts):
+            if expected.startswith("{"):
+                params[expected[1:-1]] = actual
+            elif expected != actual:
+                break
+        else:
+            return handler, params
+    return None, None
+
+
+def batch(agency, params, body):
+    # {"requests": [{"method": "POST", "path": "/v1/bookings", "body": {...}}, ...]}
+    # Each sub-request succeeds or fails on its own; results come back in order.
+    requests = body.get("requests")
+    if not isinstance(requests, list) or not requests:
+        raise ApiError(400, "requests : liste attendue")
+    if len(requests) > API_MAX_BATCH:
+        raise ApiError(413, f"{API_MAX_BATCH} requêtes au plus par lot")
+    results = []
+    for sub in requests:
+        path, _, query = str(sub.get("path", "")).partition("?")
+        handler, path_params = _resolve(str(sub.get("method", "GET")).upper(), path)
+        if handler is None:
+            results.append({"status": 404, "body": {"error": "Route inconnue"}})
+            continue
+        sub_params = dict(parse_qsl(query))
+        sub_params.update(sub.get("params") or {}, **path_params)
+        status, payload = _call(handler, agency, sub_params, sub.get("body") or {})
+        results.append({"status": status, "body": payload})
+    return 200, {"results": results}
+
+
+# ======================== HTTP ========================
+
+def _agency(request):
+    header = request.headers.get("authorization", "")
+    key = header[7:].strip() if header.lower().startswith("bearer ") else request.headers.get("x-api-key", "")
+    return API_KEYS.get(key)
+
+
+def _json(status, payload, headers=None):
+    if payload is None:
+        return Response(status_code=status, headers=headers)
+    return Response(
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+        status_code=status,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# "recent" counts the last rows below the head: a change whose lower Seq commits after
+# a higher one leaves the head alone but bumps the count, so the version still moves
+sql_data_version = """
+SELECT
+    (SELECT COALESCE(MAX(Seq), 0) FROM CHANGE_LOG) AS seq,
+    (SELECT COUNT(*) FROM CHANGE_LOG
+     WHERE Seq > (SELECT COALESCE(MAX(Seq), 0) FROM CHANGE_LOG) - 1000) AS recent,
+    (SELECT UNIX_TIMESTAMP(MAX(ChangedAt)) FROM CHANGE_LOG) AS changed_at,
+    (SELECT UNIX_TIMESTAMP(MAX(RefreshedAt)) FROM MV_FRESHNESS) AS refreshed_at
+"""
+
+
+def _data_version(tables):
+    # Head of every shard's CHANGE_LOG (plus the last summary refresh for MV_ tables),
+    # read on the primaries: every API worker and the Streamlit processes agree on it
+    # as soon as a write commits. Primary-key and index lookups only.
+    summaries = any(t.startswith("MV_") for t in tables)
+    parts = shards.scatter(lambda: run_query(sql_data_version, route="primary", qclass="point"))
+    version, changed_at = [], 0.0
+    for shard, df in sorted(parts.items()):
+        row = df.iloc[0]
+        version.append(f"{shard}:{int(row['seq'])}.{int(row['recent'])}")
+        stamps = [row["changed_at"]]
+        if summaries:
+            version.append(f"{shard}:{row['refreshed_at']}")
+            stamps.append(row["refreshed_at"])
+        changed_at = max([changed_at] + [float(s) for s in stamps if pd.notna(s)])
+    return "|".join(version), changed_at
+
+
+def _validators(handler, agency, request):
+    # ETag from the shared data version, so a matching If-None-Match is answered without
+    # running the read itself, whichever worker took the request
+    version, changed_at = _data_version(READS[handler])
+    if handler in SNAPSHOT_READS:
+        # The snapshot manifest is on disk, shared by the workers of this container
+        snapshot = analytics.snapshot_version()
+        version += f"|s:{snapshot}"
+        changed_at = max(changed_at, float(snapshot or 0))
+    tag = hashlib.sha1(
+        f"{version}|{agency}|{request.url.path}|{request.url.query}".encode()
+    ).hexdigest()[:20]
+    return f'W/"{tag}"', formatdate(changed_at, usegmt=True), changed_at
+
+
+def _not_modified(request, etag, changed_at):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    since = request.headers.get("if-modified-since")
+    if since:
+        try:
+            return int(changed_at) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _endpoint(handler):
+    async def endpoint(request):
+        agency = _agency(request)
+        if agency is None:
+            return _json(401, {"error": "Clé d'API manquante ou invalide"}, {"WWW-Authenticate": "Bearer"})
+
+        headers, etag = {}, None
+        if handler in READS:
+            try:
+                etag, last_modified, changed_at = await run_in_threadpool(_validators, handler, agency, request)
+            except (Error, DatabaseUnavailable, QueryTimeout):
+                # No validators: the read below answers (or reports the outage) itself
+                pass
+            if etag is not None:
+                headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "private, no-cache"}
+                if _not_modified(request, etag, changed_at):
+                    return Response(status_code=304, headers=headers)
+
+        params = {**request.query_params, **request.path_params}
+        body = {}
+        if request.method in ("POST", "PATCH", "PUT"):
+            try:
+                body = await request.json()
+            except ValueError:
+                return _json(400, {"error": "Corps JSON invalide"})
+            if not isinstance(body, dict):
+                return _json(400, {"error": "Objet JSON attendu"})
+
+        start = time.perf_counter()
+        call = _fresh_call if etag is not None else _call
+        status, payload = await run_in_threadpool(call, handler, agency, params, body)
+        logger.info("api", extra={
+            "route": f"{request.method} {handler.__name__}",
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "sample": True,
+        })
+        if status >= 400:
+            headers = {"Retry-After": "5"} if status == 503 else {}
+        return _json(status, payload, headers)
+    return endpoint
+
+
+async def health(request):
+    return _json(200, {"status": "ok", "database": db.breaker_state()})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    setup_logging()
+    set_context(page="api")
+    # Each agency is its own read-your-writes scope: its reads follow its own writes
+    db.set_session_provider(lambda: f"api-{_agency_var.get()}")
+    # Keeps caches in step with writes made from the Streamlit UI
+    changefeed.start()
+    if not API_KEYS:
+        logger.warning("API_KEYS is empty: every API request will be refused")
+    yield
+
+
+app = Starlette(
+    routes=[Route("/health", health)]
+    + [Route(path, _endpoint(handler), methods=[method]) for (method, path), handler in ROUTES.items()]
+    + [Route("/v1/batch", _endpoint(batch), methods=["POST"])],
+    lifespan=lifespan,
+)
@@ -1,5 +1,11 @@
 import streamlit as st
-from db import run_query
+# First: with STARTUP_PROFILE=1 it times the imports below
+from startup import start_page, mark_first_paint
+import shards
+from refresher import read_view
+import schemas
+from utils import set_context
+from layout import apply_styles, render_sidebar, stale_badge, show_error, live_section, live_data
 from datetime import datetime
 
 # =====================================================
@@ -14,8 +20,12 @@ st.set_page_config(
 # =====================================================
 # LOAD CSS
 # =====================================================
-with open("styles/main.css") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+apply_styles()
+
+# =====================================================
+# STARTUP (background pre-warm: pool, reference lists, room pictures)
+# =====================================================
+start_page("Dashboard")
 
 # =====================================================
 # NAVIGATION HELPER
@@ -28,43 +38,36 @@ def go_to(page):
         st.experimental_rerun()
 
 # =====================================================
-# SIDEBAR – HOTEL CONTROL PANEL
+# DATA LOADERS (used by the live sections below)
+# Chain-wide: each query runs on every shard and the parts are merged (see shards.py)
 # =====================================================
-with st.sidebar:
-    st.markdown("""
-    <div class="sidebar-header">
-        <div class="hotel-logo">🏨</div>
-        <div class="hotel-name">Grand Hotel Chain</div>
-        <div class="hotel-role">Hotel Management System</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.markdown("---")
-
-    st.markdown("### 🧭 Navigation")
-    if st.button("📊 Dashboard", use_container_width=True):
-        go_to("Home.py")
-
-    if st.button("📅 Réservations", use_container_width=True):
-        go_to("pages/Réservations.py")
+def load_totals():
+    # Summary table: rooms, bookings, agencies and revenue (see refresher.py)
+    return read_view("dashboard_totals")
 
-    if st.button("🛏️ Chambres", use_container_width=True):
-        go_to("pages/Chambres.py")
 
-    if st.button("🤝 Agences", use_container_width=True):
-        go_to("pages/Agences.py")
+def load_recent_bookings():
+    # Query: get 5 most recent bookings (hot table only, read backwards along idx_booking_start)
+    return shards.query("""
+        SELECT ROOM_CodR, StartDate, EndDate, Cost
+        FROM BOOKING
+        ORDER BY StartDate DESC
+        LIMIT 5
+    """, ttl=30, schema=schemas.BOOKING, order="StartDate", ascending=False, limit=5)
 
-    st.markdown("---")
 
-    st.markdown("### ⚙️ Système")
-    st.success("🟢 PMS en ligne")
-    st.caption(f"Dernière synchronisation : {datetime.now().strftime('%H:%M:%S')}")
+def load_occupancy(today):
+    # Query: number of rooms occupied today (a room lives on one shard: counts add up)
+    return shards.query("""
+        SELECT COUNT(DISTINCT ROOM_CodR) c
+        FROM BOOKING
+        WHERE %s BETWEEN StartDate AND EndDate
+    """, [today], ttl=30, qclass="point", agg={"c": "sum"})
 
-    st.markdown("""
-    <div class="sidebar-footer">
-        Groupe 9 • PMS Hôtelier
-    </div>
-    """, unsafe_allow_html=True)
+# =====================================================
+# SIDEBAR – HOTEL CONTROL PANEL
+# =====================================================
+render_sidebar()
 
 # =====================================================
 # HERO SECTION
@@ -82,6 +85,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+mark_first_paint("Dashboard")
+
 # =====================================================
 # QUICK ACTIONS
 # =====================================================
@@ -105,46 +110,51 @@ with c3:
 # =====================================================
 st.markdown("<h2 class='section-header'>📊 Indicateurs Clés</h2>", unsafe_allow_html=True)
 
-try:
-    # Query: total number of rooms
-    total_rooms = run_query("SELECT COUNT(*) c FROM ROOM").iloc[0]["c"]
-    # Query: total number of bookings
-    total_res = run_query("SELECT COUNT(*) c FROM BOOKING").iloc[0]["c"]
-    # Query: total number of agencies
-    total_ag = run_query("SELECT COUNT(*) c FROM TRAVEL_AGENCY").iloc[0]["c"]
-
-    k1, k2, k3 = st.columns(3)
-
-    with k1:
-        st.markdown(f"""
-        <div class='stat-card card-rooms'>
-            <div class='card-icon'>🛏️</div>
-            <div class='card-count'>{total_rooms}</div>
-            <div class='card-label'>Chambres Totales</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with k2:
-        st.markdown(f"""
-        <div class='stat-card card-reservations'>
-            <div class='card-icon'>📅</div>
-            <div class='card-count'>{total_res}</div>
-            <div class='card-label'>Réservations</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with k3:
-        st.markdown(f"""
-        <div class='stat-card card-agencies'>
-            <div class='card-icon'>🤝</div>
-            <div class='card-count'>{total_ag}</div>
-            <div class='card-label'>Agences Partenaires</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-except Exception as e:
-    st.error("Erreur de connexion à la base de données")
-    st.code(str(e))
+
+# Live section: redrawn when the summary refresher publishes new totals (see layout.live_data)
+@live_section
+def kpi_section():
+    set_context(section="kpis")
+    try:
+        df_totals = live_data("totals", ["MV_DASHBOARD_TOTALS"], load_totals)
+        totals = df_totals.iloc[0]
+
+        k1, k2, k3 = st.columns(3)
+
+        with k1:
+            st.markdown(f"""
+            <div class='stat-card card-rooms'>
+                <div class='card-icon'>🛏️</div>
+                <div class='card-count'>{totals["total_rooms"]}</div>
+                <div class='card-label'>Chambres Totales</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        with k2:
+            st.markdown(f"""
+            <div class='stat-card card-reservations'>
+                <div class='card-icon'>📅</div>
+                <div class='card-count'>{totals["total_bookings"]}</div>
+                <div class='card-label'>Réservations</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        with k3:
+            st.markdown(f"""
+            <div class='stat-card card-agencies'>
+                <div class='card-icon'>🤝</div>
+                <div class='card-count'>{totals["total_agencies"]}</div>
+                <div class='card-label'>Agences Partenaires</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        stale_badge(df_totals)
+
+    except Exception as e:
+        show_error("Erreur de connexion à la base de données", e)
+
+
+kpi_section()
 
 
 # TEAM MEMBERS
@@ -233,92 +243,109 @@ st.markdown(carousel_html, unsafe_allow_html=True)
 # =====================================================
 st.markdown("<h2 class='section-header'>🕒 Réservations Récentes</h2>", unsafe_allow_html=True)
 
-try:
-    # Query: get 5 most recent bookings
-    recent_bookings = run_query("""
-        SELECT ROOM_CodR, StartDate, EndDate, Cost
-        FROM BOOKING
-        ORDER BY StartDate DESC
-        LIMIT 5
-    """)
-
-    for _, row in recent_bookings.iterrows():
-        st.markdown(f"""
-        <div class="stat-card" style="margin-bottom:0.8rem;">
-            🛏️ Chambre <strong>{row['ROOM_CodR']}</strong><br>
-            📅 {row['StartDate']} → {row['EndDate']}<br>
-            💰 {row['Cost']} MAD
-        </div>
-        """, unsafe_allow_html=True)
-
-except Exception as e:
-    st.error("Erreur lors du chargement des réservations")
-    st.code(str(e))
+
+@live_section
+def recent_bookings_section():
+    set_context(section="recent_bookings")
+    try:
+        recent_bookings = live_data("recent_bookings", ["BOOKING"], load_recent_bookings)
+
+        for _, row in recent_bookings.iterrows():
+            st.markdown(f"""
+            <div class="stat-card" style="margin-bottom:0.8rem;">
+                🛏️ Chambre <strong>{row['ROOM_CodR']}</strong><br>
+                📅 {row['StartDate'].date()} → {row['EndDate'].date()}<br>
+                💰 {row['Cost']} MAD
+            </div>
+            """, unsafe_allow_html=True)
+
+        stale_badge(recent_bookings)
+
+    except Exception as e:
+        show_error("Erreur lors du chargement des réservations", e)
+
+
+recent_bookings_section()
+
 # =====================================================
 # REVENUE SUMMARY
 # =====================================================
 st.markdown("<h2 class='section-header'>💰 Revenus Générés</h2>", unsafe_allow_html=True)
 
-try:
-    # Query: total revenue from bookings
-    revenue = run_query("""
-        SELECT SUM(Cost) total FROM BOOKING
-    """).iloc[0]["total"]
 
-    st.metric("💵 Revenu Total", f"{revenue:.0f} MAD")
+@live_section
+def revenue_section():
+    set_context(section="revenue")
+    try:
+        revenue = live_data("totals", ["MV_DASHBOARD_TOTALS"], load_totals).iloc[0]["revenue"]
+
+        st.metric("💵 Revenu Total", f"{revenue:.0f} MAD")
+
+    except Exception as e:
+        show_error("Erreur calcul revenus", e)
+
 
-except Exception as e:
-    st.error("Erreur calcul revenus")
-    st.code(str(e))
+revenue_section()
 
 # =====================================================
 # ROOM OCCUPANCY TODAY
 # =====================================================
 st.markdown("<h2 class='section-header'>🛏️ Occupation Aujourd’hui</h2>", unsafe_allow_html=True)
 
-today = datetime.now().strftime("%Y-%m-%d")
 
-try:
-    # Query: number of rooms occupied today
-    occupied_today = run_query(f"""
-        SELECT COUNT(DISTINCT ROOM_CodR) c
-        FROM BOOKING
-        WHERE '{today}' BETWEEN StartDate AND EndDate
-    """).iloc[0]["c"]
+@live_section
+def occupancy_section():
+    set_context(section="occupancy")
+    today = datetime.now().strftime("%Y-%m-%d")
+    try:
+        occupied_today = live_data(f"occupancy:{today}", ["BOOKING"], lambda: load_occupancy(today)).iloc[0]["c"]
+        total_rooms = live_data("totals", ["MV_DASHBOARD_TOTALS"], load_totals).iloc[0]["total_rooms"]
 
-    # Query: total number of rooms (again)
-    total_rooms = run_query("SELECT COUNT(*) c FROM ROOM").iloc[0]["c"]
-    free_rooms = total_rooms - occupied_today
+        o1, o2 = st.columns(2)
+        o1.metric("❌ Chambres Occupées", occupied_today)
+        o2.metric("✅ Chambres Libres", total_rooms - occupied_today)
 
-    o1, o2 = st.columns(2)
-    o1.metric("❌ Chambres Occupées", occupied_today)
-    o2.metric("✅ Chambres Libres", free_rooms)
+    except Exception as e:
+        show_error("Erreur lors du calcul d’occupation", e)
 
-except Exception as e:
-    st.error("Erreur lors du calcul d’occupation")
-    st.code(str(e))
+
+occupancy_section()
 
 # =====================================================
 # SYSTEM ALERTS
 # =====================================================
 st.markdown("<h2 class='section-header'>🚨 Alertes Système</h2>", unsafe_allow_html=True)
 
-alerts = []
 
-if free_rooms == 0:
-    alerts.append("⚠️ Hôtel complet aujourd’hui")
+@live_section
+def alerts_section():
+    today = datetime.now().strftime("%Y-%m-%d")
+    try:
+        totals = live_data("totals", ["MV_DASHBOARD_TOTALS"], load_totals).iloc[0]
+        occupied_today = live_data(f"occupancy:{today}", ["BOOKING"], lambda: load_occupancy(today)).iloc[0]["c"]
+    except Exception as e:
+        show_error("Alertes indisponibles", e)
+        return
+
+    alerts = []
+
+    if totals["total_rooms"] - occupied_today <= 0:
+        alerts.append("⚠️ Hôtel complet aujourd’hui")
+
+    if totals["revenue"] == 0:
+        alerts.append("⚠️ Aucun revenu enregistré")
+
+    if totals["total_agencies"] == 0:
+        alerts.append("⚠️ Aucune agence partenaire")
 
-if revenue == 0:
-    alerts.append("⚠️ Aucun revenu enregistré")
+    if alerts:
+        for a in alerts:
+            st.warning(a)
+    else:
+        st.success("✅ Système stable — aucune alerte")
 
-if total_ag == 0:
-    alerts.append("⚠️ Aucune agence partenaire")
 
-if alerts:
-    for a in alerts:
-        st.warning(a)
-else:
-    st.success("✅ Système stable — aucune alerte")
+alerts_section()
 
 # =====================================================
 # FOOTER
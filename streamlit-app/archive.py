@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+import threading
+from datetime import date
+
+import cache
+import events
+import shards
+from db import get_connection
+
+# BOOKING keeps the hot years; closed years move to BOOKING_ARCHIVE, which is
+# range-partitioned by StartDate year (one partition per archived year).
+ARCHIVE_HOT_YEARS = int(os.environ.get("ARCHIVE_HOT_YEARS", 2))
+ARCHIVE_AUTO = os.environ.get("ARCHIVE_AUTO", "0") == "1"
+ARCHIVE_INTERVAL = int(os.environ.get("ARCHIVE_INTERVAL", 86400))
+
+logger = logging.getLogger(__name__)
+
+_started = False
+_start_lock = threading.Lock()
+
+# Same columns as BOOKING plus an Archived flag, for queries that span both tables
+ALL_BOOKINGS = """(
+    SELECT ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA, 0 AS Archived FROM BOOKING
+    UNION ALL
+    SELECT ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA, 1 AS Archived FROM BOOKING_ARCHIVE
+)"""
+
+
+def bookings_source(include_archive=False):
+    # FROM target for booking queries: hot table only unless history is requested
+    return ALL_BOOKINGS if include_archive else "BOOKING"
+
+
+def hot_cutoff():
+    # Bookings that ended before this date belong to closed years
+    return date(date.today().year - ARCHIVE_HOT_YEARS + 1, 1, 1).isoformat()
+
+
+# ======================== ARCHIVAL ========================
+
+sql_closed_years = """
+SELECT DISTINCT LEFT(StartDate, 4) AS annee
+FROM BOOKING
+WHERE EndDate < %s
+ORDER BY annee
+"""
+
+sql_archive_bounds = """
+SELECT PARTITION_DESCRIPTION AS bound
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'BOOKING_ARCHIVE'
+"""
+
+sql_move_year = """
+INSERT INTO BOOKING_ARCHIVE (ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA, HOTEL_CodH)
+SELECT ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA, HOTEL_CodH
+FROM BOOKING
+WHERE StartDate >= %s AND StartDate < %s AND EndDate < %s
+"""
+
+sql_delete_year = """
+DELETE FROM BOOKING
+WHERE StartDate >= %s AND StartDate < %s AND EndDate < %s
+"""
+
+
+def _ensure_partition(cur, year):
+    # Split the MAXVALUE partition when the year is past the last bounded partition
+    cur.execute(sql_archive_bounds)
+    bounds = [row[0].strip("'") for row in cur.fetchall() if row[0] and row[0] != "MAXVALUE"]
+    upper = f"{year + 1}-01-01"
+    if bounds and upper <= max(bounds):
+        return
+    cur.execute(f"""
+        ALTER TABLE BOOKING_ARCHIVE REORGANIZE PARTITION p_max INTO (
+            PARTITION p{year} VALUES LESS THAN ('{upper}'),
+            PARTITION p_max VALUES LESS THAN (MAXVALUE)
+        )
+    """)
+
+
+def archive_closed_years():
+    # Moves every closed booking out of BOOKING, one year per transaction; returns rows moved
+    cutoff = hot_cutoff()
+    conn = get_connection("primary")
+    moved = 0
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT GET_LOCK('booking_archive', 0)")
+        if cur.fetchone()[0] != 1:
+            return 0
+        cur.execute(sql_closed_years, (cutoff,))
+        years = [int(row[0]) for row in cur.fetchall()]
+        for year in years:
+            # DDL commits implicitly, so the partition is created before the move starts
+            _ensure_partition(cur, year)
+            window = (f"{year}-01-01", f"{year + 1}-01-01", cutoff)
+            cur.execute(sql_move_year, window)
+            cur.execute(sql_delete_year, window)
+            moved += cur.rowcount
+            conn.commit()
+            logger.info("archived %d booking(s) from %d", cur.rowcount, year)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if moved:
+        cache.invalidate_tables(["BOOKING", "BOOKING_ARCHIVE"])
+        events.publish(["BOOKING", "BOOKING_ARCHIVE"])
+    return moved
+
+
+def archive_shards():
+    # archive_closed_years on every shard; returns rows moved
+    moved = 0
+    for shard in sorted(shards.DB_SHARDS):
+        with shards.using(shard):
+            moved += archive_closed_years()
+    return moved
+
+
+def archive_summary():
+    return shards.query("""
+        SELECT LEFT(StartDate, 4) AS annee, COUNT(*) AS reservations, SUM(Cost) AS chiffre_affaires
+        FROM BOOKING_ARCHIVE
+        GROUP BY annee
+        ORDER BY annee
+    """, ttl=300, by=["annee"], agg={"reservations": "sum", "chiffre_affaires": "sum"}, order="annee")
+
+
+def _run():
+    while True:
+        try:
+            archive_shards()
+        except Exception as e:
+            logger.warning("booking archival failed: %s", e)
+        time.sleep(ARCHIVE_INTERVAL)
+
+
+def start():
+    global _started
+    if not ARCHIVE_AUTO:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_run, name="booking-archive", daemon=True).start()
+
+
+if __name__ == "__main__":
+    # python archive.py  -> one archival pass, e.g. from cron
+    logging.basicConfig(level=logging.INFO)
+    print(f"{archive_shards()} réservation(s) archivée(s) avant {hot_cutoff()}")
@@ -0,0 +1,101 @@
+import os
+import hashlib
+import logging
+from io import BytesIO
+from functools import lru_cache
+
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+CACHE_DIR = os.environ.get("ASSET_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "assets"))
+
+# ROOM.Type (lower case, as stored in the database) -> source picture
+ROOM_IMAGES = {
+    "single": "double.jpg",  # no dedicated picture for single rooms yet
+    "double": "double.jpg",
+    "triple": "triple.jpg",
+    "suite": "suite.jpg",
+}
+DEFAULT_IMAGE = "double.jpg"
+
+# Variant -> (max width in px, JPEG quality). Room pictures sit in the 1/3 column of
+# wide pages (Agences, Chambres): one size covers it, a smaller one was never shown.
+VARIANTS = {
+    "card": (640, 80),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _source_path(name):
+    return os.path.join(ASSETS_DIR, name)
+
+
+@lru_cache(maxsize=None)
+def validate_room_images():
+    # Resolve every room type to an existing file, falling back to the default picture
+    if not os.path.isfile(_source_path(DEFAULT_IMAGE)):
+        raise RuntimeError(f"Image par défaut introuvable: {DEFAULT_IMAGE}")
+
+    resolved = {}
+    for room_type, name in ROOM_IMAGES.items():
+        if os.path.isfile(_source_path(name)):
+            resolved[room_type] = name
+        else:
+            logger.warning("Image manquante pour le type %s: %s", room_type, name)
+            resolved[room_type] = DEFAULT_IMAGE
+    return resolved
+
+
+@lru_cache(maxsize=None)
+def _source_digest(name):
+    with open(_source_path(name), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _render_variant(name, variant):
+    width, quality = VARIANTS[variant]
+    with Image.open(_source_path(name)) as img:
+        img = img.convert("RGB")
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+@lru_cache(maxsize=64)
+def get_variant(name, variant="card"):
+    # Returns (etag, jpeg bytes); variants are content-addressed on disk so
+    # they are generated once and shared by every process on the host
+    if variant not in VARIANTS:
+        raise ValueError(f"Variante inconnue: {variant}")
+
+    etag = f"{_source_digest(name)}-{variant}"
+    cached = os.path.join(CACHE_DIR, f"{etag}.jpg")
+
+    if os.path.isfile(cached):
+        with open(cached, "rb") as f:
+            return etag, f.read()
+
+    data = _render_variant(name, variant)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, cached)
+    return etag, data
+
+
+def room_image(room_type, variant="card"):
+    images = validate_room_images()
+    name = images.get(str(room_type).lower(), DEFAULT_IMAGE)
+    return get_variant(name, variant)[1]
+
+
+def warm_room_images():
+    for name in set(validate_room_images().values()):
+        for variant in VARIANTS:
+            get_variant(name, variant)
@@ -0,0 +1,104 @@
+import re
+from datetime import date
+
+import shards
+from db import run_query
+
+# Matches returned per search; the picker never holds more than this
+SEARCH_LIMIT = 20
+
+_DATE_RE = re.compile(r"^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$")
+_AGENCY_RE = re.compile(r"^a(?:gence)?:?(\d+)$", re.I)
+_COST_RANGE_RE = re.compile(r"^(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)$")
+_COST_BOUND_RE = re.compile(r"^([<>])(\d+(?:\.\d+)?)$")
+
+# Each search only reads index columns (ROOM_CodR, StartDate are the primary key, present
+# in every secondary index), so MySQL answers it from the index alone:
+#   room     -> PRIMARY (ROOM_CodR, StartDate)
+#   date     -> idx_booking_start (StartDate)
+#   agency   -> idx_booking_agency_start (TRAVEL_AGENCY_CodA, StartDate)
+#   cost     -> idx_booking_cost (Cost)
+sql_booking = """
+SELECT ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA
+FROM BOOKING
+WHERE ROOM_CodR = %s AND StartDate = %s
+"""
+
+
+def _next_period(year, month, day):
+    if day:
+        return date.fromordinal(date(year, month, day).toordinal() + 1).isoformat()
+    if month:
+        return f"{year + month // 12}-{month % 12 + 1:02d}-01"
+    return f"{year + 1}-01-01"
+
+
+def parse(text):
+    # "12 2024-03 a3 500-900" -> room 12, March 2024, agency 3, cost between 500 and 900
+    criteria = {}
+    for token in text.replace(",", " ").split():
+        m = _DATE_RE.match(token)
+        if m and (m.group(2) or 1900 <= int(m.group(1)) <= 2100):
+            year, month, day = int(m.group(1)), int(m.group(2) or 0), int(m.group(3) or 0)
+            try:
+                start = date(year, month or 1, day or 1).isoformat()
+                criteria["period"] = (start, _next_period(year, month, day))
+            except ValueError:
+                pass
+            continue
+        if token.isdigit():
+            criteria["room"] = int(token)
+            continue
+        m = _AGENCY_RE.match(token)
+        if m:
+            criteria["agency"] = int(m.group(1))
+            continue
+        m = _COST_RANGE_RE.match(token)
+        if m:
+            criteria["cost"] = (float(m.group(1)), float(m.group(2)))
+            continue
+        m = _COST_BOUND_RE.match(token)
+        if m:
+            bound = float(m.group(2))
+            criteria["cost"] = (bound, None) if m.group(1) == ">" else (None, bound)
+    return criteria
+
+
+def search(text, limit=SEARCH_LIMIT):
+    # Top matches as (room, start) keys, most recent first
+    criteria = parse(text)
+    clauses, params = [], []
+    if "room" in criteria:
+        clauses.append("ROOM_CodR = %s")
+        params.append(criteria["room"])
+    if "period" in criteria:
+        clauses.append("StartDate >= %s AND StartDate < %s")
+        params.extend(criteria["period"])
+    if "agency" in criteria:
+        clauses.append("TRAVEL_AGENCY_CodA = %s")
+        params.append(criteria["agency"])
+    if "cost" in criteria:
+        low, high = criteria["cost"]
+        if low is not None:
+            clauses.append("Cost >= %s")
+            params.append(low)
+        if high is not None:
+            clauses.append("Cost <= %s")
+            params.append(high)
+
+    where = " AND ".join(clauses) or "1=1"
+    df = shards.query(f"""
+        SELECT ROOM_CodR, StartDate
+        FROM BOOKING
+        WHERE {where}
+        ORDER BY StartDate DESC
+        LIMIT %s
+    """, params + [int(limit)], ttl=30, order="StartDate", ascending=False, limit=int(limit))
+    return list(zip(df["ROOM_CodR"].astype(int), df["StartDate"].astype(str)))
+
+
+def fetch(key):
+    # Full record for one selected key, from the primary so it reflects the latest write
+    with shards.using(shards.shard_of_room(key[0])):
+        df = run_query(sql_booking, list(key), route="primary", qclass="point")
+    return None if df.empty else df.iloc[0]
@@ -0,0 +1,527 @@
+import os
+import re
+import time
+import pickle
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+
+import pandas as pd
+
+from startup import lazy_import
+
+pa = lazy_import("pyarrow")
+pa_ipc = lazy_import("pyarrow.ipc")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# memory | sqlite | redis
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 512))
+CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH", os.path.join(BASE_DIR, ".cache", "query-cache.sqlite"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+# How long a process waits for another one computing the same key before computing it itself
+CACHE_LOCK_TIMEOUT = float(os.environ.get("CACHE_LOCK_TIMEOUT", 10))
+# How long the last good result of a query is kept for degraded-mode fallback
+CACHE_STALE_TTL = int(os.environ.get("CACHE_STALE_TTL", 86400))
+
+logger = logging.getLogger(__name__)
+
+
+# ======================== BACKENDS ========================
+# Every backend stores bytes and offers get / set / add (set if absent) / delete / incr.
+
+class MemoryBackend:
+    # In-process LRU
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._live(key, time.monotonic()) or 0) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+
+class SQLiteBackend:
+    # Shared by every worker on one host; WAL lets readers run alongside a writer
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+        # Cheap probabilistic eviction of expired rows
+        if hash(key) % 64 == 0:
+            conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+    def add(self, key, value, ttl=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires IS NOT NULL AND expires <= ?", (key, time.time()))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = int(row[0] if row else 0) + 1
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, NULL)", (key, str(value).encode()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+
+class RedisBackend:
+    # Minimal RESP client (GET / SET PX NX / DEL / INCR): works with Redis, Valkey or RespStandIn below
+    def __init__(self, url=CACHE_REDIS_URL):
+        m = re.match(r"redis://(?:[^@]*@)?([^:/]+)(?::(\d+))?(?:/(\d+))?", url)
+        if not m:
+            raise ValueError(f"URL Redis invalide: {url}")
+        self.host = m.group(1)
+        self.port = int(m.group(2) or 6379)
+        self.db = int(m.group(3) or 0)
+        self._local = threading.local()
+
+    def _sock(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=2)
+            self._local.sock = sock
+            self._local.buf = sock.makefile("rb")
+            if self.db:
+                self._call("SELECT", self.db)
+        return sock
+
+    def _call(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            self._sock().sendall(b"".join(parts))
+            return self._read()
+        except OSError:
+            # Drop the broken connection; the next call reconnects
+            self._local.sock = None
+            raise
+
+    def _read(self):
+        line = self._local.buf.readline()
+        if not line:
+            raise ConnectionError("Connexion Redis fermée")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(f"Erreur Redis: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._local.buf.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [self._read() for _ in range(int(rest))]
+        raise RuntimeError(f"Réponse Redis inattendue: {line!r}")
+
+    def get(self, key):
+        return self._call("GET", key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._call("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self._call("SET", key, value)
+
+    def add(self, key, value, ttl=None):
+        args = ["SET", key, value, "NX"]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        return self._call(*args) is not None
+
+    def delete(self, key):
+        self._call("DEL", key)
+
+    def incr(self, key):
+        return self._call("INCR", key)
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    # Local Redis stand-in for development and tests: python cache.py serve [port]
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 6379)):
+        self.store = MemoryBackend(max_entries=100_000)
+        super().__init__(address, _RespHandler)
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            key = args[1].decode() if len(args) > 1 else None
+            if cmd == b"PING":
+                reply = b"+PONG\r\n"
+            elif cmd == b"SELECT":
+                reply = b"+OK\r\n"
+            elif cmd == b"GET":
+                reply = self._bulk(store.get(key))
+            elif cmd == b"SET":
+                opts = [a.upper() for a in args[3:]]
+                ttl = int(opts[opts.index(b"PX") + 1]) / 1000 if b"PX" in opts else None
+                if b"NX" in opts:
+                    reply = b"+OK\r\n" if store.add(key, args[2], ttl) else b"$-1\r\n"
+                else:
+                    store.set(key, args[2], ttl)
+                    reply = b"+OK\r\n"
+            elif cmd == b"DEL":
+                store.delete(key)
+                reply = b":1\r\n"
+            elif cmd == b"INCR":
+                reply = b":%d\r\n" % store.incr(key)
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+_BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+    "redis": RedisBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _BACKENDS[CACHE_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+# ======================== SERIALIZATION ========================
+# DataFrames travel as Arrow IPC streams, anything else as pickle.
+
+def dumps(value):
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value)
+        sink = pa.BufferOutputStream()
+        with pa_ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return b"A" + sink.getvalue().to_pybytes()
+    return b"P" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    if data[:1] == b"A":
+        return pa_ipc.open_stream(data[1:]).read_all().to_pandas()
+    return pickle.loads(data[1:])
+
+
+# ======================== METRICS ========================
+
+_metrics = {"hits": 0, "misses": 0, "computes": 0, "waits": 0, "errors": 0, "stale": 0}
+_metrics_lock = threading.Lock()
+
+
+def _count(name):
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+def stats():
+    with _metrics_lock:
+        out = dict(_metrics)
+    lookups = out["hits"] + out["misses"]
+    out["hit_ratio"] = round(out["hits"] / lookups, 3) if lookups else None
+    out["backend"] = type(get_backend()).__name__
+    return out
+
+
+# ======================== TABLE GENERATIONS ========================
+# A cached query's key embeds the generation of every table it reads. Bumping a
+# generation (on write or from the change feed) invalidates those entries everywhere.
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+`?(\w+)`?", re.I)
+
+
+def tables_in(sql):
+    return sorted({t.upper() for t in _TABLE_RE.findall(sql)} - {"DUAL"})
+
+
+def _generation(backend, table):
+    value = backend.get(f"gen:{table}")
+    return int(value) if value else 0
+
+
+def invalidate_tables(tables):
+    backend = get_backend()
+    for table in tables:
+        try:
+            backend.incr(f"gen:{table.upper()}")
+        except Exception as e:
+            logger.warning("cache invalidation of %s failed: %s", table, e)
+
+
+def stable_key(sql, params=None):
+    # Same query, independent of table generations: names its last good result
+    digest = hashlib.sha1(f"{sql}\x00{params!r}".encode()).hexdigest()
+    return f"s:{digest}"
+
+
+def query_key(sql, params=None):
+    backend = get_backend()
+    gens = ",".join(f"{t}={_generation(backend, t)}" for t in tables_in(sql))
+    digest = hashlib.sha1(f"{sql}\x00{params!r}\x00{gens}".encode()).hexdigest()
+    return f"q:{digest}"
+
+
+# ======================== SINGLE FLIGHT ========================
+
+_stripes = [threading.Lock() for _ in range(64)]
+
+
+def get_or_compute(key, ttl, compute):
+    # A miss is computed by one thread per process and, through a backend lock key,
+    # by one process at a time; the others wait for its result.
+    backend = get_backend()
+    try:
+        data = backend.get(key)
+    except Exception as e:
+        _count("errors")
+        logger.warning("cache read failed: %s", e)
+        return compute()
+    if data is not None:
+        _count("hits")
+        return loads(data)
+    _count("misses")
+
+    with _stripes[hash(key) % len(_stripes)]:
+        # Another thread filled it while we waited for the stripe
+        data = backend.get(key)
+        if data is not None:
+            return loads(data)
+
+        lock_key = f"lock:{key}"
+        deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+        locked = backend.add(lock_key, str(os.getpid()).encode(), ttl=CACHE_LOCK_TIMEOUT)
+        while not locked:
+            _count("waits")
+            time.sleep(0.05)
+            data = backend.get(key)
+            if data is not None:
+                return loads(data)
+            if time.monotonic() >= deadline:
+                # Computed without the lock: the holder's lock stays in place
+                break
+            locked = backend.add(lock_key, str(os.getpid()).encode(), ttl=CACHE_LOCK_TIMEOUT)
+
+        try:
+            _count("computes")
+            value = compute()
+            backend.set(key, dumps(value), ttl)
+            return value
+        finally:
+            if locked:
+                backend.delete(lock_key)
+
+
+# ======================== STALE WHILE REVALIDATE ========================
+# Every computed result is also kept under its stable key for CACHE_STALE_TTL. When the
+# database fails or is known to be degraded, that copy is served (df.attrs["stale_age"]
+# holds its age in seconds) and one background thread per key recomputes it.
+
+_revalidating = set()
+_revalidate_lock = threading.Lock()
+
+
+def _remember(stale_key, value):
+    try:
+        backend = get_backend()
+        backend.set(stale_key, dumps(value), CACHE_STALE_TTL)
+        backend.set(f"{stale_key}:at", str(time.time()).encode(), CACHE_STALE_TTL)
+    except Exception as e:
+        logger.warning("cache write of last good result failed: %s", e)
+
+
+def last_good(stale_key):
+    try:
+        backend = get_backend()
+        data, saved_at = backend.get(stale_key), backend.get(f"{stale_key}:at")
+    except Exception as e:
+        logger.warning("cache read of last good result failed: %s", e)
+        return None
+    if data is None or saved_at is None:
+        return None
+    value = loads(data)
+    if isinstance(value, pd.DataFrame):
+        value.attrs["stale_age"] = max(0.0, time.time() - float(saved_at))
+    _count("stale")
+    return value
+
+
+def _revalidate(key, ttl, compute):
+    with _revalidate_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            get_or_compute(key, ttl, compute)
+        except Exception as e:
+            logger.info("background revalidation failed: %s", e)
+        finally:
+            with _revalidate_lock:
+                _revalidating.discard(key)
+
+    threading.Thread(target=run, name="cache-revalidate", daemon=True).start()
+
+
+def get_or_stale(key, stale_key, ttl, compute, degraded=False, errors=(Exception,)):
+    # get_or_compute with a fallback on the last good result. degraded=True skips the
+    # database round trip entirely when a fresh or stale copy exists.
+    def fill():
+        value = compute()
+        _remember(stale_key, value)
+        return value
+
+    if degraded:
+        try:
+            data = get_backend().get(key)
+        except Exception:
+            data = None
+        if data is not None:
+            _count("hits")
+            return loads(data)
+        stale = last_good(stale_key)
+        if stale is not None:
+            _revalidate(key, ttl, fill)
+            return stale
+
+    try:
+        return get_or_compute(key, ttl, fill)
+    except errors:
+        stale = last_good(stale_key)
+        if stale is None:
+            raise
+        _revalidate(key, ttl, fill)
+        return stale
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 6379
+        print(f"RESP stand-in listening on 127.0.0.1:{port}")
+        RespStandIn(("127.0.0.1", port)).serve_forever()
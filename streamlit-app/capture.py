@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Opt-in capture of the statements sent to MySQL (db.py), replayed by replay.py.
+# One JSON object per line:
+#   {"k": "sql", "id": query id, "sql": text}  once per statement text and process
+#   {"k": "q", "id": query id, "at": epoch seconds, "sid": session, "rel": seconds since
+#    the session's first captured statement, "p": params, "ms": duration, "rows": rows
+#    read or changed, "c": scheduler class, "w": 1 for writes, "err": error or null}
+# Records are queued and written by a background thread; a full queue drops records
+# (counted) rather than slowing queries down.
+# "{pid}" in the file name is replaced by the process id (one file per worker process).
+DB_CAPTURE_FILE = os.environ.get("DB_CAPTURE_FILE", "")
+# Share of sessions captured; a session is captured whole or not at all
+DB_CAPTURE_SAMPLE = float(os.environ.get("DB_CAPTURE_SAMPLE", 1.0))
+CAPTURE_QUEUE = 100_000
+MAX_SESSIONS = 10_000
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue(maxsize=CAPTURE_QUEUE)
+_sessions = OrderedDict()
+_lock = threading.Lock()
+_state = {"writer": None, "seen": set(), "records": 0, "dropped": 0}
+
+
+def enabled():
+    return bool(DB_CAPTURE_FILE)
+
+
+def _session_key(session):
+    return hashlib.sha1(str(session).encode()).hexdigest()[:8]
+
+
+def record(qid, sql, params, qclass, duration, session, rows=None, write=False, error=None):
+    if not DB_CAPTURE_FILE:
+        return
+    sid = _session_key(session)
+    if DB_CAPTURE_SAMPLE < 1 and int(sid, 16) / 16 ** 8 >= DB_CAPTURE_SAMPLE:
+        return
+    at = time.time() - duration
+    with _lock:
+        first = _sessions.setdefault(sid, at)
+        _sessions.move_to_end(sid)
+        if len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        if _state["writer"] is None:
+            _state["writer"] = threading.Thread(target=_write_forever, name="db-capture", daemon=True)
+            _state["writer"].start()
+    try:
+        _queue.put_nowait((qid, sql, list(params) if params else [], qclass, at, sid, at - first,
+                           duration, rows, write, error))
+    except queue.Full:
+        with _lock:
+            _state["dropped"] += 1
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "item"):
+        # numpy scalars
+        return value.item()
+    return str(value)
+
+
+def _lines(item, new):
+    # `new` collects the query ids whose text this batch writes; they join
+    # _state["seen"] once the batch is on disk, so a failed write repeats the text
+    qid, sql, params, qclass, at, sid, rel, duration, rows, write, error = item
+    if qid not in _state["seen"] and qid not in new:
+        new.add(qid)
+        yield json.dumps({"k": "sql", "id": qid, "sql": sql}, separators=(",", ":"))
+    yield json.dumps({
+        "k": "q", "id": qid, "at": round(at, 4), "sid": sid, "rel": round(rel, 4),
+        "p": params, "ms": round(duration * 1000, 2), "rows": rows, "c": qclass,
+        "w": 1 if write else 0, "err": error,
+    }, default=_json_default, separators=(",", ":"))
+
+
+def _write_forever():
+    path = DB_CAPTURE_FILE.replace("{pid}", str(os.getpid()))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    logger.info("capturing database statements to %s", path)
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            batch = [_queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            new = set()
+            try:
+                f.write("".join(line + "\n" for item in batch for line in _lines(item, new)))
+                f.flush()
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning("capture write failed: %s", e)
+                continue
+            _state["seen"].update(new)
+            with _lock:
+                _state["records"] += len(batch)
+
+
+def stats():
+    with _lock:
+        return {
+            "fichier": DB_CAPTURE_FILE or None,
+            "echantillon": DB_CAPTURE_SAMPLE,
+            "enregistrees": _state["records"],
+            "en_attente": _queue.qsize(),
+            "perdues": _state["dropped"],
+        }
@@ -0,0 +1,208 @@
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+import shards
+from db import get_connection, run_query
+
+CHANGEFEED_ENABLED = os.environ.get("CHANGEFEED_ENABLED", "1") == "1"
+CHANGEFEED_POLL_INTERVAL = float(os.environ.get("CHANGEFEED_POLL_INTERVAL", 1))
+CHANGEFEED_BATCH = int(os.environ.get("CHANGEFEED_BATCH", 1000))
+CHANGEFEED_RETENTION_HOURS = int(os.environ.get("CHANGEFEED_RETENTION_HOURS", 24))
+# Seq is allocated at insert but visible at commit: a change younger than this may still
+# have a lower, uncommitted Seq before it. Such changes are dispatched, but the position
+# only moves past settled ones (same rule as deltas.DELTA_SETTLE).
+CHANGEFEED_SETTLE = float(os.environ.get("CHANGEFEED_SETTLE", 2))
+
+logger = logging.getLogger(__name__)
+
+# seq: CHANGE_LOG.Seq (strictly increasing), op: I/U/D, key: "room|start" for BOOKING, the code otherwise,
+# settled: older than CHANGEFEED_SETTLE (no lower Seq can still appear before it)
+Change = namedtuple("Change", ["seq", "table", "op", "key", "settled"])
+
+_subscribers = []
+_sub_lock = threading.Lock()
+# seq: settled position on shard 1; seqs: per shard (each CHANGE_LOG numbers its own rows);
+# sent: per shard, unsettled changes past the position already dispatched
+_state = {"seq": None, "seqs": {}, "sent": {}, "started": False}
+_start_lock = threading.Lock()
+
+sql_changes = """
+SELECT Seq, TableName, Op, RowKey, ChangedAt < NOW(3) - INTERVAL %s SECOND AS settled
+FROM CHANGE_LOG
+WHERE Seq > %s
+ORDER BY Seq
+LIMIT %s
+"""
+
+
+def subscribe(callback, tables=None):
+    # callback(list_of_changes) runs on the poller thread, once per batch; returns an unsubscribe function
+    entry = (callback, frozenset(tables) if tables else None)
+    with _sub_lock:
+        _subscribers.append(entry)
+
+    def unsubscribe():
+        with _sub_lock:
+            if entry in _subscribers:
+                _subscribers.remove(entry)
+
+    return unsubscribe
+
+
+def last_seq():
+    return _state["seq"]
+
+
+def current_seq():
+    return int(run_query("SELECT COALESCE(MAX(Seq), 0) AS seq FROM CHANGE_LOG", route="primary", qclass="point").iloc[0]["seq"])
+
+
+def settled_seq():
+    # Highest Seq with every lower Seq already visible: the head, minus recent changes
+    # that may still have uncommitted neighbours below them
+    return int(run_query("""
+        SELECT COALESCE(
+            (SELECT MIN(Seq) - 1 FROM CHANGE_LOG WHERE ChangedAt >= NOW(3) - INTERVAL %s SECOND),
+            (SELECT MAX(Seq) FROM CHANGE_LOG),
+            0
+        ) AS seq
+    """, [CHANGEFEED_SETTLE], route="primary", qclass="point").iloc[0]["seq"])
+
+
+def fetch_changes(after_seq, limit=CHANGEFEED_BATCH):
+    # Read from the primary: a lagging replica would hand out sequence gaps
+    df = run_query(sql_changes, [CHANGEFEED_SETTLE, after_seq, limit], route="primary")
+    return [Change(int(r.Seq), r.TableName, r.Op, str(r.RowKey), bool(r.settled)) for r in df.itertuples()]
+
+
+def settled_prefix(changes):
+    # Changes the position may move past: up to the first unsettled one
+    for i, change in enumerate(changes):
+        if not change.settled:
+            return changes[:i]
+    return changes
+
+
+def _dispatch(changes):
+    with _sub_lock:
+        subscribers = list(_subscribers)
+    for callback, tables in subscribers:
+        batch = changes if tables is None else [c for c in changes if c.table in tables]
+        if not batch:
+            continue
+        try:
+            callback(batch)
+        except Exception as e:
+            logger.warning("changefeed subscriber %r failed: %s", callback, e)
+
+
+def _poll_shard(shard):
+    # Returns how far the position moved (changes settled in this batch)
+    seqs = _state["seqs"]
+    if seqs.get(shard) is None:
+        # Start from the settled head: caches are loaded fresh, history is not replayed
+        seqs[shard] = settled_seq()
+        return 0
+    changes = fetch_changes(seqs[shard])
+    sent = _state["sent"].setdefault(shard, set())
+    fresh = [c for c in changes if c.seq not in sent]
+    settled = settled_prefix(changes)
+    if settled:
+        seqs[shard] = settled[-1].seq
+    # Unsettled changes are fetched again until they settle; dispatch them once
+    _state["sent"][shard] = {c.seq for c in changes[len(settled):]}
+    if fresh:
+        _dispatch(fresh)
+    return len(settled)
+
+
+def poll_once():
+    # One batch from every shard; returns the largest batch so callers keep draining
+    polled = 0
+    for shard in sorted(shards.DB_SHARDS):
+        with shards.using(shard):
+            polled = max(polled, _poll_shard(shard))
+    _state["seq"] = _state["seqs"].get(1)
+    return polled
+
+
+def prune():
+    # Any process may prune; the named lock (held by this connection) keeps it to one at a time
+    conn = get_connection("primary")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT GET_LOCK('change_log_prune', 0)")
+        if cur.fetchone()[0] != 1:
+            return 0
+        cur.execute(
+            "DELETE FROM CHANGE_LOG WHERE ChangedAt < NOW() - INTERVAL %s HOUR LIMIT 10000",
+            (CHANGEFEED_RETENTION_HOURS,),
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def _run():
+    next_prune = time.monotonic() + 600
+    while True:
+        try:
+            # Drain backlogs in full batches before sleeping
+            while poll_once() >= CHANGEFEED_BATCH:
+                pass
+            if time.monotonic() >= next_prune:
+                for shard in sorted(shards.DB_SHARDS):
+                    with shards.using(shard):
+                        prune()
+                next_prune = time.monotonic() + 600
+        except Exception as e:
+            logger.warning("changefeed poll failed: %s", e)
+        time.sleep(CHANGEFEED_POLL_INTERVAL)
+
+
+def start():
+    if not CHANGEFEED_ENABLED:
+        return
+    with _start_lock:
+        if _state["started"]:
+            return
+        _state["started"] = True
+    _install_default_consumers()
+    threading.Thread(target=_run, name="changefeed", daemon=True).start()
+
+
+# ======================== DEFAULT CONSUMERS ========================
+
+def _on_any(changes):
+    import cache
+    import events
+    tables = {c.table for c in changes}
+    cache.invalidate_tables(tables)
+    events.publish(tables)
+
+
+def _on_bookings(changes):
+    import analytics
+    months = {c.key.split("|", 1)[1][:7] for c in changes if "|" in c.key}
+    analytics.patch_months(months)
+
+
+def _on_dimensions(changes):
+    import analytics
+    analytics.mark_stale()
+
+
+def _on_aggregates(changes):
+    import refresher
+    refresher.request_refresh()
+
+
+def _install_default_consumers():
+    subscribe(_on_any)
+    subscribe(_on_bookings, {"BOOKING"})
+    subscribe(_on_dimensions, {"ROOM", "TRAVEL_AGENCY"})
+    subscribe(_on_aggregates, {"BOOKING", "ROOM", "TRAVEL_AGENCY"})
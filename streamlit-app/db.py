@@ -1,29 +1,554 @@
 import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import itertools
+import contextlib
+import contextvars
 import pandas as pd
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector import pooling
+
+import cache
+import events
+import capture
+import scheduler
+from schemas import apply_schema
 
 DB_HOST = os.environ.get("DB_HOST", "127.0.0.1")
 DB_PORT = int(os.environ.get("DB_PORT", 3307))
 DB_USER = os.environ.get("DB_USER", "group9")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "1234")
 DB_NAME = os.environ.get("DB_NAME", "hotel")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+
+# Read replicas: "host:port,host:port" (same credentials and schema as the primary)
+DB_REPLICAS = [
+    (host, int(port or 3306))
+    for host, _, port in (r.strip().partition(":") for r in os.environ.get("DB_REPLICAS", "").split(","))
+    if host
+]
+DB_MAX_REPLICA_LAG = float(os.environ.get("DB_MAX_REPLICA_LAG", 5))
+DB_LAG_CHECK_INTERVAL = float(os.environ.get("DB_LAG_CHECK_INTERVAL", 10))
+DB_REPLICA_COOLDOWN = float(os.environ.get("DB_REPLICA_COOLDOWN", 30))
+# After a write, the same session reads from the primary for this many seconds
+DB_RYW_WINDOW = float(os.environ.get("DB_RYW_WINDOW", 5))
+
+# Read statement budget (s): MAX_EXECUTION_TIME server-side, KILL QUERY after the grace period
+DB_QUERY_TIMEOUT = float(os.environ.get("DB_QUERY_TIMEOUT", 5))
+DB_CANCEL_GRACE = float(os.environ.get("DB_CANCEL_GRACE", 1))
+# Consecutive timeouts/connection failures that open the breaker, and how long it stays open
+DB_BREAKER_THRESHOLD = int(os.environ.get("DB_BREAKER_THRESHOLD", 5))
+DB_BREAKER_COOLDOWN = float(os.environ.get("DB_BREAKER_COOLDOWN", 15))
+
+PRIMARY = (DB_HOST, DB_PORT)
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pool_lock = threading.Lock()
+_replica_cycle = itertools.cycle(DB_REPLICAS) if DB_REPLICAS else None
+# (host, port) -> {"healthy": bool, "checked": monotonic time}
+_replica_health = {}
+_health_lock = threading.Lock()
+_last_write = {}
+_session_provider = threading.get_ident
+# Set by on_endpoint(): the shard primary statements go to instead of PRIMARY
+_endpoint = contextvars.ContextVar("db_endpoint", default=None)
+# Set by fresh(): reads skip the cache and the replicas
+_fresh = contextvars.ContextVar("db_fresh", default=False)
+# Set by as_session(): the session a worker thread runs statements for
+_session = contextvars.ContextVar("db_session", default=None)
+
+_SELECT_SQL = re.compile(r"^(\s*(?:\(\s*)?)SELECT\b", re.I)
+_READ_SQL = re.compile(r"^\s*(\(\s*)?(SELECT|WITH|SHOW|DESCRIBE|EXPLAIN)\b", re.I)
+_LOCKING_READ = re.compile(r"\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.I)
+
+
+# Server errors meaning "out of time" and "server unreachable or gone"
+_TIMEOUT_ERRNOS = {1317, 3024}
+_CONNECTION_ERRNOS = {1040, 1053, 2003, 2005, 2006, 2013, 2055}
+
+
+class DatabaseUnavailable(RuntimeError):
+    pass
+
+
+class QueryTimeout(DatabaseUnavailable):
+    pass
+
+
+class Overloaded(DatabaseUnavailable):
+    # Raised before reaching MySQL: the query's class queue stayed full (see scheduler.py)
+    pass
 
-def get_connection():
+
+def _get_pool(endpoint=PRIMARY):
+    pool = _pools.get(endpoint)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(endpoint)
+            if pool is None:
+                host, port = endpoint
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"hotel-{host}-{port}",
+                    pool_size=DB_POOL_SIZE,
+                    host=host,
+                    port=port,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    database=DB_NAME,
+                )
+                _pools[endpoint] = pool
+    return pool
+
+
+def _connect(endpoint):
+    try:
+        return _get_pool(endpoint).get_connection()
+    except pooling.PoolError:
+        # Pool exhausted: fall back to a one-off connection
+        pass
+    except Error as e:
+        raise DatabaseUnavailable(f"Erreur connexion MySQL: {e}")
+
+    host, port = endpoint
     try:
         return mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
+            host=host,
+            port=port,
             user=DB_USER,
             password=DB_PASSWORD,
             database=DB_NAME,
         )
     except Error as e:
-        raise RuntimeError(f"Erreur connexion MySQL: {e}")
+        raise DatabaseUnavailable(f"Erreur connexion MySQL: {e}")
+
+
+# ======================== REPLICA HEALTH ========================
+
+def _replica_lag(conn):
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SHOW REPLICA STATUS")
+    status = cur.fetchone()
+    cur.fetchall()
+    if not status:
+        return None
+    return status.get("Seconds_Behind_Source")
+
+
+def _mark_replica(endpoint, healthy):
+    with _health_lock:
+        _replica_health[endpoint] = {"healthy": healthy, "checked": time.monotonic()}
+
+
+def _replica_usable(endpoint):
+    with _health_lock:
+        health = _replica_health.get(endpoint)
+    if health is None:
+        return True, True
+    age = time.monotonic() - health["checked"]
+    if not health["healthy"]:
+        return age >= DB_REPLICA_COOLDOWN, True
+    return True, age >= DB_LAG_CHECK_INTERVAL
+
+
+def _replica_connection():
+    # Round-robin over healthy replicas; None means "use the primary"
+    for _ in range(len(DB_REPLICAS)):
+        endpoint = next(_replica_cycle)
+        usable, needs_check = _replica_usable(endpoint)
+        if not usable:
+            continue
+        try:
+            conn = _connect(endpoint)
+        except RuntimeError as e:
+            logger.warning("replica %s:%s unreachable: %s", *endpoint, e)
+            _mark_replica(endpoint, False)
+            continue
+        if needs_check:
+            try:
+                lag = _replica_lag(conn)
+            except Error as e:
+                lag = None
+                logger.warning("replica %s:%s lag check failed: %s", *endpoint, e)
+            healthy = lag is not None and lag <= DB_MAX_REPLICA_LAG
+            _mark_replica(endpoint, healthy)
+            if not healthy:
+                logger.warning("replica %s:%s skipped (lag %s)", *endpoint, lag)
+                conn.close()
+                continue
+        return conn
+    return None
+
+
+def replica_status():
+    with _health_lock:
+        return {f"{host}:{port}": dict(h) for (host, port), h in _replica_health.items()}
+
+
+# ======================== CIRCUIT BREAKER ========================
+# closed: queries go through. open: they fail at once for DB_BREAKER_COOLDOWN seconds.
+# half_open: a single probe query decides between closed and open again.
+
+_breaker = {"state": "closed", "failures": 0, "opened": 0.0, "probing": False}
+_breaker_lock = threading.Lock()
+
+
+def breaker_state():
+    with _breaker_lock:
+        if _breaker["state"] == "open" and time.monotonic() - _breaker["opened"] >= DB_BREAKER_COOLDOWN:
+            return "half_open"
+        return _breaker["state"]
+
+
+def _breaker_admit():
+    with _breaker_lock:
+        if _breaker["state"] == "closed":
+            return
+        if _breaker["state"] == "open" and time.monotonic() - _breaker["opened"] >= DB_BREAKER_COOLDOWN:
+            _breaker["state"] = "half_open"
+            _breaker["probing"] = False
+        if _breaker["state"] == "half_open" and not _breaker["probing"]:
+            _breaker["probing"] = True
+            return
+    raise DatabaseUnavailable("Base de données surchargée, nouvel essai dans quelques secondes")
+
+
+def _breaker_record(ok):
+    with _breaker_lock:
+        _breaker["probing"] = False
+        if ok:
+            _breaker["state"] = "closed"
+            _breaker["failures"] = 0
+            return
+        _breaker["failures"] += 1
+        if _breaker["state"] == "half_open" or _breaker["failures"] >= DB_BREAKER_THRESHOLD:
+            if _breaker["state"] != "open":
+                logger.warning("circuit breaker open after %d failure(s)", _breaker["failures"])
+            _breaker["state"] = "open"
+            _breaker["opened"] = time.monotonic()
+
+
+def _guarded(call):
+    # Timeouts and connection failures count against the breaker; any other outcome,
+    # including SQL errors, proves the server answered
+    _breaker_admit()
+    try:
+        result = call()
+    except DatabaseUnavailable:
+        _breaker_record(False)
+        raise
+    except Exception:
+        _breaker_record(True)
+        raise
+    _breaker_record(True)
+    return result
+
+
+# ======================== STATEMENT BUDGETS ========================
+
+def _with_time_budget(sql, timeout):
+    # Optimizer hint on the top-level SELECT; other statements rely on KILL QUERY only
+    return _SELECT_SQL.sub(rf"\1SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */", sql, count=1)
+
+
+def _kill_query(endpoint, connection_id, budget):
+    # budget: {"lock", "done", "killed"} shared with _fetch. Connecting can take seconds:
+    # the query may have finished meanwhile, so "done" is checked again under the lock,
+    # which _fetch takes before handing the connection back to the pool
+    if budget["done"]:
+        return
+    host, port = endpoint
+    try:
+        killer = mysql.connector.connect(
+            host=host, port=port, user=DB_USER, password=DB_PASSWORD, connection_timeout=3
+        )
+        try:
+            with budget["lock"]:
+                if budget["done"]:
+                    return
+                killer.cursor().execute(f"KILL QUERY {int(connection_id)}")
+                budget["killed"] = True
+        finally:
+            killer.close()
+        logger.warning("query on connection %s cancelled after its time budget", connection_id)
+    except Error as e:
+        logger.warning("query cancellation on connection %s failed: %s", connection_id, e)
+
+
+def _discard(conn):
+    # Closing a pooled connection returns it to the pool; disconnected first, the pool
+    # reconnects it before handing it out again
+    try:
+        getattr(conn, "_cnx", conn).disconnect()
+    except Error:
+        pass
+    try:
+        conn.close()
+    except Error:
+        pass
+
 
-def run_query(sql: str, params=None) -> pd.DataFrame:
-    conn = get_connection()
+def _errno(e):
+    # pandas wraps driver errors; the MySQL error number is on the cause
+    while e is not None:
+        if getattr(e, "errno", None):
+            return e.errno
+        e = e.__cause__
+    return None
+
+
+# ======================== ROUTING ========================
+
+def set_session_provider(provider):
+    # Callable returning an id for the current user session (read-your-writes scope)
+    global _session_provider
+    _session_provider = provider
+
+
+def session_id():
+    session = _session.get()
+    return session if session is not None else _session_provider()
+
+
+@contextlib.contextmanager
+def as_session(session):
+    # Statements issued in this block count as `session`'s, whatever thread runs them:
+    # the session provider may read thread-local state (Streamlit's script context)
+    token = _session.set(session)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def mark_write():
+    now = time.monotonic()
+    if len(_last_write) > 1000:
+        for key, at in list(_last_write.items()):
+            if now - at >= DB_RYW_WINDOW:
+                _last_write.pop(key, None)
+    _last_write[session_id()] = now
+
+
+def last_write():
+    # Monotonic time of the current session's last write, None if it never wrote
+    return _last_write.get(session_id())
+
+
+def _recent_write():
+    if _fresh.get():
+        return True
+    last = _last_write.get(session_id())
+    return last is not None and time.monotonic() - last < DB_RYW_WINDOW
+
+
+def is_read(sql):
+    return bool(_READ_SQL.match(sql)) and not _LOCKING_READ.search(sql)
+
+
+@contextlib.contextmanager
+def on_endpoint(endpoint):
+    # Statements issued in this block (this thread or task) go to `endpoint`; see shards.py
+    token = _endpoint.set(None if endpoint == PRIMARY else endpoint)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+
+@contextlib.contextmanager
+def fresh():
+    # Reads in this block see at least everything committed before it started: no cache,
+    # no replica, no sharing an execution already in flight
+    token = _fresh.set(True)
+    try:
+        yield
+    finally:
+        _fresh.reset(token)
+
+
+def current_endpoint():
+    return _endpoint.get() or PRIMARY
+
+
+def get_connection(role="primary"):
+    # Replicas only serve the primary; another shard is always read from its own primary
+    endpoint = _endpoint.get()
+    if endpoint is not None:
+        return _connect(endpoint)
+    if role == "replica" and DB_REPLICAS:
+        conn = _replica_connection()
+        if conn is not None:
+            return conn
+    return _connect(PRIMARY)
+
+
+def route_for(sql, route=None):
+    if route is not None:
+        return route
+    if not is_read(sql) or _recent_write():
+        return "primary"
+    return "replica"
+
+
+def warm_pool():
+    # Open every pooled connection up front so the first page view doesn't pay for it
+    for endpoint in [PRIMARY] + DB_REPLICAS:
+        conns = []
+        try:
+            for _ in range(DB_POOL_SIZE):
+                conns.append(_get_pool(endpoint).get_connection())
+        except (pooling.PoolError, Error):
+            pass
+        finally:
+            for conn in conns:
+                conn.close()
+
+
+def _fetch(sql, params, route, timeout):
+    conn = get_connection(route_for(sql, route))
+    budget = {"lock": threading.Lock(), "done": False, "killed": False}
+    timer = None
+    if timeout:
+        sql = _with_time_budget(sql, timeout)
+        timer = threading.Timer(
+            timeout + DB_CANCEL_GRACE,
+            _kill_query,
+            ((conn.server_host, conn.server_port), conn.connection_id, budget),
+        )
+        timer.daemon = True
+        timer.start()
     try:
         return pd.read_sql(sql, conn, params=params)
+    except Exception as e:
+        errno = _errno(e)
+        if errno in _TIMEOUT_ERRNOS:
+            raise QueryTimeout(f"Requête interrompue après {timeout:.0f} s") from e
+        if errno in _CONNECTION_ERRNOS:
+            raise DatabaseUnavailable(f"Erreur connexion MySQL: {e}") from e
+        raise
+    finally:
+        with budget["lock"]:
+            budget["done"] = True
+        if timer is not None:
+            timer.cancel()
+        if budget["killed"]:
+            # A kill can land after the statement ended; never reuse that session
+            _discard(conn)
+        else:
+            conn.close()
+
+
+def _capture(sql, params, qclass, start, rows=None, write=False, error=None):
+    # Opt-in statement log (DB_CAPTURE_FILE, see capture.py and replay.py)
+    if not capture.DB_CAPTURE_FILE:
+        return
+    capture.record(
+        query_id(sql), sql, params, qclass, time.perf_counter() - start, session_id(),
+        rows=rows, write=write, error=None if error is None else str(_errno(error) or type(error).__name__),
+    )
+
+
+def _admit(qclass, call, key=None):
+    try:
+        return scheduler.run(qclass, call, key=key)
+    except scheduler.AdmissionTimeout as e:
+        raise Overloaded(str(e)) from e
+
+
+def query_id(sql):
+    # Stable short id for a statement text, shared by logs and metrics
+    return hashlib.sha1(sql.encode()).hexdigest()[:10]
+
+
+def _read(sql, params, route, schema, timeout=DB_QUERY_TIMEOUT, qclass=None):
+    route = route_for(sql, route)
+    qclass = qclass or scheduler.classify(sql)
+
+    def call():
+        start = time.perf_counter()
+        try:
+            df = _guarded(lambda: _fetch(sql, params, route, timeout))
+        except Exception as e:
+            _capture(sql, params, qclass, start, error=e)
+            raise
+        _capture(sql, params, qclass, start, rows=len(df))
+        if schema:
+            apply_schema(df, schema, label=" ".join(sql.split())[:60])
+        logger.info("query", extra={
+            "query_id": query_id(sql),
+            "qclass": qclass,
+            "route": route,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "rows": len(df),
+            "sample": True,
+        })
+        return df
+
+    # Identical reads in flight on the same route share one execution
+    key = (sql, repr(params), route, repr(sorted(schema.items())) if schema else None, timeout, _endpoint.get())
+    return _admit(qclass, call, key if is_read(sql) and not _fresh.get() else None)
+
+
+def run_query(sql: str, params=None, route=None, ttl=None, schema=None, timeout=DB_QUERY_TIMEOUT,
+              qclass=None) -> pd.DataFrame:
+    # route: None (automatic), "primary" or "replica"
+    # ttl: seconds to share the result through the cache backend (see cache.py); cached
+    #   queries fall back to their last good result when the database is unavailable
+    # schema: column -> dtype map applied once before caching (see schemas.py)
+    # timeout: statement budget in seconds, None for no limit
+    # qclass: scheduler class ("write", "point", "listing", "analytics"), guessed from the SQL by default
+    if ttl is None or not is_read(sql) or _recent_write():
+        return _read(sql, params, route, schema, timeout, qclass)
+    suffix = f":{sorted(schema.items())!r}" if schema else ""
+    if _endpoint.get() is not None:
+        suffix += "@{}:{}".format(*_endpoint.get())
+    return cache.get_or_stale(
+        cache.query_key(sql, params) + suffix,
+        cache.stable_key(sql, params) + suffix,
+        ttl,
+        lambda: _read(sql, params, route, schema, timeout, qclass),
+        degraded=breaker_state() != "closed",
+        errors=(DatabaseUnavailable,),
+    )
+
+
+def _write(sql, params):
+    conn = get_connection("primary")
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+        except Error as e:
+            if _errno(e) in _CONNECTION_ERRNOS:
+                raise DatabaseUnavailable(f"Erreur connexion MySQL: {e}") from e
+            raise
+        conn.commit()
+        return cur.rowcount
     finally:
         conn.close()
+
+
+def _captured_write(sql, params):
+    start = time.perf_counter()
+    try:
+        rowcount = _guarded(lambda: _write(sql, params))
+    except Exception as e:
+        _capture(sql, params, "write", start, write=True, error=e)
+        raise
+    _capture(sql, params, "write", start, rowcount, write=True)
+    return rowcount
+
+
+def execute(sql: str, params=None) -> int:
+    rowcount = _admit("write", lambda: _captured_write(sql, params))
+    mark_write()
+    tables = cache.tables_in(sql)
+    cache.invalidate_tables(tables)
+    events.publish(tables)
+    return rowcount
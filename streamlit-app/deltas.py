@@ -0,0 +1,193 @@
+import os
+import time
+
+import pandas as pd
+
+import events
+import shards
+import sessions
+import changefeed
+from db import run_query, DatabaseUnavailable
+
+# A session's listing is loaded once, then kept current from CHANGE_LOG: the BOOKING
+# triggers give every insert, update and delete a sequence number, which serves as the
+# row version (and covers deletes, which a timestamp column could not). A rerun with no
+# new change event costs no query at all.
+DELTA_MAX_CHANGES = int(os.environ.get("DELTA_MAX_CHANGES", 500))
+# Changes younger than this may still have lower, uncommitted sequence numbers around
+# them: they are applied, but the watermark stays before them until they settle
+DELTA_SETTLE = float(os.environ.get("DELTA_SETTLE", 2))
+# Without a change event, still look at the log this often (change feed off, missed event)
+DELTA_MAX_AGE = float(os.environ.get("DELTA_MAX_AGE", 30))
+# Past the change log retention a delta cannot be trusted: reload
+DELTA_MAX_GAP = changefeed.CHANGEFEED_RETENTION_HOURS * 3600 / 2
+
+# Joined tables: a change there can alter any row, so it triggers a full reload
+DIMENSIONS = {"ROOM", "TRAVEL_AGENCY"}
+
+sql_changes_since = """
+SELECT Seq, TableName, RowKey, ChangedAt < NOW(3) - INTERVAL %s SECOND AS settled
+FROM CHANGE_LOG
+WHERE Seq > %s
+ORDER BY Seq
+LIMIT %s
+"""
+
+
+def _kpis(t):
+    return {
+        "reservations": t.get("n", 0),
+        "chiffre_affaires": t.get("cost", 0.0),
+        "duree_moyenne": t["duree"] / t["duree_n"] if t.get("duree_n") else None,
+        "cout_journalier_moyen": t["daily"] / t["daily_n"] if t.get("daily_n") else None,
+    }
+
+
+class DeltaListing:
+    # query: the listing SELECT with its filters and without ORDER BY; it must return a
+    # RowKey column equal to CONCAT(ROOM_CodR, '|', StartDate) and be filterable on
+    # (B.ROOM_CodR, B.StartDate). incremental=False (archive included: BOOKING_ARCHIVE
+    # has no change log) reloads in full whenever the bookings change. A listing reads one
+    # shard (its CHANGE_LOG numbers that shard's changes); see sync_all for the chain.
+    def __init__(self, query, params, schema, order="StartDate", incremental=True, shard=1):
+        self.query = query
+        self.params = list(params)
+        self.schema = schema
+        self.order = order
+        self.incremental = incremental
+        self.shard = shard
+        self.frame = None
+        # Bumped whenever the frame's rows change (not when it is spilled or restored)
+        self.version = 0
+        self.watermark = 0
+        self.event_seq = -1
+        self.checked = 0.0
+        self.pending = False
+        self.totals = {}
+        self.stats = {"full": 0, "delta": 0, "skipped": 0, "rows": 0}
+
+    # ---------- KPIs ----------
+    # Sums and counts are kept alongside the frame and moved by each delta; the averages
+    # are derived from them, so KPIs never rescan the listing.
+    def _totals(self, df, sign=1):
+        return {
+            "n": sign * len(df),
+            "cost": sign * float(df["Cost"].sum()),
+            "duree": sign * float(df["Duree"].sum()),
+            "duree_n": sign * int(df["Duree"].count()),
+            "daily": sign * float(df["Cout_Journalier"].sum()),
+            "daily_n": sign * int(df["Cout_Journalier"].count()),
+        }
+
+    def _add_totals(self, delta):
+        for name, value in delta.items():
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def kpis(self):
+        return _kpis(self.totals)
+
+    # ---------- SYNC ----------
+    def _load(self):
+        # Settled, not the head: a lower Seq still in flight is above the watermark and
+        # fetched by the next delta even though the load may have missed it
+        watermark = changefeed.settled_seq()
+        df = run_query(f"{self.query} ORDER BY B.{self.order} DESC", self.params, route="primary", schema=self.schema)
+        self.frame = df.reset_index(drop=True)
+        self.totals = {}
+        self._add_totals(self._totals(self.frame))
+        # Changes above it that the load did see are applied again, harmlessly
+        self.watermark = watermark
+        self.pending = False
+        self.version += 1
+        self.stats["full"] += 1
+
+    def _apply(self, keys):
+        pairs = [key.split("|", 1) for key in keys]
+        placeholders = ", ".join(["(%s, %s)"] * len(pairs))
+        fresh = run_query(
+            f"{self.query} AND (B.ROOM_CodR, B.StartDate) IN ({placeholders})",
+            self.params + [value for pair in pairs for value in pair],
+            route="primary",
+            schema=self.schema,
+        )
+        old = self.frame
+        gone = old["RowKey"].isin(keys)
+        self._add_totals(self._totals(old[gone], sign=-1))
+        self._add_totals(self._totals(fresh))
+        merged = pd.concat([old[~gone], fresh], ignore_index=True)
+        for column in old.columns:
+            # concat turns categoricals with different categories into object
+            if isinstance(old[column].dtype, pd.CategoricalDtype) and not isinstance(merged[column].dtype, pd.CategoricalDtype):
+                merged[column] = merged[column].astype("category")
+        self.frame = merged.sort_values(self.order, ascending=False, kind="stable", ignore_index=True)
+        self.version += 1
+        self.stats["rows"] += len(fresh)
+
+    def sync(self):
+        # Pinned: the session sweeper must not spill the frame halfway through a merge
+        with shards.using(self.shard), sessions.pinned():
+            return self._sync()
+
+    def _sync(self):
+        # Returns the current frame; on a database outage, the previous one marked stale
+        now = time.monotonic()
+        # Spilled to disk by the session sweeper while idle
+        spilled = self.frame
+        self.frame = sessions.restore(spilled)
+        sessions.discard(spilled)
+        event_seq = events.version(["BOOKING", "BOOKING_ARCHIVE"] + sorted(DIMENSIONS))[0]
+        try:
+            if self.frame is None or now - self.checked > DELTA_MAX_GAP:
+                self._load()
+            elif event_seq == self.event_seq and not self.pending and now - self.checked < DELTA_MAX_AGE:
+                self.stats["skipped"] += 1
+                return self.frame
+            elif not self.incremental:
+                self._load()
+            else:
+                self._delta()
+        except DatabaseUnavailable:
+            if self.frame is None:
+                raise
+            self.frame.attrs["stale_age"] = now - self.checked
+            return self.frame
+        self.event_seq = event_seq
+        self.checked = now
+        self.frame.attrs.pop("stale_age", None)
+        return self.frame
+
+    def _delta(self):
+        changes = run_query(
+            sql_changes_since, [DELTA_SETTLE, self.watermark, DELTA_MAX_CHANGES + 1], route="primary", qclass="point"
+        )
+        if changes.empty:
+            return
+        if len(changes) > DELTA_MAX_CHANGES or changes["TableName"].isin(DIMENSIONS).any():
+            self._load()
+            return
+        bookings = changes[changes["TableName"] == "BOOKING"]
+        if not bookings.empty:
+            self._apply(set(bookings["RowKey"].astype(str)))
+        # Advance only over the settled prefix; the rest is fetched again next time
+        settled = changes["settled"].astype(bool).to_numpy()
+        unsettled = (~settled).nonzero()[0]
+        upto = unsettled[0] if len(unsettled) else len(changes)
+        if upto:
+            self.watermark = int(changes["Seq"].iloc[upto - 1])
+        self.pending = upto < len(changes)
+        self.stats["delta"] += 1
+
+
+def sync_all(listings):
+    # The same listing on each shard: one frame in listing order, and KPIs from the
+    # added-up totals
+    frames = [listing.sync() for listing in listings]
+    if len(frames) == 1:
+        return frames[0], listings[0].kpis()
+    totals = {}
+    for listing in listings:
+        for name, value in listing.totals.items():
+            totals[name] = totals.get(name, 0) + value
+    order = listings[0].order
+    frame = shards.concat(frames).sort_values(order, ascending=False, kind="stable", ignore_index=True)
+    return frame, _kpis(totals)
@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+from collections import deque
+
+# In-process change notifications. Writes (db.execute), the change feed and the summary
+# refresher publish table names; each page section holds a Subscription over the tables
+# it shows and reloads only once their changes have settled.
+LIVE_DEBOUNCE = float(os.environ.get("LIVE_DEBOUNCE", 1.5))
+LIVE_MAX_DELAY = float(os.environ.get("LIVE_MAX_DELAY", 10))
+LIVE_LOG_SIZE = 2000
+
+# (seq, table, monotonic time), oldest first
+_log = deque(maxlen=LIVE_LOG_SIZE)
+_state = {"seq": 0}
+# table -> (seq, wall-clock time) of its latest change
+_changed = {}
+_started_at = time.time()
+_lock = threading.Lock()
+
+
+def publish(tables):
+    now = time.monotonic()
+    wall = time.time()
+    with _lock:
+        for table in tables:
+            _state["seq"] += 1
+            _log.append((_state["seq"], table.upper(), now))
+            _changed[table.upper()] = (_state["seq"], wall)
+
+
+def head():
+    return _state["seq"]
+
+
+def version(tables):
+    # (seq, time) of the latest change to any of the tables seen by this process;
+    # (0, process start) when none changed since
+    with _lock:
+        changes = [_changed[t.upper()] for t in tables if t.upper() in _changed]
+    return max(changes, default=(0, _started_at))
+
+
+class Subscription:
+    def __init__(self, tables):
+        self.tables = frozenset(t.upper() for t in tables)
+        self.seen = head()
+
+    def ready(self):
+        # True once, after changes to the subscribed tables have been quiet for LIVE_DEBOUNCE
+        # seconds (or have been pending for LIVE_MAX_DELAY): bursts collapse into one reload
+        now = time.monotonic()
+        with _lock:
+            current = _state["seq"]
+            if current == self.seen:
+                return False
+            first = last = None
+            for seq, table, at in reversed(_log):
+                if seq <= self.seen:
+                    break
+                if table in self.tables:
+                    last = last if last is not None else at
+                    first = at
+            else:
+                if len(_log) == _log.maxlen:
+                    # Events older than the log may have touched our tables
+                    self.seen = current
+                    return True
+            if last is None:
+                self.seen = current
+                return False
+            if now - last < LIVE_DEBOUNCE and now - first < LIVE_MAX_DELAY:
+                return False
+            self.seen = current
+            return True
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+# Upper bound on points sent to st.map, whatever the network size
+MAX_MAP_POINTS = 500
+
+
+def haversine_km(lat, lon, lats, lons):
+    # Distance from one point to arrays of points, vectorized
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    # Equal-angle grid: each cell_deg x cell_deg cell holds the row positions of its points.
+    # Radius queries only look at the cells overlapping the query's bounding box.
+
+    def __init__(self, lats, lons, cell_deg=0.5):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_deg = cell_deg
+        valid = ~(np.isnan(self.lats) | np.isnan(self.lons))
+        rows = np.flatnonzero(valid)
+        keys = self._cells(self.lats[rows], self.lons[rows])
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        rows, keys = rows[order], keys[order]
+        uniq, starts = np.unique(keys, axis=0, return_index=True)
+        bounds = np.append(starts, len(rows))
+        self._buckets = {
+            (int(c[0]), int(c[1])): rows[bounds[i]:bounds[i + 1]]
+            for i, c in enumerate(uniq)
+        }
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cells(self, lats, lons):
+        return np.stack([
+            np.floor(lats / self.cell_deg).astype(np.int64),
+            np.floor(lons / self.cell_deg).astype(np.int64),
+        ], axis=1)
+
+    def within(self, lat, lon, radius_km):
+        # Row positions and distances of every point within radius_km, nearest first
+        dlat = radius_km / KM_PER_DEG_LAT
+        cos_lat = max(np.cos(np.radians(lat)), 1e-6)
+        dlon = min(radius_km / (KM_PER_DEG_LAT * cos_lat), 180.0)
+        lat_cells = range(int(np.floor((lat - dlat) / self.cell_deg)), int(np.floor((lat + dlat) / self.cell_deg)) + 1)
+        if dlon >= 180.0:
+            lon_cells = None
+        else:
+            lon_cells = range(int(np.floor((lon - dlon) / self.cell_deg)), int(np.floor((lon + dlon) / self.cell_deg)) + 1)
+
+        if lon_cells is None or len(lat_cells) * len(lon_cells) > len(self._buckets):
+            # Query box larger than the populated grid: scan the buckets instead
+            parts = [rows for (clat, _), rows in self._buckets.items() if clat in lat_cells]
+        else:
+            # Longitude cells wrap around the antimeridian
+            wrap = round(360 / self.cell_deg)
+            cells = {(clat, (clon + wrap // 2) % wrap - wrap // 2) for clat in lat_cells for clon in lon_cells}
+            parts = [self._buckets[c] for c in cells if c in self._buckets]
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        candidates = np.concatenate(parts)
+        dist = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        keep = dist <= radius_km
+        candidates, dist = candidates[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return candidates[order], dist[order]
+
+    def nearest(self, lat, lon, k=5):
+        # Expanding radius search: once k points lie within r, they are the k nearest
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            rows, dist = self.within(lat, lon, radius)
+            if len(rows) >= k or radius >= np.pi * EARTH_RADIUS_KM:
+                return rows[:k], dist[:k]
+            radius *= 2
+
+
+def cluster_points(lats, lons, zoom, max_points=MAX_MAP_POINTS):
+    # Server-side map decimation: one weighted centroid per grid cell sized for the zoom level
+    # (about four clusters per 256 px map tile). Coarsens until at most max_points remain.
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    lats, lons = lats[valid], lons[valid]
+    if len(lats) == 0:
+        return pd.DataFrame({"latitude": [], "longitude": [], "count": []})
+
+    zoom = int(zoom)
+    while True:
+        cell = 360.0 / (2 ** zoom) / 4
+        keys = np.floor(lats / cell).astype(np.int64) * 1_000_003 + np.floor(lons / cell).astype(np.int64)
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if len(counts) <= max_points or zoom <= 0:
+            break
+        zoom -= 1
+
+    return pd.DataFrame({
+        "latitude": np.bincount(inverse, weights=lats) / counts,
+        "longitude": np.bincount(inverse, weights=lons) / counts,
+        "count": counts,
+    })
+
+
+_index_cache = {"key": None, "index": None}
+_index_lock = threading.Lock()
+
+
+def index_for(df, lat_col="latitude", lon_col="longitude"):
+    # Rebuilds the grid only when the frame's contents change
+    key = int(pd.util.hash_pandas_object(df[[lat_col, lon_col]], index=False).sum())
+    with _index_lock:
+        if _index_cache["key"] != key:
+            _index_cache["index"] = GridIndex(df[lat_col].to_numpy(), df[lon_col].to_numpy())
+            _index_cache["key"] = key
+        return _index_cache["index"]
@@ -1,3 +1,3 @@
 #!/bin/bash
 # Install all required Python libraries for the Streamlit hotel reservation app
-pip install pandas mysql-connector-python streamlit altair matplotlib
+pip install pandas mysql-connector-python streamlit altair matplotlib pillow duckdb pyarrow starlette uvicorn
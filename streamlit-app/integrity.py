@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import logging
+import argparse
+from datetime import date
+from itertools import groupby
+
+import pandas as pd
+
+import shards
+import changefeed
+from db import get_connection, run_query
+
+# One pass over BOOKING in primary key order (ROOM_CodR, StartDate): each room's stays are
+# swept by start date, so overlaps cost O(n log n) instead of a self-join. Later checks
+# only rescan the rooms touched since the CHANGE_LOG sequence stored with the last report.
+# Each shard is checked on its own instance (a room's stays all live on its hotel's
+# shard) and keeps its own sequence, since every CHANGE_LOG numbers its own rows.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTEGRITY_DIR = os.environ.get("INTEGRITY_DIR", os.path.join(BASE_DIR, ".cache", "integrity"))
+STATE_FILE = os.path.join(INTEGRITY_DIR, "state.json")
+FETCH_SIZE = 5000
+# Beyond this many touched rooms an incremental check rescans everything
+INCREMENTAL_MAX_ROOMS = 2000
+
+logger = logging.getLogger(__name__)
+
+ISSUE_LABELS = {
+    "chevauchement": "Séjours qui se chevauchent",
+    "duree_nulle": "Durée nulle ou négative",
+    "date_invalide": "Date illisible",
+    "chambre_orpheline": "Chambre inexistante",
+    "agence_orpheline": "Agence inexistante",
+}
+
+sql_scan = """
+SELECT B.ROOM_CodR, B.StartDate, B.EndDate, B.TRAVEL_AGENCY_CodA,
+       R.CodR IS NULL AS room_missing, T.CodA IS NULL AS agency_missing
+FROM BOOKING B
+LEFT JOIN ROOM R ON R.CodR = B.ROOM_CodR
+LEFT JOIN TRAVEL_AGENCY T ON T.CodA = B.TRAVEL_AGENCY_CodA
+{where}
+ORDER BY B.ROOM_CodR, B.StartDate
+"""
+
+
+def _parse(value):
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+def _literal(value):
+    return str(int(value)) if isinstance(value, int) else "'" + str(value).replace("'", "''") + "'"
+
+
+def _issue(kind, row, correction, sql=None, conflict=None):
+    room, start, end, agency = row[:4]
+    return {
+        "type": kind,
+        "chambre": int(room),
+        "debut": str(start),
+        "fin": str(end),
+        "agence": int(agency),
+        "conflit": conflict,
+        "correction": correction,
+        "sql": sql,
+    }
+
+
+def _where_key(row):
+    return f"ROOM_CodR = {_literal(int(row[0]))} AND StartDate = {_literal(row[1])}"
+
+
+def _overlap(blocking, row, blocking_dates, row_dates):
+    # `row` starts before `blocking` ends; drop it when it sits inside, else end `blocking` at its start
+    conflict = f"{blocking[0]}|{blocking[1]}"
+    if row_dates[1] <= blocking_dates[1] or row_dates[0] == blocking_dates[0]:
+        return _issue(
+            "chevauchement", row,
+            f"Séjour inclus dans {conflict} : supprimer le doublon",
+            f"DELETE FROM BOOKING WHERE {_where_key(row)};",
+            conflict,
+        )
+    return _issue(
+        "chevauchement", row,
+        f"Commence avant la fin de {conflict} : avancer la fin de celui-ci au {row_dates[0]}",
+        f"UPDATE BOOKING SET EndDate = {_literal(row_dates[0].isoformat())} WHERE {_where_key(blocking)};",
+        conflict,
+    )
+
+
+def check_room(rows):
+    # rows: one room's bookings, (room, start, end, agency, room_missing, agency_missing)
+    issues, dated = [], []
+    for row in rows:
+        if row[4]:
+            issues.append(_issue("chambre_orpheline", row, "Réaffecter à une chambre existante ou supprimer"))
+        if row[5]:
+            issues.append(_issue("agence_orpheline", row, "Réaffecter à une agence existante ou supprimer"))
+        start, end = _parse(row[1]), _parse(row[2])
+        if start is None or end is None:
+            issues.append(_issue("date_invalide", row, "Ressaisir les dates au format AAAA-MM-JJ"))
+        elif end <= start:
+            issues.append(_issue("duree_nulle", row, "Fin à corriger : le coût journalier est indéfini (division par zéro)"))
+        else:
+            dated.append(((start, end), row))
+
+    # Sweep by start date, keeping the stay that reaches furthest so far (half-open stays:
+    # leaving on the day another arrives is not an overlap). Rows come in StartDate order,
+    # which is date order for well-formed values, so this sort is usually already done.
+    dated.sort(key=lambda item: item[0])
+    reach = None
+    for dates, row in dated:
+        if reach is not None and dates[0] < reach[0][1]:
+            issues.append(_overlap(reach[1], row, reach[0], dates))
+        if reach is None or dates[1] > reach[0][1]:
+            reach = (dates, row)
+    return issues
+
+
+def scan(rooms=None):
+    # Streams the rows rather than loading BOOKING into memory; returns (issues, rows read)
+    where, params = "", []
+    if rooms is not None:
+        if not rooms:
+            return [], 0
+        where = f"WHERE B.ROOM_CodR IN ({','.join(['%s'] * len(rooms))})"
+        params = sorted(rooms)
+    conn = get_connection("primary")
+    issues, count = [], 0
+    try:
+        cur = conn.cursor()
+        cur.execute(sql_scan.format(where=where), params)
+
+        def rows():
+            nonlocal count
+            while True:
+                batch = cur.fetchmany(FETCH_SIZE)
+                if not batch:
+                    return
+                count += len(batch)
+                yield from batch
+
+        for _, room_rows in groupby(rows(), key=lambda r: r[0]):
+            issues.extend(check_room(room_rows))
+    finally:
+        conn.close()
+    return issues, count
+
+
+# ======================== INCREMENTAL STATE ========================
+
+def load_report():
+    try:
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_report(report):
+    os.makedirs(INTEGRITY_DIR, exist_ok=True)
+    tmp = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(tmp, STATE_FILE)
+
+
+def _touched_rooms(after_seq, head):
+    # Rooms whose stays may have changed since after_seq, or None when the log no longer
+    # reaches back that far (pruned) and a full scan is needed
+    oldest = run_query("SELECT MIN(Seq) AS seq FROM CHANGE_LOG", route="primary", qclass="point").iloc[0]["seq"]
+    if pd.notna(oldest) and int(oldest) > after_seq + 1:
+        return None
+    rooms, agencies = set(), set()
+    while after_seq < head:
+        changes = changefeed.fetch_changes(after_seq)
+        if not changes:
+            break
+        for change in changes:
+            if change.table == "BOOKING" and "|" in change.key:
+                rooms.add(int(change.key.split("|", 1)[0]))
+            elif change.table == "ROOM":
+                rooms.add(int(change.key))
+            elif change.table == "TRAVEL_AGENCY":
+                agencies.add(int(change.key))
+        after_seq = changes[-1].seq
+    if agencies:
+        df = run_query(
+            f"SELECT DISTINCT ROOM_CodR FROM BOOKING WHERE TRAVEL_AGENCY_CodA IN ({','.join(['%s'] * len(agencies))})",
+            sorted(agencies), route="primary",
+        )
+        rooms.update(int(r) for r in df["ROOM_CodR"])
+    return rooms
+
+
+def _check_shard(after_seq):
+    # On the current shard: (settled head, rooms rescanned or None for all, issues, rows read)
+    # Read the head first: changes landing during the scan are picked up by the next check.
+    # Only the settled head: a lower Seq still uncommitted would otherwise be skipped for good
+    head = changefeed.settled_seq()
+    rooms = None
+    if after_seq is not None:
+        rooms = _touched_rooms(after_seq, head)
+        if rooms is not None and len(rooms) > INCREMENTAL_MAX_ROOMS:
+            rooms = None
+    issues, count = scan(rooms)
+    return head, rooms, issues, count
+
+
+def check(full=False):
+    started = time.monotonic()
+    previous = None if full else load_report()
+    seqs = {}
+    if previous is not None:
+        # Reports written before sharding hold a single "seq": shard 1's
+        seqs = previous.get("seqs") or {"1": previous["seq"]}
+
+    heads, checked, issues, count = {}, [], [], 0
+    for shard in sorted(shards.DB_SHARDS):
+        with shards.using(shard):
+            head, rooms, shard_issues, shard_count = _check_shard(seqs.get(str(shard)))
+        for issue in shard_issues:
+            issue["shard"] = shard
+        if rooms is not None:
+            issues.extend(
+                i for i in previous["issues"] if i.get("shard", 1) == shard and i["chambre"] not in rooms
+            )
+        issues.extend(shard_issues)
+        heads[str(shard)] = head
+        checked.append(rooms)
+        count += shard_count
+    issues.sort(key=lambda i: (i["chambre"], i["debut"]))
+
+    report = {
+        "seqs": heads,
+        "checked_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "mode": "complet" if all(rooms is None for rooms in checked) else "incrémental",
+        "chambres_verifiees": None if any(rooms is None for rooms in checked) else sum(len(rooms) for rooms in checked),
+        "lignes_lues": count,
+        "duree_s": round(time.monotonic() - started, 2),
+        "issues": issues,
+    }
+    _save_report(report)
+    logger.info("integrity check (%s): %d rows, %d issues", report["mode"], count, len(issues))
+    return report
+
+
+def summary(report):
+    counts = {}
+    for issue in report["issues"]:
+        counts[issue["type"]] = counts.get(issue["type"], 0) + 1
+    return [{"anomalie": ISSUE_LABELS[kind], "nombre": counts.get(kind, 0)} for kind in ISSUE_LABELS]
+
+
+def repair_script(report):
+    # Suggested statements only; nothing is applied automatically
+    lines = [f"-- Rapport d'intégrité du {report['checked_at']} ({len(report['issues'])} anomalies)"]
+    # Statements run on the shard holding the room (DB_SHARDS)
+    for shard in sorted({i.get("shard", 1) for i in report["issues"]}):
+        if shards.enabled():
+            lines.append(f"-- ===== Shard {shard} ({'{}:{}'.format(*shards.DB_SHARDS.get(shard, ('?', '?')))}) =====")
+        for issue in (i for i in report["issues"] if i.get("shard", 1) == shard):
+            lines.append(f"-- {ISSUE_LABELS[issue['type']]} : chambre {issue['chambre']}, {issue['debut']} → {issue['fin']}. {issue['correction']}")
+            if issue["sql"]:
+                lines.append(issue["sql"])
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    # python integrity.py [--full] [--sql repairs.sql]  -> e.g. nightly from cron
+    parser = argparse.ArgumentParser(description="Contrôle d'intégrité des réservations")
+    parser.add_argument("--full", action="store_true", help="tout relire au lieu des seules chambres modifiées")
+    parser.add_argument("--sql", help="écrire les corrections proposées dans ce fichier")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = check(full=args.full)
+    print(f"Contrôle {report['mode']} : {report['lignes_lues']} ligne(s) lue(s) en {report['duree_s']} s")
+    for line in summary(report):
+        print(f"  {line['anomalie']:<28}{line['nombre']:>6}")
+    if args.sql:
+        with open(args.sql, "w", encoding="utf-8") as f:
+            f.write(repair_script(report))
+        print(f"Corrections proposées : {args.sql}")
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import hashlib
+from functools import lru_cache
+
+import streamlit as st
+
+import db
+import events
+import sessions
+from refresher import data_age
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stylesheet shared by every page; pages append their own in cascade order
+BASE_STYLES = ("styles/main.css",)
+
+NAV_PAGES = [
+    ("📊 Dashboard", "app.py"),
+    ("📅 Réservations", "pages/Réservations.py"),
+    ("🛏️ Chambres", "pages/Chambres.py"),
+    ("🤝 Agences", "pages/Agences.py"),
+]
+
+SIDEBAR_HEADER = """
+<div class="sidebar-header">
+    <div class="hotel-logo">🏨</div>
+    <div class="hotel-name">Grand Hotel Chain</div>
+    <div class="hotel-role">Hotel Management System</div>
+</div>
+"""
+
+SIDEBAR_FOOTER = """
+<div class="sidebar-footer">
+    Groupe 9 • PMS Hôtelier
+</div>
+"""
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Whitespace before ":" is kept: ".a :hover" is not ".a:hover"
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+# An @import ends at the ";" after its URL, which may itself contain ";"
+# (Google Fonts: "wght@400;500;600")
+_IMPORT_RE = re.compile(r"""@import\s*(?:url\([^)]*\)|"[^"]*"|'[^']*')[^;{}]*;""")
+
+
+@lru_cache(maxsize=None)
+def css_bundle(extra=()):
+    # Read, minify and concatenate once per process; returns (hash, css)
+    parts = []
+    for rel in BASE_STYLES + tuple(extra):
+        with open(os.path.join(BASE_DIR, rel), encoding="utf-8") as f:
+            parts.append(minify_css(f.read()))
+
+    # @import rules are only valid at the top of a stylesheet
+    imports = []
+    body = []
+    for css in parts:
+        imports.extend(_IMPORT_RE.findall(css))
+        body.append(_IMPORT_RE.sub("", css))
+
+    bundle = "".join(imports + body)
+    return hashlib.sha256(bundle.encode("utf-8")).hexdigest()[:12], bundle
+
+
+@lru_cache(maxsize=None)
+def _style_tag(extra=()):
+    digest, bundle = css_bundle(extra)
+    return f'<style data-bundle="{digest}">{bundle}</style>'
+
+
+def apply_styles(*extra):
+    st.markdown(_style_tag(tuple(extra)), unsafe_allow_html=True)
+
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f} min"
+    return f"{seconds // 3600:.0f} h"
+
+
+def render_sidebar():
+    with st.sidebar:
+        st.markdown(SIDEBAR_HEADER, unsafe_allow_html=True)
+
+        st.markdown("---")
+
+        st.markdown("### 🧭 Navigation")
+        for label, page in NAV_PAGES:
+            if st.button(label, use_container_width=True):
+                st.switch_page(page)
+
+        st.markdown("---")
+
+        st.markdown("### ⚙️ Système")
+        if db.breaker_state() == "closed":
+            st.success("🟢 PMS en ligne")
+        else:
+            st.warning("🟠 Base de données dégradée : affichage des dernières données connues")
+        age = data_age()
+        if age is None:
+            st.caption("Synchronisation des données en cours…")
+        else:
+            st.caption(f"Données synchronisées il y a {format_age(age)}")
+
+        st.markdown(SIDEBAR_FOOTER, unsafe_allow_html=True)
+
+
+def stale_badge(df):
+    # Shown under a section served from the last good result (see cache.get_or_stale)
+    age = df.attrs.get("stale_age")
+    if age is not None:
+        st.caption(f"⏳ Données en cache (il y a {format_age(age)}), actualisation en cours")
+
+
+def show_error(message, error):
+    if isinstance(error, db.DatabaseUnavailable):
+        st.warning(f"{message} : base de données momentanément indisponible, réessayez dans quelques instants")
+    else:
+        st.error(message)
+        st.code(str(error))
+
+
+# ======================== LIVE SECTIONS ========================
+# A live section is a fragment rerun every LIVE_TICK seconds on its own. Each tick only
+# checks the session's subscription in memory; data is reloaded when a watched table
+# changed (debounced, see events.py), right after this session's own writes, when it was
+# served stale, or after LIVE_MAX_AGE.
+
+LIVE_TICK = float(os.environ.get("LIVE_TICK", 2))
+LIVE_MAX_AGE = float(os.environ.get("LIVE_MAX_AGE", 300))
+# Sections keyed by their filters (dates, agency...) would otherwise pile up in a session
+LIVE_MAX_ENTRIES = 32
+
+live_section = st.fragment(run_every=LIVE_TICK)
+
+
+def live_data(name, tables, load):
+    with sessions.pinned():
+        return _live_data(name, tables, load)
+
+
+def _live_data(name, tables, load):
+    live = st.session_state.setdefault("_live", {})
+    if name not in live and len(live) >= LIVE_MAX_ENTRIES:
+        del live[min(live, key=lambda n: live[n].get("loaded", 0))]
+    entry = live.setdefault(name, {"sub": events.Subscription(tables)})
+    if "data" in entry and not (
+        entry["sub"].ready()
+        or (db.last_write() or 0) > entry["loaded"]
+        or entry["stale"]
+        or time.monotonic() - entry["loaded"] > LIVE_MAX_AGE
+    ):
+        idle = sessions.idle()
+        # An idle session (live tick only) leaves its frame spilled; the copy read from
+        # disk is held until the next sweep, so the ticks in between don't read it again
+        data = sessions.restore(entry["data"], hold=idle)
+        if data is not entry["data"] and not idle:
+            sessions.discard(entry["data"])
+            entry["data"] = data
+        return data
+    data = load()
+    sessions.discard(entry.get("data"))
+    entry.update(
+        data=data,
+        loaded=time.monotonic(),
+        stale=getattr(data, "attrs", {}).get("stale_age") is not None,
+    )
+    return data
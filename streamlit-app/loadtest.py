@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+import shards
+from db import run_query, execute
+from reference import agencies, amenities
+
+# Simulated sessions run the page scripts in this process, against the same pool, cache
+# and scheduler as the Streamlit server, so `docker compose exec streamlit python
+# loadtest.py` measures what one container can serve, rendering included.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOADTEST_URL = os.environ.get("LOADTEST_URL", "http://127.0.0.1:8501")
+# Longest a single script run may take before the step counts as failed
+LOADTEST_SCRIPT_TIMEOUT = float(os.environ.get("LOADTEST_SCRIPT_TIMEOUT", 60))
+RESERVATIONS_PAGE = "pages/Réservations.py"
+# Synthetic bookings (seeded and created by the booking journey) start here and are
+# removed by --cleanup; real data never reaches these years
+LOADTEST_EPOCH = date(2090, 1, 1)
+# Stays created by the booking journey, clear of the seeded weeks
+BOOKING_JOURNEY_EPOCH = date(2150, 1, 1)
+SEED_BATCH = 500
+
+DEFAULT_MIX = {"dashboard": 3, "reservations": 3, "rooms": 2, "booking": 1}
+
+_user = threading.local()
+
+
+# ======================== METRICS ========================
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_types = defaultdict(int)
+        self.journeys = defaultdict(int)
+        self.connections = []
+
+    def step(self, journey, name, call):
+        key = f"{journey}.{name}"
+        start = time.perf_counter()
+        try:
+            return call()
+        except Exception as e:
+            with self.lock:
+                self.errors[key] += 1
+                self.error_types[type(e).__name__] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[key].append(elapsed)
+
+    def journey_done(self, journey):
+        with self.lock:
+            self.journeys[journey] += 1
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summary(recorder, elapsed, cpu_seconds):
+    steps = []
+    for key in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[key])
+        steps.append({
+            "etape": key,
+            "n": len(values),
+            "erreurs": recorder.errors.get(key, 0),
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        })
+    total = sum(s["n"] for s in steps)
+    failed = sum(s["erreurs"] for s in steps)
+    connected = [c["Threads_connected"] for c in recorder.connections]
+    running = [c["Threads_running"] for c in recorder.connections]
+    return {
+        "duree_s": round(elapsed, 1),
+        "parcours": dict(recorder.journeys),
+        "parcours_par_s": round(sum(recorder.journeys.values()) / elapsed, 2),
+        "etapes_par_s": round(total / elapsed, 2),
+        "taux_erreur": round(failed / total, 4) if total else 0,
+        "erreurs_par_type": dict(recorder.error_types),
+        "cpu_processus_pct": round(100 * cpu_seconds / elapsed, 1),
+        "connexions_max": max(connected, default=None),
+        "connexions_moy": round(sum(connected) / len(connected), 1) if connected else None,
+        "threads_running_max": max(running, default=None),
+        "etapes": steps,
+    }
+
+
+def _print_summary(report):
+    print(f"\n{report['duree_s']} s — {report['parcours_par_s']} parcours/s, {report['etapes_par_s']} étapes/s, "
+          f"erreurs {report['taux_erreur']:.2%}, CPU {report['cpu_processus_pct']} %")
+    print(f"Connexions MySQL : max {report['connexions_max']}, moyenne {report['connexions_moy']}, "
+          f"actives max {report['threads_running_max']}")
+    if report["erreurs_par_type"]:
+        print(f"Erreurs : {report['erreurs_par_type']}")
+    print(f"\n{'étape':<32}{'n':>7}{'err':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for s in report["etapes"]:
+        print(f"{s['etape']:<32}{s['n']:>7}{s['erreurs']:>6}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+
+
+def _monitor_connections(recorder, stop, interval=1.0):
+    # Server-wide counters, so they include the Streamlit server's own pool if it is running
+    while not stop.wait(interval):
+        try:
+            df = run_query(
+                "SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Threads_running')",
+                route="primary",
+            )
+        except Exception:
+            continue
+        values = {name: int(value) for name, value in zip(df.iloc[:, 0], df.iloc[:, 1])}
+        with recorder.lock:
+            recorder.connections.append(values)
+
+
+# ======================== JOURNEYS ========================
+# Each virtual user is one Streamlit session driven by AppTest: every step is a real
+# script run of the page (widgets, fragments, rendering, queries through the shared
+# pool and cache), so the CPU spent drawing pages is part of the measure. Timed
+# fragments (run_every) only run with their page: AppTest has no clock-driven reruns.
+
+class ScriptError(Exception):
+    pass
+
+
+def _session():
+    if getattr(_user, "app", None) is None:
+        from streamlit.testing.v1 import AppTest
+        _user.app = AppTest.from_file(os.path.join(BASE_DIR, "app.py"), default_timeout=LOADTEST_SCRIPT_TIMEOUT)
+    return _user.app
+
+
+def _script_run(run):
+    # run: a widget interaction or page switch returning the AppTest once rerun
+    at = run()
+    if at.exception:
+        raise ScriptError(at.exception[0].message)
+    return at
+
+
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise ScriptError(f"widget introuvable : {label}")
+
+
+def _random_period(rng):
+    start = date(rng.choice([2023, 2024, 2025]), rng.randint(1, 12), 1)
+    return start, start + timedelta(days=rng.choice([30, 90, 365]))
+
+
+def journey_dashboard(rec, rng, ctx):
+    # app.py: KPIs, recent bookings, occupancy
+    at = _session()
+    rec.step("dashboard", "page", lambda: _script_run(lambda: at.switch_page("app.py").run()))
+
+
+def journey_reservations(rec, rng, ctx):
+    # pages/Réservations.py: page, then the listing and analytics for one agency and period
+    at = _session()
+    rec.step("reservations", "page", lambda: _script_run(lambda: at.switch_page(RESERVATIONS_PAGE).run()))
+    agency = rng.choice(ctx["agencies"])
+    start, end = _random_period(rng)
+    _widget(at.sidebar.date_input, "Date début").set_value(start)
+    _widget(at.sidebar.date_input, "Date fin").set_value(end)
+    rec.step("reservations", "filter", lambda: _script_run(
+        lambda: _widget(at.sidebar.selectbox, "Agence").set_value(str(agency)).run()
+    ))
+
+
+def journey_rooms(rec, rng, ctx):
+    # pages/Chambres.py: page, then a type and amenity search
+    at = _session()
+    rec.step("rooms", "page", lambda: _script_run(lambda: at.switch_page("pages/Chambres.py").run()))
+    room_type = rng.choice(["toutes", "single", "double", "triple", "suite"])
+    picked = rng.sample(ctx["amenities"], k=min(len(ctx["amenities"]), rng.randint(0, 2)))
+    _widget(at.sidebar.radio, "Type de chambre").set_value(room_type)
+    rec.step("rooms", "search", lambda: _script_run(
+        lambda: _widget(at.sidebar.multiselect, "Options disponibles").set_value(picked).run()
+    ))
+
+
+def journey_booking(rec, rng, ctx):
+    # pages/Réservations.py tabs: free rooms, create, find it again, update, delete.
+    # Start dates are unique per (user, iteration), so users never collide on the key.
+    _user.iteration += 1
+    start = BOOKING_JOURNEY_EPOCH + timedelta(days=_user.iteration * ctx["users"] + _user.index)
+    end = start + timedelta(days=rng.randint(1, 6))
+    at = _session()
+    rec.step("booking", "page", lambda: _script_run(lambda: at.switch_page(RESERVATIONS_PAGE).run()))
+    at.date_input(key="add_start").set_value(start)
+    rec.step("booking", "free_rooms", lambda: _script_run(lambda: at.date_input(key="add_end").set_value(end).run()))
+    rooms = [e for e in at.selectbox if e.label == "Chambre disponible"]
+    if not rooms or not rooms[0].options:
+        return
+    rooms[0].select_index(rng.randrange(len(rooms[0].options)))
+    room = rooms[0].value
+    rec.step("booking", "create", lambda: _script_run(lambda: _widget(at.button, "✅ Créer la réservation").click().run()))
+    search = f"{room} {start.isoformat()}"
+    rec.step("booking", "search", lambda: _script_run(lambda: at.text_input(key="upd_search").input(search).run()))
+    rec.step("booking", "update", lambda: _script_run(lambda: _widget(at.button, "💾 Mettre à jour").click().run()))
+    at.text_input(key="del_search").input(search)
+    rec.step("booking", "delete", lambda: _script_run(
+        lambda: _widget(at.button, "❌ Supprimer définitivement").click().run()
+    ))
+
+
+JOURNEYS = {
+    "dashboard": journey_dashboard,
+    "reservations": journey_reservations,
+    "rooms": journey_rooms,
+    "booking": journey_booking,
+}
+
+
+def probe_http(rec):
+    # Optional check that the Streamlit server itself stays up during the run: health
+    # endpoint and the static app shell (page runs are measured by the journeys above)
+    for name, path in (("health", "/_stcore/health"), ("page", "/")):
+        def call(path=path):
+            with urllib.request.urlopen(LOADTEST_URL + path, timeout=10) as resp:
+                resp.read()
+        rec.step("http", name, call)
+
+
+# ======================== RUNNER ========================
+def _virtual_user(index, ctx, rec, deadline, think, mix, seed):
+    _user.index = index
+    _user.iteration = 0
+    _user.app = None
+    rng = random.Random(seed * 1000 + index)
+    names, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        try:
+            if name == "http":
+                probe_http(rec)
+            else:
+                JOURNEYS[name](rec, rng, ctx)
+            rec.journey_done(name)
+        except Exception:
+            pass  # already counted by the failing step
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+
+
+def seed_bookings(count):
+    # Non-overlapping synthetic stays: each room gets one 1-6 night stay per week
+    rooms = shards.query("SELECT CodR FROM ROOM ORDER BY CodR", route="primary", order="CodR")["CodR"].tolist()
+    codes = agencies()
+    rng = random.Random(count)
+    rows = []
+    for i in range(count):
+        start = LOADTEST_EPOCH + timedelta(weeks=i // len(rooms))
+        end = start + timedelta(days=rng.randint(1, 6))
+        rows.append((rooms[i % len(rooms)], start, end, float(rng.randint(100, 2000)), rng.choice(codes)))
+    # Each stay is inserted on the shard of its room's hotel
+    by_shard = defaultdict(list)
+    for row in rows:
+        by_shard[shards.shard_of_room(row[0])].append(row)
+    for shard, shard_rows in by_shard.items():
+        for i in range(0, len(shard_rows), SEED_BATCH):
+            batch = shard_rows[i:i + SEED_BATCH]
+            with shards.using(shard):
+                execute(
+                    "INSERT IGNORE INTO BOOKING (ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA) VALUES "
+                    + ",".join(["(%s,%s,%s,%s,%s)"] * len(batch)),
+                    [value for row in batch for value in row],
+                )
+    return len(rows)
+
+
+def cleanup():
+    deleted = 0
+    for shard in sorted(shards.DB_SHARDS):
+        with shards.using(shard):
+            deleted += execute("DELETE FROM BOOKING WHERE StartDate >= %s", [LOADTEST_EPOCH.isoformat()])
+    return deleted
+
+
+def run(users, duration, ramp=0.0, think=1.0, mix=None, seed=0):
+    mix = dict(mix or DEFAULT_MIX)
+    ctx = {"users": users, "agencies": agencies(), "amenities": amenities()}
+    rec = Recorder()
+    stop = threading.Event()
+    monitor = threading.Thread(target=_monitor_connections, args=(rec, stop), daemon=True)
+    monitor.start()
+
+    start = time.monotonic()
+    cpu_start = sum(os.times()[:2])
+    deadline = start + ramp + duration
+    threads = []
+    for index in range(users):
+        t = threading.Thread(
+            target=_virtual_user, args=(index, ctx, rec, deadline, think, mix, seed),
+            name=f"loadtest-{index}", daemon=True,
+        )
+        t.start()
+        threads.append(t)
+        if ramp:
+            time.sleep(ramp / users)
+    for t in threads:
+        t.join()
+    stop.set()
+    monitor.join()
+    return summary(rec, time.monotonic() - start, sum(os.times()[:2]) - cpu_start)
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in JOURNEYS and name != "http":
+            raise argparse.ArgumentTypeError(f"parcours inconnu : {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    # python loadtest.py --users 50 --duration 120 --seed-bookings 20000 --cleanup
+    parser = argparse.ArgumentParser(description="Test de charge multi-utilisateurs")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="secondes, après la montée en charge")
+    parser.add_argument("--ramp", type=float, default=10, help="secondes pour démarrer tous les utilisateurs")
+    parser.add_argument("--think", type=float, default=1.0, help="pause moyenne entre deux parcours (s)")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="ex. dashboard=3,reservations=3,rooms=2,booking=1,http=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-bookings", type=int, default=0, help="réservations synthétiques à insérer avant le test")
+    parser.add_argument("--cleanup", action="store_true", help="supprimer les réservations synthétiques à la fin")
+    parser.add_argument("--json", help="écrire le rapport dans ce fichier")
+    args = parser.parse_args()
+
+    if args.seed_bookings:
+        print(f"{seed_bookings(args.seed_bookings)} réservations synthétiques à partir de {LOADTEST_EPOCH}")
+    try:
+        report = run(args.users, args.duration, args.ramp, args.think, args.mix, args.seed)
+    finally:
+        if args.cleanup:
+            print(f"{cleanup()} réservation(s) synthétique(s) supprimée(s)")
+    _print_summary(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    # Non-zero exit above 5 % failed steps, for use in CI
+    sys.exit(1 if report["taux_erreur"] > 0.05 else 0)
@@ -1,5 +1,16 @@
 import streamlit as st
-from db import run_query
+from startup import report as startup_report
+import pandas as pd
+from db import run_query, breaker_state
+import cache
+import capture
+import scheduler
+import utils
+import schemas
+import profiler
+import integrity
+import sessions
+import shards
 
 st.title("🔌 Test Connexion MySQL")
 
@@ -15,3 +26,97 @@ try:
 except Exception as e:
     st.error("Connexion MySQL échouée : ❌")
     st.code(str(e))
+
+st.subheader("🗄️ Cache partagé")
+st.caption(f"Disjoncteur base de données : {breaker_state()}")
+st.json(cache.stats())
+
+st.subheader("🚦 Ordonnanceur de requêtes")
+st.caption("Requêtes simultanées par classe, file d'attente et temps d'admission (ce processus)")
+st.dataframe(pd.DataFrame(scheduler.stats()), use_container_width=True, hide_index=True)
+
+st.subheader("📝 Journalisation")
+st.caption(f"Journal JSON : {utils.LOG_FILE}")
+st.json(utils.logging_stats())
+if capture.enabled():
+    st.caption("Capture des requêtes pour replay.py")
+    st.json(capture.stats())
+
+st.subheader("🧮 Mémoire des résultats typés")
+st.caption("Octets avant / après application du schéma, 50 dernières requêtes")
+st.dataframe(pd.DataFrame(schemas.memory_report()), use_container_width=True, hide_index=True)
+
+st.subheader("⏱️ Profil de démarrage")
+st.caption("Temps d'import par module (STARTUP_PROFILE=1 pour tous les modules) et premier affichage par page")
+
+profile = startup_report()
+c1, c2 = st.columns(2)
+with c1:
+    st.dataframe(pd.DataFrame(profile["imports"]), use_container_width=True, hide_index=True)
+with c2:
+    st.dataframe(pd.DataFrame(profile["pages"]), use_container_width=True, hide_index=True)
+
+st.subheader("🧩 Intégrité des réservations")
+st.caption("Chevauchements, durées nulles et références orphelines ; seules les chambres modifiées depuis le dernier contrôle sont relues")
+if st.button("Lancer le contrôle"):
+    with st.spinner("Contrôle en cours…"):
+        integrity.check()
+integrity_report = integrity.load_report()
+if integrity_report is None:
+    st.info("Aucun contrôle pour l'instant (python integrity.py, ou le bouton ci-dessus).")
+else:
+    st.caption(
+        f"Contrôle {integrity_report['mode']} du {integrity_report['checked_at']} : "
+        f"{integrity_report['lignes_lues']} ligne(s) lue(s) en {integrity_report['duree_s']} s"
+    )
+    st.dataframe(pd.DataFrame(integrity.summary(integrity_report)), use_container_width=True, hide_index=True)
+    if integrity_report["issues"]:
+        st.dataframe(
+            pd.DataFrame(integrity_report["issues"]).drop(columns=["sql"]),
+            use_container_width=True, hide_index=True
+        )
+        st.download_button(
+            "⬇️ Corrections proposées (SQL)",
+            integrity.repair_script(integrity_report),
+            file_name="corrections_reservations.sql"
+        )
+
+st.subheader("🏨 Hôtels et shards")
+st.caption(
+    f"{len(shards.DB_SHARDS)} instance(s) MySQL ; un hôtel se déplace avec python shards.py --move HOTEL SHARD"
+)
+try:
+    st.dataframe(shards.status(), use_container_width=True, hide_index=True)
+except Exception as e:
+    st.error("Répartition indisponible")
+    st.code(str(e))
+
+st.subheader("🧠 Mémoire par session")
+st.caption(
+    f"Budget {sessions.SESSION_MEMORY_BUDGET_MB:.0f} Mo par session ; après {sessions.SESSION_IDLE_SECONDS:.0f} s "
+    f"d'inactivité, les tableaux d'une session passent sur disque ({sessions.SESSION_SPILL_DIR})"
+)
+st.dataframe(pd.DataFrame([sessions.process_stats()]), use_container_width=True, hide_index=True)
+st.dataframe(pd.DataFrame(sessions.report()), use_container_width=True, hide_index=True)
+
+if profiler.is_admin():
+    st.subheader("🔥 Profils d'exécution")
+    st.caption(f"Échantillonnage toutes les {profiler.PROFILE_INTERVAL * 1000:.0f} ms ; fichiers dans {profiler.PROFILE_DIR}")
+    runs = profiler.reports()
+    if not runs:
+        st.info("Aucun profil pour l'instant : ouvrez une page avec ?profile=<PROFILE_TOKEN>.")
+    for run in runs:
+        with st.expander(f"{run['page']} — {run['started']} — {run['total_ms']:.0f} ms"):
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                st.dataframe(pd.DataFrame(run["sections"]), use_container_width=True, hide_index=True)
+            with c2:
+                st.dataframe(pd.DataFrame(run["queries"]), use_container_width=True, hide_index=True)
+            with c3:
+                st.dataframe(pd.DataFrame(run["categories"]), use_container_width=True, hide_index=True)
+            for path in run["files"]:
+                try:
+                    with open(path, "rb") as f:
+                        st.download_button(f"⬇️ {path.rsplit('/', 1)[-1]}", f.read(), file_name=path.rsplit("/", 1)[-1], key=path)
+                except OSError:
+                    st.caption(f"Fichier introuvable : {path}")
@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
-import os
+from startup import start_page, mark_first_paint
 from db import run_query
+import geo
+import schemas
+from layout import apply_styles, render_sidebar, stale_badge
+from assets import room_image
+from reference import agency_cities
+from refresher import read_view
 
 # ======================== Page setup ========================
 
@@ -10,66 +15,13 @@ st.set_page_config(
     page_icon="🏨",
     layout="wide"
 )
+start_page("Agences")
 
-# Hide default Streamlit sidebar and nav
-with open(os.path.join(os.path.dirname(__file__), '..', 'styles', 'main.css')) as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Import custom CSS for Agences page
-with open(os.path.join(os.path.dirname(__file__), '..', 'styles', 'agences.css')) as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Custom sidebar (copied from app.py)
-with st.sidebar:
-    st.markdown("""
-    <div class="sidebar-header">
-        <div class="hotel-logo">🏨</div>
-        <div class="hotel-name">Grand Hotel Chain</div>
-        <div class="hotel-role">Hotel Management System</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.markdown("---")
-
-    st.markdown("### 🧭 Navigation")
-    if st.button("📊 Dashboard", use_container_width=True):
-        st.switch_page("app.py")
-
-    if st.button("📅 Réservations", use_container_width=True):
-        st.switch_page("pages/Réservations.py")
-
-    if st.button("🛏️ Chambres", use_container_width=True):
-        st.switch_page("pages/Chambres.py")
-
-    if st.button("🤝 Agences", use_container_width=True):
-        st.switch_page("pages/Agences.py")
-
-    st.markdown("---")
-
-    st.markdown("### ⚙️ Système")
-    st.success("🟢 PMS en ligne")
-    from datetime import datetime
-    st.caption(f"Dernière synchronisation : {datetime.now().strftime('%H:%M:%S')}")
-
-    st.markdown("""
-    <div class="sidebar-footer">
-        Groupe 9 • PMS Hôtelier
-    </div>
-    """, unsafe_allow_html=True)
-
-theme_path = os.path.join(os.path.dirname(__file__), '..', 'theme.css')
-with open(theme_path) as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# Shared CSS bundle and sidebar (see layout.py)
+apply_styles("styles/agences.css", "theme.css")
+render_sidebar()
 
 # ======================== SQL QUERIES ========================
-# Query for DATA : AGENCES section (distinct cities with agencies)
-sql_villes = """
-SELECT DISTINCT c.Name AS ville
-FROM CITY c
-JOIN TRAVEL_AGENCY a ON a.City_Address = c.Name
-ORDER BY c.Name
-"""
-
 # Query for METRICS section (agency details with city info)
 sql_agences = """
 SELECT
@@ -99,7 +51,7 @@ JOIN CITY c ON a.City_Address = c.Name
 """
 
 # Query for MAP section (agency details for map, filtered by city)
-sql_agences_map_city = lambda ville_map: f"""
+sql_agences_map_city = """
 SELECT
     a.CodA AS code_agence,
     a.Tel AS telephone,
@@ -110,7 +62,7 @@ SELECT
     c.Longitude AS longitude
 FROM TRAVEL_AGENCY a
 JOIN CITY c ON a.City_Address = c.Name
-WHERE c.Name = '{ville_map}'
+WHERE c.Name = %s
 """
 
 # Query for TABLE section (agency list for table)
@@ -126,7 +78,7 @@ JOIN CITY c ON a.City_Address = c.Name
 """
 
 # Query for DETAILS section (agency details for selected city)
-sql_agences_details = lambda ville_choice: f"""
+sql_agences_details = """
 SELECT
     a.CodA AS code_agence,
     a.Tel AS telephone,
@@ -134,7 +86,15 @@ SELECT
     CONCAT(a.Street_Address, ' ', a.Num_Address, ', ', c.Name) AS adresse_complete
 FROM TRAVEL_AGENCY a
 JOIN CITY c ON a.City_Address = c.Name
-WHERE c.Name = '{ville_choice}'
+WHERE c.Name = %s
+"""
+
+# Query for NEAREST section (reference points: every city with coordinates)
+sql_villes_coords = """
+SELECT Name AS ville, Latitude AS latitude, Longitude AS longitude
+FROM CITY
+WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL
+ORDER BY Name
 """
 
 # Query for DATA : CHAMBRES section (available rooms, limit 5)
@@ -148,33 +108,21 @@ FROM ROOM
 LIMIT 5
 """
 
-# Query for AGENCY PERFORMANCE section (top 5 agencies by performance)
-sql_agency_perf = """
-SELECT
-    a.CodA AS agence,
-    COUNT(b.ROOM_CodR) AS total_reservations,
-    SUM(b.Cost) AS chiffre_affaires
-FROM TRAVEL_AGENCY a
-LEFT JOIN BOOKING b ON a.CodA = b.TRAVEL_AGENCY_CodA
-GROUP BY a.CodA
-ORDER BY chiffre_affaires DESC
-LIMIT 5
-"""
-
 # ======================== Header ========================
 
 st.title("🏨 Tableau de bord – Gestion Hôtelière")
 st.caption("Vue globale des agences & chambres disponibles")
+mark_first_paint("Agences")
 st.divider()
 
 # ======================== DATA : AGENCES ========================
 
-df_villes = run_query(sql_villes)
-villes_list = df_villes["ville"].tolist()
+villes_list = agency_cities()
 
 # ======================== METRICS ========================
 
-df_agences = run_query(sql_agences)
+df_agences = run_query(sql_agences, ttl=300, schema=schemas.AGENCY)
+stale_badge(df_agences)
 
 st.subheader("📊 Indicateurs clés")
 
@@ -196,17 +144,62 @@ st.divider()
 
 st.subheader("🗺️ Répartition géographique")
 
-ville_map = st.selectbox(
-    "Filtrer la carte par ville",
-    ["Toutes"] + villes_list
-)
+c_filter, c_zoom = st.columns([2, 1])
+
+with c_filter:
+    ville_map = st.selectbox(
+        "Filtrer la carte par ville",
+        ["Toutes"] + villes_list
+    )
+
+with c_zoom:
+    zoom = st.slider("Niveau de détail", 1, 12, 5)
 
 if ville_map == "Toutes":
-    df_map = run_query(sql_agences_map_all)
+    df_map = run_query(sql_agences_map_all, ttl=300, schema=schemas.AGENCY)
 else:
-    df_map = run_query(sql_agences_map_city(ville_map))
+    df_map = run_query(sql_agences_map_city, [ville_map], ttl=300, schema=schemas.AGENCY)
+
+# Agencies are grouped per grid cell before rendering: at most geo.MAX_MAP_POINTS points
+points = geo.cluster_points(df_map["latitude"], df_map["longitude"], zoom)
+points["taille"] = 2000 + 1500 * points["count"] ** 0.5
 
-st.map(df_map[["latitude", "longitude"]])
+st.map(points, latitude="latitude", longitude="longitude", size="taille")
+st.caption(f"{len(df_map)} agences • {len(points)} points affichés")
+
+st.divider()
+
+# ======================== NEAREST ========================
+
+st.subheader("📍 Agences les plus proches")
+
+df_villes = run_query(sql_villes_coords, ttl=300, schema=schemas.AGENCY)
+df_all = run_query(sql_agences_map_all, ttl=300, schema=schemas.AGENCY)
+index = geo.index_for(df_all)
+
+c1, c2, c3 = st.columns([2, 1, 1])
+
+with c1:
+    ville_ref = st.selectbox("Ville de référence", df_villes["ville"].astype(str).tolist())
+
+with c2:
+    rayon = st.slider("Rayon (km)", 10, 2000, 200, step=10)
+
+with c3:
+    k = st.number_input("Nombre max.", min_value=1, max_value=50, value=5)
+
+ref = df_villes[df_villes["ville"] == ville_ref].iloc[0]
+rows, dist = index.within(float(ref["latitude"]), float(ref["longitude"]), rayon)
+
+if len(rows) == 0:
+    # Nothing in range: fall back to the k nearest, whatever the distance
+    rows, dist = index.nearest(float(ref["latitude"]), float(ref["longitude"]), int(k))
+    st.info(f"Aucune agence à moins de {rayon} km, affichage des plus proches.")
+
+df_proches = df_all.iloc[rows[:int(k)]][["code_agence", "ville", "adresse_complete", "telephone"]].copy()
+df_proches["distance_km"] = dist[:int(k)].round(1)
+
+st.dataframe(df_proches, use_container_width=True, hide_index=True)
 
 st.divider()
 
@@ -214,7 +207,7 @@ st.divider()
 
 st.subheader("📋 Liste des agences")
 
-df_agences = run_query(sql_agences_table)
+df_agences = run_query(sql_agences_table, ttl=300, schema=schemas.AGENCY)
 
 st.dataframe(
     df_agences[["code_agence", "adresse_complete", "telephone", "site_web"]],
@@ -230,7 +223,7 @@ ville_choice = st.selectbox(
     villes_list
 )
 
-df_details = run_query(sql_agences_details(ville_choice))
+df_details = run_query(sql_agences_details, [ville_choice], ttl=300)
 
 for _, ag in df_details.iterrows():
     with st.expander(f"🏢 Agence {ag['code_agence']}"):
@@ -246,14 +239,7 @@ st.divider()
 
 st.subheader("🛏️ Chambres disponibles")
 
-df_chambres = run_query(sql_chambres)
-
-images = {
-    "Simple": "assets/simple.jpg",
-    "Double": "assets/double.jpg",
-    "Triple": "assets/triple.jpg",
-    "Suite": "assets/suite.jpg"
-}
+df_chambres = run_query(sql_chambres, ttl=300, schema=schemas.ROOM)
 
 for index, row in df_chambres.iterrows():
     col_info, col_img = st.columns([2, 1])
@@ -268,7 +254,7 @@ for index, row in df_chambres.iterrows():
 
     with col_img:
         st.image(
-            images.get(row["type"], images["Simple"]),
+            room_image(row["type"], "card"),
             use_container_width=True
         )
 
@@ -278,7 +264,12 @@ for index, row in df_chambres.iterrows():
 
 st.subheader("🏆 Performance des agences")
 
-df_perf = run_query(sql_agency_perf)
+# Top 5 agencies, read from the MV_AGENCY_PERF summary table (see refresher.py)
+df_perf = (
+    read_view("agency_perf")
+    .sort_values("chiffre_affaires", ascending=False)
+    .head(5)
+)
 
 c1, c2 = st.columns(2)
 
@@ -1,7 +1,13 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+from startup import lazy_import, start_page, mark_first_paint
 from db import run_query
+import schemas
+from layout import apply_styles, render_sidebar, stale_badge
+from assets import room_image
+from reference import amenities as amenity_list
+
+# Only imported when the charts section first renders
+plt = lazy_import("matplotlib.pyplot")
 
 
 # ================= PAGE CONFIG =================
@@ -10,62 +16,19 @@ st.set_page_config(
     page_icon="🛏️",
     layout="wide"
 )
+start_page("Chambres")
 
-# Hide default Streamlit sidebar and nav
-with open('styles/main.css') as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Custom sidebar (copied from app.py)
-with st.sidebar:
-    st.markdown("""
-    <div class="sidebar-header">
-        <div class="hotel-logo">🏨</div>
-        <div class="hotel-name">Grand Hotel Chain</div>
-        <div class="hotel-role">Hotel Management System</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.markdown("---")
-
-    st.markdown("### 🧭 Navigation")
-    if st.button("📊 Dashboard", use_container_width=True):
-        st.switch_page("app.py")
-
-    if st.button("📅 Réservations", use_container_width=True):
-        st.switch_page("pages/Réservations.py")
-
-    if st.button("🛏️ Chambres", use_container_width=True):
-        st.switch_page("pages/Chambres.py")
-
-    if st.button("🤝 Agences", use_container_width=True):
-        st.switch_page("pages/Agences.py")
-
-    st.markdown("---")
-
-    st.markdown("### ⚙️ Système")
-    st.success("🟢 PMS en ligne")
-    from datetime import datetime
-    st.caption(f"Dernière synchronisation : {datetime.now().strftime('%H:%M:%S')}")
-
-    st.markdown("""
-    <div class="sidebar-footer">
-        Groupe 9 • PMS Hôtelier
-    </div>
-    """, unsafe_allow_html=True)
-
-st.markdown('<style>' + open('theme.css').read() + '</style>', unsafe_allow_html=True)
+# Shared CSS bundle and sidebar (see layout.py)
+apply_styles("theme.css")
+render_sidebar()
 
 # ================= TITLE =================
 st.title("🛏️ Gestion & Consultation des Chambres")
 st.caption("Recherche intelligente, affichage premium et analyse visuelle")
+mark_first_paint("Chambres")
 st.divider()
 
 # ======================== SQL QUERIES ========================
-# Query for SIDEBAR FILTERS section (distinct amenities)
-sql_amenities = """
-SELECT DISTINCT AMENITIES_Amenity FROM HAS_AMENITIES ORDER BY AMENITIES_Amenity
-"""
-
 # Query for MAIN TABLE section (rooms with filters)
 def sql_rooms(where_sql):
     return f"""
@@ -92,10 +55,7 @@ type_filter = st.sidebar.radio(
     ["toutes", "single", "double", "triple", "suite"]
 )
 
-amenities = run_query(
-    "SELECT DISTINCT AMENITIES_Amenity FROM HAS_AMENITIES ORDER BY AMENITIES_Amenity"
-)
-amenities_list = [a["AMENITIES_Amenity"] for a in amenities]
+amenities_list = amenity_list()
 
 selected_amenities = st.sidebar.multiselect(
     "Options disponibles",
@@ -139,7 +99,8 @@ LEFT JOIN HAS_SPACES hs ON r.CodR = hs.ROOM_CodR
 {where_sql}
 GROUP BY r.CodR, r.Floor, r.SurfaceArea, r.Type
 """
-df = pd.DataFrame(run_query(query, params))
+df = run_query(query, params, ttl=120, schema=schemas.ROOM)
+stale_badge(df)
 
 if df.empty:
     st.warning("Aucune chambre ne correspond à vos filtres.")
@@ -169,13 +130,6 @@ st.dataframe(table_df, hide_index=True, use_container_width=True)
 st.divider()
 st.subheader("✨ Aperçu premium des chambres")
 
-images = {
-    "single": "assets/simple.jpg",
-    "double": "assets/double.jpg",
-    "triple": "assets/triple.jpg",
-    "suite": "assets/suite.jpg"
-}
-
 for _, row in df.head(5).iterrows():
     col_text, col_img = st.columns([2, 1])
 
@@ -189,7 +143,7 @@ for _, row in df.head(5).iterrows():
         """)
 
     with col_img:
-        st.image(images.get(row["Type"]), use_container_width=True)
+        st.image(room_image(row["Type"], "card"), use_container_width=True)
 
     st.divider()
 
@@ -204,11 +158,12 @@ tab1, tab2, tab3 = st.tabs(
 with tab1:
     type_counts = df["Type"].value_counts()
     fig, ax = plt.subplots()
-    ax.bar(type_counts.index, type_counts.values)
+    ax.bar(type_counts.index.astype(str), type_counts.values)
     ax.set_title("Répartition par type")
     ax.set_xlabel("Type")
     ax.set_ylabel("Nombre")
     st.pyplot(fig)
+    plt.close(fig)
 
 with tab2:
     floor_counts = df["Floor"].value_counts().sort_index()
@@ -218,6 +173,7 @@ with tab2:
     ax.set_xlabel("Étage")
     ax.set_ylabel("Nombre")
     st.pyplot(fig)
+    plt.close(fig)
 
 with tab3:
     fig, ax = plt.subplots()
@@ -226,6 +182,7 @@ with tab3:
     ax.set_xlabel("Surface (m²)")
     ax.set_ylabel("Nombre")
     st.pyplot(fig)
+    plt.close(fig)
 
 # ================= FOOTER =================
 st.markdown(
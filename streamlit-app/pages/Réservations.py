@@ -1,20 +1,33 @@
 
 import streamlit as st
+from startup import lazy_import, start_page, mark_first_paint
 import pandas as pd
 import calendar
-import altair as alt
-from db import run_query
+import shards
+import schemas
+from utils import set_context
+from layout import apply_styles, render_sidebar, stale_badge, live_section, live_data, show_error
+from reference import agencies as agency_codes
+from refresher import read_view
+import analytics
+import revenue
+import booking_search
+from deltas import DeltaListing, sync_all
+from archive import bookings_source, archive_summary, hot_cutoff
+
+# Only imported when the analytics section first renders
+alt = lazy_import("altair")
 
 
 # ======================== SQL QUERIES ========================
-# Query for SIDEBAR (agencies list)
-sql_agences = """
-SELECT CodA FROM TRAVEL_AGENCY ORDER BY CodA
-"""
+# Queries take their FROM target from archive.bookings_source(): BOOKING holds the
+# hot years, the archive is only unioned in when the history is requested.
+# Live analytics run on every shard and are merged (shards.query): aggregates return
+# partial sums and counts, averages are divided once merged.
 
 # Query for BASE QUERY (main reservations table, with filters)
-def sql_reservations():
-    return """
+def sql_reservations(source="BOOKING"):
+    return f"""
 SELECT
     B.ROOM_CodR AS Code_Chambre,
     B.StartDate,
@@ -25,27 +38,29 @@ SELECT
     T.CodA AS Code_Agence,
     R.Type AS Type_Chambre,
     R.Floor,
-    R.SurfaceArea
-FROM BOOKING B
+    R.SurfaceArea,
+    CONCAT(B.ROOM_CodR, '|', B.StartDate) AS RowKey
+FROM {source} B
 JOIN TRAVEL_AGENCY T ON B.TRAVEL_AGENCY_CodA = T.CodA
 JOIN ROOM R ON B.ROOM_CodR = R.CodR
 WHERE 1=1
 """
 
 # Query for ANALYTICS TAB 1 (monthly evolution)
-def sql_monthly(analytics_where):
+def sql_monthly(analytics_where, source="BOOKING"):
     return f"""
         SELECT
             DATE_FORMAT(B.StartDate, '%Y-%m') AS YM,
-            AVG(B.Cost / DATEDIFF(B.EndDate, B.StartDate)) AS Cout_Journalier_Moyen
-        FROM BOOKING B
+            SUM(B.Cost / DATEDIFF(B.EndDate, B.StartDate)) AS Somme_Journalier,
+            COUNT(B.Cost / DATEDIFF(B.EndDate, B.StartDate)) AS Nb_Journalier
+        FROM {source} B
         {analytics_where}
         GROUP BY YM
         ORDER BY YM
     """
 
-# Query for ANALYTICS TAB 2 (premium rooms)
-def sql_premium(analytics_where):
+# Query for ANALYTICS TAB 2 (premium rooms; a room's bookings are all on its hotel's shard)
+def sql_premium(analytics_where, source="BOOKING"):
     return f"""
         SELECT
             DATE_FORMAT(B.StartDate, '%Y-%m') AS Mois,
@@ -54,7 +69,7 @@ def sql_premium(analytics_where):
             R.Floor,
             R.SurfaceArea,
             AVG(B.Cost / DATEDIFF(B.EndDate, B.StartDate)) AS Cout_Moyen
-        FROM BOOKING B
+        FROM {source} B
         JOIN ROOM R ON B.ROOM_CodR = R.CodR
         {analytics_where}
         GROUP BY Mois, B.ROOM_CodR
@@ -62,13 +77,13 @@ def sql_premium(analytics_where):
     """
 
 # Query for ANALYTICS TAB 3 (agency performance)
-def sql_agency_perf(analytics_where):
+def sql_agency_perf(analytics_where, source="BOOKING"):
     return f"""
         SELECT
             T.CodA AS Agence,
             COUNT(*) AS Nb_Reservations,
             SUM(B.Cost) AS CA
-        FROM BOOKING B
+        FROM {source} B
         JOIN TRAVEL_AGENCY T ON B.TRAVEL_AGENCY_CodA = T.CodA
         {analytics_where}
         GROUP BY T.CodA
@@ -82,72 +97,46 @@ st.set_page_config(
     page_icon="📊",
     layout="wide"
 )
+start_page("Réservations")
 
-# Hide defaulssst Streamlit sidebar and nav
-with open('styles/main.css') as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
-# Custom sidebar (copied from app.py)
-with st.sidebar:
-    st.markdown("""
-    <div class="sidebar-header">
-        <div class="hotel-logo">🏨</div>
-        <div class="hotel-name">Grand Hotel Chain</div>
-        <div class="hotel-role">Hotel Management System</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.markdown("---")
-
-    st.markdown("### 🧭 Navigation")
-    if st.button("📊 Dashboard", use_container_width=True):
-        st.switch_page("app.py")
-
-    if st.button("📅 Réservations", use_container_width=True):
-        st.switch_page("pages/Réservations.py")
-
-    if st.button("🛏️ Chambres", use_container_width=True):
-        st.switch_page("pages/Chambres.py")
-
-    if st.button("🤝 Agences", use_container_width=True):
-        st.switch_page("pages/Agences.py")
-
-    st.markdown("---")
-
-    st.markdown("### ⚙️ Système")
-    st.success("🟢 PMS en ligne")
-    from datetime import datetime
-    st.caption(f"Dernière synchronisation : {datetime.now().strftime('%H:%M:%S')}")
-
-    st.markdown("""
-    <div class="sidebar-footer">
-        Groupe 9 • PMS Hôtelier
-    </div>
-    """, unsafe_allow_html=True)
-
-st.markdown('<style>' + open('theme.css').read() + '</style>', unsafe_allow_html=True)
+# Shared CSS bundle and sidebar (see layout.py)
+apply_styles("theme.css")
+render_sidebar()
 
 # ================= TITLE =================
 st.title("📊 Gestion & Analyse des Réservations")
 st.caption("Suivi des performances, tendances tarifaires et réservations premium")
+mark_first_paint("Réservations")
 st.divider()
 
 
 # ================= SIDEBAR =================
 st.sidebar.title("🎛️ Filtres")
 
-agences = run_query(sql_agences)
-agence_list = ["Toutes"] + agences["CodA"].astype(str).tolist()
+agence_list = ["Toutes"] + [str(a) for a in agency_codes()]
 
 agence_filtre = st.sidebar.selectbox("Agence", agence_list)
 date_debut = st.sidebar.date_input("Date début", value=None)
 date_fin = st.sidebar.date_input("Date fin", value=None)
 
+analytics_source = st.sidebar.radio(
+    "Source des analyses",
+    ["Instantané", "Temps réel"],
+    help="Instantané : copie Parquet interrogée par DuckDB, sans charge sur MySQL"
+)
+
+include_archive = st.sidebar.checkbox(
+    "Inclure l'historique archivé",
+    help=f"Par défaut, seules les réservations en cours et récentes sont lues (archives avant {hot_cutoff()})"
+)
+source = bookings_source(include_archive)
+
 st.sidebar.divider()
 st.sidebar.caption("Les données se mettent à jour automatiquement")
 
 # ================= BASE QUERY =================
-query = sql_reservations()
+set_context(section="listing")
+query = sql_reservations(source)
 params = []
 
 if agence_filtre != "Toutes":
@@ -162,10 +151,10 @@ if date_fin:
     query += " AND B.EndDate <= %s"
     params.append(date_fin)
 
-query += " ORDER BY B.StartDate DESC"
+listing_key = f"listing:{agence_filtre}:{date_debut}:{date_fin}:{include_archive}"
 
-df = run_query(query, params)
 # ================= RESERVATION MANAGEMENT =================
+set_context(section="management")
 st.subheader("🛠️ Gestion rapide des réservations")
 
 tab_add, tab_update, tab_delete = st.tabs(
@@ -184,27 +173,35 @@ with tab_add:
     with c3:
         new_agency = st.selectbox(
             "Agence",
-            run_query(sql_agences)["CodA"].tolist(),
+            agency_codes(),
             key="add_agency"
         )
     with c4:
         new_cost = st.number_input("Coût total (DH)", min_value=0.0, step=50.0)
 
-    if new_start and new_end and new_start < new_end:
-        free_rooms = run_query(
-            """
-            SELECT R.CodR, R.Type, R.Floor, R.SurfaceArea
-            FROM ROOM R
-            WHERE R.CodR NOT IN (
-                SELECT ROOM_CodR
-                FROM BOOKING
-                WHERE NOT (
-                    EndDate <= %s OR StartDate >= %s
+    # Live section: the list follows bookings made from other sessions (see layout.live_data)
+    @live_section
+    def free_rooms_section(new_start, new_end, new_agency, new_cost):
+        free_rooms = live_data(
+            f"free_rooms:{new_start}:{new_end}",
+            ["BOOKING", "ROOM"],
+            lambda: shards.query(
+                """
+                SELECT R.CodR, R.Type, R.Floor, R.SurfaceArea
+                FROM ROOM R
+                WHERE R.CodR NOT IN (
+                    SELECT ROOM_CodR
+                    FROM BOOKING
+                    WHERE NOT (
+                        EndDate <= %s OR StartDate >= %s
+                    )
                 )
+                ORDER BY R.Type, R.Floor
+                """,
+                [new_start, new_end],
+                route="primary",  # availability must not lag behind the insert below
+                order=["Type", "Floor"]
             )
-            ORDER BY R.Type, R.Floor
-            """,
-            [new_start, new_end]
         )
 
         if free_rooms.empty:
@@ -217,43 +214,49 @@ with tab_add:
             )
 
             if st.button("✅ Créer la réservation", use_container_width=True):
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute(
+                shards.execute(
                     """
                     INSERT INTO BOOKING
                     (ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA)
                     VALUES (%s,%s,%s,%s,%s)
                     """,
-                    (room_choice, new_start, new_end, new_cost, new_agency)
+                    (room_choice, new_start, new_end, new_cost, new_agency),
+                    room=room_choice
                 )
-                conn.commit()
-                conn.close()
                 st.success("🎉 Réservation ajoutée avec succès")
                 st.rerun()
 
+    if new_start and new_end and new_start < new_end:
+        free_rooms_section(new_start, new_end, new_agency, new_cost)
+
+# Typeahead picker shared by the update and delete tabs: each search returns at most
+# booking_search.SEARCH_LIMIT keys, the full record is read once a booking is chosen
+def booking_picker(key):
+    text = st.text_input(
+        "Rechercher une réservation",
+        placeholder="chambre, date (2024-03), agence (a3), coût (500-900 ou >800)",
+        key=f"{key}_search"
+    )
+    matches = booking_search.search(text)
+    if not matches:
+        st.info("Aucune réservation ne correspond à la recherche")
+        return None
+    choice = st.selectbox(
+        "Sélectionner une réservation",
+        matches,
+        format_func=lambda k: f"Chambre {k[0]} | {k[1]}",
+        key=f"{key}_choice"
+    )
+    return booking_search.fetch(choice)
+
+
 # ---------- UPDATE RESERVATION ----------
 with tab_update:
     st.markdown("### ✏️ Modifier une réservation")
 
-    bookings = run_query("""
-        SELECT ROOM_CodR, StartDate, EndDate, Cost, TRAVEL_AGENCY_CodA
-        FROM BOOKING
-        ORDER BY StartDate DESC
-    """)
-
-    if bookings.empty:
-        st.info("Aucune réservation à modifier")
-    else:
-        idx = st.selectbox(
-            "Sélectionner une réservation",
-            bookings.index,
-            format_func=lambda i:
-                f"Chambre {bookings.loc[i,'ROOM_CodR']} | {bookings.loc[i,'StartDate']}"
-        )
-
-        row = bookings.loc[idx]
+    row = booking_picker("upd")
 
+    if row is not None:
         u1, u2, u3 = st.columns(3)
         with u1:
             upd_start = st.date_input(
@@ -274,18 +277,15 @@ with tab_update:
                 step=50.0
             )
 
+        codes = agency_codes()
         upd_agency = st.selectbox(
             "Agence",
-            run_query(sql_agences)["CodA"].tolist(),
-            index=run_query(sql_agences)["CodA"].tolist().index(
-                row["TRAVEL_AGENCY_CodA"]
-            )
+            codes,
+            index=codes.index(row["TRAVEL_AGENCY_CodA"]) if row["TRAVEL_AGENCY_CodA"] in codes else 0
         )
 
         if st.button("💾 Mettre à jour", use_container_width=True):
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute(
+            shards.execute(
                 """
                 UPDATE BOOKING
                 SET StartDate=%s, EndDate=%s, Cost=%s, TRAVEL_AGENCY_CodA=%s
@@ -294,10 +294,9 @@ with tab_update:
                 (
                     upd_start, upd_end, upd_cost, upd_agency,
                     row["ROOM_CodR"], row["StartDate"]
-                )
+                ),
+                room=row["ROOM_CodR"]
             )
-            conn.commit()
-            conn.close()
             st.success("✔️ Réservation mise à jour")
             st.rerun()
 
@@ -305,78 +304,122 @@ with tab_update:
 with tab_delete:
     st.markdown("### 🗑️ Supprimer une réservation")
 
-    del_idx = st.selectbox(
-        "Réservation à supprimer",
-        bookings.index,
-        format_func=lambda i:
-            f"Chambre {bookings.loc[i,'ROOM_CodR']} | {bookings.loc[i,'StartDate']}"
-    )
-
-    del_row = bookings.loc[del_idx]
+    del_row = booking_picker("del")
 
-    if st.button("❌ Supprimer définitivement", type="primary", use_container_width=True):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
+    if del_row is not None and st.button("❌ Supprimer définitivement", type="primary", use_container_width=True):
+        shards.execute(
             """
             DELETE FROM BOOKING
             WHERE ROOM_CodR=%s AND StartDate=%s
             """,
-            (del_row["ROOM_CodR"], del_row["StartDate"])
+            (del_row["ROOM_CodR"], del_row["StartDate"]),
+            room=del_row["ROOM_CodR"]
         )
-        conn.commit()
-        conn.close()
         st.success("🧹 Réservation supprimée")
         st.rerun()
 
 st.divider()
 
 
-# ================= KPIs =================
-st.subheader("📌 Indicateurs clés")
-
-c1, c2, c3, c4 = st.columns(4)
-
-with c1:
-    st.metric("Réservations", len(df))
+# ================= KPIs & TABLE =================
+# The session's listing is loaded once, then only the bookings changed since its
+# watermark are fetched and merged, KPIs included (see deltas.py). One listing per
+# shard, combined by deltas.sync_all.
+def sync_listing(query, params, listing_key):
+    # (frame, kpis, version); the version changes only when the listing's rows do
+    listings = st.session_state.setdefault("_listings", {})
+    shard_listings = []
+    for shard in sorted(shards.DB_SHARDS):
+        key = f"{listing_key}@{shard}"
+        listing = listings.get(key)
+        if listing is None:
+            if len(listings) >= 4 * len(shards.DB_SHARDS):
+                listings.pop(next(iter(listings)))
+            listing = listings[key] = DeltaListing(
+                query, params, schemas.BOOKING, incremental=not include_archive, shard=shard
+            )
+        shard_listings.append(listing)
+    df, kpis = sync_all(shard_listings)
+    return df, kpis, (listing_key,) + tuple(listing.version for listing in shard_listings)
+
+
+# Live section: KPIs only. The table below is drawn by full runs, so a tick with no
+# change resends nothing large; when the listing did change, the tick reruns the page.
+@live_section
+def overview_section(query, params, listing_key):
+    try:
+        df, kpis, version = sync_listing(query, params, listing_key)
+    except Exception as e:
+        show_error("Erreur lors du chargement des réservations", e)
+        return
+    if st.session_state.get("_listing_shown", version) != version:
+        st.rerun()
+    stale_badge(df)
 
-with c2:
-    st.metric("Chiffre d'affaires", f"{df['Cost'].sum():,.0f} DH")
+    st.subheader("📌 Indicateurs clés")
 
-with c3:
-    avg_duree = df['Duree'].mean()
-    st.metric("Durée moyenne", f"{0 if pd.isna(avg_duree) else avg_duree:.1f} jours")
+    c1, c2, c3, c4 = st.columns(4)
 
-with c4:
-    avg_cout_journalier = df['Cout_Journalier'].mean()
-    st.metric("Coût moyen / jour", f"{0 if pd.isna(avg_cout_journalier) else avg_cout_journalier:.0f} DH")
+    with c1:
+        st.metric("Réservations", kpis["reservations"])
 
-# ================= TABLE =================
-st.divider()
-st.subheader("📋 Détails des réservations")
+    with c2:
+        st.metric("Chiffre d'affaires", f"{kpis['chiffre_affaires']:,.0f} DH")
 
-display_df = df.copy()
-display_df["Cost"] = display_df["Cost"].map(lambda x: f"{x:.0f} DH")
-display_df["Cout_Journalier"] = display_df["Cout_Journalier"].map(lambda x: f"{x:.0f} DH")
+    with c3:
+        avg_duree = kpis["duree_moyenne"]
+        st.metric("Durée moyenne", f"{avg_duree or 0:.1f} jours")
 
-display_df = display_df.rename(columns={
-    "StartDate": "Début",
-    "EndDate": "Fin",
-    "Duree": "Durée (jours)",
-    "Cost": "Coût total",
-    "Cout_Journalier": "Coût / jour",
-    "Floor": "Étage",
-    "SurfaceArea": "Superficie"
-})
+    with c4:
+        avg_cout_journalier = kpis["cout_journalier_moyen"]
+        st.metric("Coût moyen / jour", f"{avg_cout_journalier or 0:.0f} DH")
+
+
+try:
+    listing_df, _, listing_version = sync_listing(query, params, listing_key)
+except Exception:
+    # Reported by the live section above
+    listing_df = None
+else:
+    st.session_state["_listing_shown"] = listing_version
+
+overview_section(query, params, listing_key)
+
+# ---------- TABLE ----------
+if listing_df is not None:
+    st.divider()
+    st.subheader("📋 Détails des réservations")
+
+    # Amounts are formatted by the grid, not row by row
+    display_df = listing_df.drop(columns="RowKey").rename(columns={
+        "StartDate": "Début",
+        "EndDate": "Fin",
+        "Duree": "Durée (jours)",
+        "Cost": "Coût total",
+        "Cout_Journalier": "Coût / jour",
+        "Floor": "Étage",
+        "SurfaceArea": "Superficie"
+    })
 
-st.dataframe(display_df, use_container_width=True, height=420)
+    st.dataframe(
+        display_df,
+        use_container_width=True,
+        height=420,
+        column_config={
+            "Début": st.column_config.DateColumn(format="YYYY-MM-DD"),
+            "Fin": st.column_config.DateColumn(format="YYYY-MM-DD"),
+            "Coût total": st.column_config.NumberColumn(format="%.0f DH"),
+            "Coût / jour": st.column_config.NumberColumn(format="%.0f DH"),
+        }
+    )
 
 # ================= ANALYTICS =================
+set_context(section="analytics")
 st.divider()
 st.subheader("📈 Analyse avancée")
 
-tab1, tab2, tab3 = st.tabs(
-    ["📆 Évolution mensuelle", "💎 Chambres premium", "🏢 Performance par agence"]
+tab1, tab2, tab3, tab4 = st.tabs(
+    ["📆 Évolution mensuelle", "💎 Chambres premium", "🏢 Performance par agence", "💶 Revenus par nuit"]
 )
 
 # Prepare WHERE clause for analytics tabs
@@ -392,9 +435,28 @@ if date_fin:
     analytics_where += " AND B.EndDate <= %s"
     analytics_params.append(date_fin)
 
+# Snapshot mode runs the same aggregates in DuckDB over a Parquet copy of BOOKING
+snapshot_mode = analytics_source == "Instantané"
+snapshot_filters = dict(
+    agence=None if agence_filtre == "Toutes" else agence_filtre,
+    date_debut=date_debut,
+    date_fin=date_fin,
+    include_archive=include_archive,
+)
+if snapshot_mode:
+    age = analytics.snapshot_age()
+    st.caption("Instantané en cours de création…" if age is None else f"Instantané mis à jour il y a {age:.0f} s")
+
 # ---------- TAB 1 ----------
 with tab1:
-    monthly = run_query(sql_monthly(analytics_where), analytics_params)
+    if snapshot_mode:
+        monthly = analytics.monthly(**snapshot_filters)
+    else:
+        monthly = shards.query(
+            sql_monthly(analytics_where, source), analytics_params, ttl=60,
+            by=["YM"], agg={"Somme_Journalier": "sum", "Nb_Journalier": "sum"}, order="YM"
+        )
+        monthly["Cout_Journalier_Moyen"] = monthly["Somme_Journalier"] / monthly["Nb_Journalier"].where(monthly["Nb_Journalier"] > 0)
 
     monthly["Mois"] = monthly["YM"].apply(
         lambda x: calendar.month_name[int(x.split("-")[1])].capitalize()
@@ -413,7 +475,15 @@ with tab1:
 
 # ---------- TAB 2 ----------
 with tab2:
-    premium = run_query(sql_premium(analytics_where), analytics_params)
+    # Unfiltered live ranking over the hot years comes from the MV_PREMIUM_ROOMS summary table
+    if snapshot_mode:
+        premium = analytics.premium(**snapshot_filters)
+    elif analytics_params or include_archive:
+        premium = shards.query(
+            sql_premium(analytics_where, source), analytics_params, ttl=60, order="Cout_Moyen", ascending=False
+        )
+    else:
+        premium = read_view("premium_rooms").sort_values("Cout_Moyen", ascending=False)
 
     premium["Cout_Moyen"] = premium["Cout_Moyen"].map(lambda x: f"{x:.0f} DH")
 
@@ -432,7 +502,13 @@ with tab2:
 
 # ---------- TAB 3 ----------
 with tab3:
-    agency_perf = run_query(sql_agency_perf(analytics_where), analytics_params)
+    if snapshot_mode:
+        agency_perf = analytics.agency_perf(**snapshot_filters)
+    else:
+        agency_perf = shards.query(
+            sql_agency_perf(analytics_where, source), analytics_params, ttl=60,
+            by=["Agence"], agg={"Nb_Reservations": "sum", "CA": "sum"}, order="CA", ascending=False
+        )
 
     agency_perf["CA"] = agency_perf["CA"].map(lambda x: f"{x:.0f} DH")
 
@@ -443,6 +519,50 @@ with tab3:
         height=350
     )
 
+# ---------- TAB 4 ----------
+with tab4:
+    # Per-night figures from the snapshot: a stay counts in every day/week/month it covers
+    st.caption("Chaque nuit est comptée dans sa propre période : les séjours à cheval sur deux mois sont répartis")
+    r1, r2, r3 = st.columns(3)
+    with r1:
+        grain = st.radio("Période", revenue.GRAINS, index=2, horizontal=True)
+    with r2:
+        by_label = st.selectbox("Détail", ["Aucun", "Type de chambre", "Agence"])
+    with r3:
+        metric = st.selectbox("Indicateur", ["RevPAR", "ADR", "Occupation", "CA"])
+    by = {"Aucun": None, "Type de chambre": "type", "Agence": "agence"}[by_label]
+
+    nightly = revenue.metrics(grain=grain, by=by, **snapshot_filters)
+    if nightly.empty:
+        st.info("Aucune nuit réservée sur cette période")
+    else:
+        encoding = dict(
+            x=alt.X("Periode:O" if grain == "mois" else "Periode:T", title=""),
+            y=alt.Y(f"{metric}:Q", title=metric),
+            tooltip=list(nightly.columns),
+        )
+        if by:
+            encoding["color"] = alt.Color(f"{revenue.DIMENSIONS[by]}:N")
+        chart = alt.Chart(nightly).mark_line(point=grain != "jour").encode(**encoding).properties(height=350)
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(
+            nightly,
+            use_container_width=True,
+            hide_index=True,
+            height=350,
+            column_config={
+                "CA": st.column_config.NumberColumn(format="%.0f DH"),
+                "ADR": st.column_config.NumberColumn(format="%.0f DH"),
+                "RevPAR": st.column_config.NumberColumn(format="%.0f DH"),
+                "Occupation": st.column_config.ProgressColumn(format="%.2f", min_value=0, max_value=1),
+            }
+        )
+
+# ---------- ARCHIVE ----------
+if include_archive:
+    with st.expander("🗄️ Historique archivé par année"):
+        st.dataframe(archive_summary(), use_container_width=True, hide_index=True)
+
 # ================= FOOTER =================
 st.markdown(
     "<div style='text-align:center; opacity:0.6; margin-top:40px'>"
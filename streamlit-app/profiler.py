@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import hmac
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+import db
+import utils
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# PROFILE=1 profiles every page run; otherwise ?profile=<PROFILE_TOKEN> profiles one run
+PROFILE_ENABLED = os.environ.get("PROFILE", "0") == "1"
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, ".cache", "profiles"))
+# A run longer than this is cut short
+PROFILE_MAX_SECONDS = 120
+
+logger = logging.getLogger(__name__)
+
+# Leaf frame path fragment -> category of the summary table, first match wins
+CATEGORIES = (
+    ("mysql" + os.sep + "connector", "SQL"),
+    (os.path.join("pandas", "io", "sql"), "SQL"),
+    ("matplotlib", "matplotlib"),
+    ("altair", "altair"),
+    ("pyarrow", "pyarrow"),
+    ("duckdb", "duckdb"),
+    ("streamlit", "Streamlit"),
+    ("pandas", "pandas"),
+    ("numpy", "pandas"),
+)
+
+_reports = deque(maxlen=20)
+_reports_lock = threading.Lock()
+
+
+def is_admin():
+    if PROFILE_ENABLED:
+        return True
+    if not PROFILE_TOKEN:
+        return False
+    import streamlit as st
+    try:
+        token = st.query_params.get("profile", "")
+    except Exception:
+        return False
+    return hmac.compare_digest(str(token), PROFILE_TOKEN)
+
+
+def maybe_start(page, script_file):
+    # Cheap when disabled: one env check, plus a query parameter lookup if a token is set
+    if not (PROFILE_ENABLED or PROFILE_TOKEN) or not is_admin():
+        return None
+    sampler = _Sampler(page, threading.get_ident(), script_file)
+    sampler.start()
+    return sampler
+
+
+def _category(filename):
+    for fragment, name in CATEGORIES:
+        if fragment in filename:
+            return name
+    return "application"
+
+
+def _label(code):
+    filename = code.co_filename
+    if filename.startswith(BASE_DIR):
+        filename = os.path.relpath(filename, BASE_DIR)
+    else:
+        # Library frames: keep the path from the package directory down
+        parts = filename.split(os.sep)
+        for anchor in ("site-packages", "dist-packages", "lib"):
+            if anchor in parts:
+                filename = os.sep.join(parts[parts.index(anchor) + 1:])
+                break
+    return f"{code.co_name} ({filename})"
+
+
+class _Sampler(threading.Thread):
+    # Samples one script thread's stack until the page script leaves it
+
+    def __init__(self, page, thread_id, script_file):
+        super().__init__(name=f"profiler-{page}", daemon=True)
+        self.page = page
+        self.thread_id = thread_id
+        self.script_file = script_file
+        # (section, query id, stack tuple) -> seconds
+        self.samples = Counter()
+        self.categories = Counter()
+        self.started = time.time()
+
+    def _stack(self, frame):
+        stack, query, in_script = [], None, False
+        while frame is not None:
+            code = frame.f_code
+            if code is db._read.__code__ and query is None:
+                query = db.query_id(frame.f_locals.get("sql", ""))
+            stack.append(code)
+            if code.co_filename == self.script_file:
+                in_script = True
+                break
+            frame = frame.f_back
+        return stack, query, in_script
+
+    def run(self):
+        last = time.perf_counter()
+        deadline = last + PROFILE_MAX_SECONDS
+        while True:
+            time.sleep(PROFILE_INTERVAL)
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or now > deadline:
+                break
+            stack, query, in_script = self._stack(frame)
+            del frame
+            if not in_script:
+                # Started from inside the script: once it is off the stack, the run is over
+                break
+            section = utils.thread_context(self.thread_id).get("section") or "(page)"
+            labels = tuple(_label(code) for code in reversed(stack))
+            self.samples[(section, query, labels)] += elapsed
+            self.categories[_category(stack[0].co_filename)] += elapsed
+        try:
+            self._save()
+        except Exception as e:
+            logger.warning("profile export failed: %s", e)
+
+    def _save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        base = os.path.join(PROFILE_DIR, f"{self.page}-{stamp}")
+
+        # Section and query become the two outermost frames of every stack
+        def full_stack(section, query, labels):
+            return (f"section: {section}",) + ((f"query: {query}",) if query else ()) + labels
+
+        with open(f"{base}.collapsed.txt", "w", encoding="utf-8") as f:
+            for (section, query, labels), seconds in self.samples.items():
+                stack = ";".join(full_stack(section, query, labels))
+                f.write(f"{stack} {max(1, round(seconds * 1e6))}\n")
+
+        frames, index, samples, weights = [], {}, [], []
+        for (section, query, labels), seconds in self.samples.items():
+            row = []
+            for name in full_stack(section, query, labels):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                row.append(index[name])
+            samples.append(row)
+            weights.append(round(seconds * 1000, 3))
+        total_ms = round(sum(weights), 3)
+        with open(f"{base}.speedscope.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": f"{self.page} {stamp}",
+                "exporter": "hotel-streamlit-profiler",
+                "shared": {"frames": frames},
+                "profiles": [{
+                    "type": "sampled",
+                    "name": self.page,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": total_ms,
+                    "samples": samples,
+                    "weights": weights,
+                }],
+            }, f)
+
+        by_section, by_query = Counter(), Counter()
+        for (section, query, _), seconds in self.samples.items():
+            by_section[section] += seconds
+            if query:
+                by_query[query] += seconds
+        with _reports_lock:
+            _reports.appendleft({
+                "page": self.page,
+                "started": stamp,
+                "total_ms": total_ms,
+                "files": [f"{base}.speedscope.json", f"{base}.collapsed.txt"],
+                "sections": _table(by_section, "section"),
+                "queries": _table(by_query, "query_id"),
+                "categories": _table(self.categories, "category"),
+            })
+        logger.info("profile of %s written to %s.*", self.page, base)
+
+
+def _table(counter, column):
+    total = sum(counter.values()) or 1
+    return [
+        {column: name, "ms": round(seconds * 1000, 1), "part": f"{seconds / total:.0%}"}
+        for name, seconds in counter.most_common()
+    ]
+
+
+def reports():
+    with _reports_lock:
+        return list(_reports)
@@ -0,0 +1,33 @@
+import os
+
+from db import run_query
+
+# Shared through the cache backend; writes and the change feed invalidate it earlier
+REFERENCE_TTL = int(os.environ.get("REFERENCE_TTL", 300))
+
+
+def agencies():
+    return run_query("SELECT CodA FROM TRAVEL_AGENCY ORDER BY CodA", ttl=REFERENCE_TTL)["CodA"].tolist()
+
+
+def amenities():
+    df = run_query(
+        "SELECT DISTINCT AMENITIES_Amenity FROM HAS_AMENITIES ORDER BY AMENITIES_Amenity",
+        ttl=REFERENCE_TTL,
+    )
+    return df["AMENITIES_Amenity"].tolist()
+
+
+def agency_cities():
+    df = run_query("""
+        SELECT DISTINCT c.Name AS ville
+        FROM CITY c
+        JOIN TRAVEL_AGENCY a ON a.City_Address = c.Name
+        ORDER BY c.Name
+    """, ttl=REFERENCE_TTL)
+    return df["ville"].tolist()
+
+
+def warm():
+    for loader in (agencies, amenities, agency_cities):
+        loader()
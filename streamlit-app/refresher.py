@@ -0,0 +1,222 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import cache
+import events
+import shards
+from archive import ALL_BOOKINGS
+from db import get_connection
+
+MV_REFRESH_ENABLED = os.environ.get("MV_REFRESH_ENABLED", "1") == "1"
+MV_REFRESH_INTERVAL = int(os.environ.get("MV_REFRESH_INTERVAL", 60))
+MV_REFRESH_JITTER = float(os.environ.get("MV_REFRESH_JITTER", 0.2))
+
+logger = logging.getLogger(__name__)
+
+# View name -> summary table, refresh interval (s) and the aggregate that fills it.
+# The aggregate's column order matches the summary table definition. All-time totals
+# include BOOKING_ARCHIVE; the premium ranking covers the hot years only.
+# Each shard refreshes its own summary tables; "merge" tells read_view how to add them
+# up (see shards.combine). Premium rows are per room, and a room lives on one shard.
+VIEWS = {
+    "agency_perf": {
+        "table": "MV_AGENCY_PERF",
+        "interval": MV_REFRESH_INTERVAL,
+        "query": f"""
+            SELECT
+                a.CodA AS agence,
+                COUNT(b.ROOM_CodR) AS total_reservations,
+                COALESCE(SUM(b.Cost), 0) AS chiffre_affaires
+            FROM TRAVEL_AGENCY a
+            LEFT JOIN {ALL_BOOKINGS} b ON a.CodA = b.TRAVEL_AGENCY_CodA
+            GROUP BY a.CodA
+        """,
+        "merge": {"by": ["agence"], "agg": {"total_reservations": "sum", "chiffre_affaires": "sum"}},
+    },
+    "premium_rooms": {
+        "table": "MV_PREMIUM_ROOMS",
+        "interval": MV_REFRESH_INTERVAL * 5,
+        "query": """
+            SELECT
+                DATE_FORMAT(B.StartDate, '%Y-%m') AS Mois,
+                B.ROOM_CodR,
+                R.Type,
+                R.Floor,
+                R.SurfaceArea,
+                AVG(B.Cost / NULLIF(DATEDIFF(B.EndDate, B.StartDate), 0)) AS Cout_Moyen
+            FROM BOOKING B
+            JOIN ROOM R ON B.ROOM_CodR = R.CodR
+            GROUP BY Mois, B.ROOM_CodR
+        """,
+    },
+    "dashboard_totals": {
+        "table": "MV_DASHBOARD_TOTALS",
+        "interval": MV_REFRESH_INTERVAL,
+        "query": f"""
+            SELECT
+                (SELECT COUNT(*) FROM ROOM) AS total_rooms,
+                (SELECT COUNT(*) FROM {ALL_BOOKINGS} b) AS total_bookings,
+                (SELECT COUNT(*) FROM TRAVEL_AGENCY) AS total_agencies,
+                (SELECT COALESCE(SUM(Cost), 0) FROM {ALL_BOOKINGS} b) AS revenue
+        """,
+        # Agencies are copied to every shard: count them once
+        "merge": {"agg": {"total_rooms": "sum", "total_bookings": "sum", "total_agencies": "max", "revenue": "sum"}},
+    },
+}
+
+_started = False
+_start_lock = threading.Lock()
+_local_locks = {name: threading.Lock() for name in VIEWS}
+_freshness = {"value": {}, "expires": 0.0}
+_refresh_requested = threading.Event()
+# Event-driven refreshes of a view are at least this far apart
+MV_MIN_REFRESH_GAP = float(os.environ.get("MV_MIN_REFRESH_GAP", 5))
+
+
+# ======================== REFRESH ========================
+
+def refresh_view(name):
+    # On every shard in turn; returns True if at least one shard was refreshed here
+    refreshed = False
+    for shard in sorted(shards.DB_SHARDS):
+        with shards.using(shard):
+            refreshed = _refresh_shard_view(name) or refreshed
+    return refreshed
+
+
+def _refresh_shard_view(name):
+    # Single flight: one refresh per view in this process (thread lock) and
+    # across processes (MySQL named lock). Returns False if someone else is on it.
+    view = VIEWS[name]
+    local = _local_locks[name]
+    if not local.acquire(blocking=False):
+        return False
+
+    try:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT GET_LOCK(%s, 0)", (f"mv_refresh_{name}",))
+            if cur.fetchone()[0] != 1:
+                return False
+
+            try:
+                # autocommit is off: both statements land in one transaction
+                start = time.perf_counter()
+                cur.execute(f"DELETE FROM {view['table']}")
+                cur.execute(f"INSERT INTO {view['table']} {view['query']}")
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                cur.execute(
+                    """
+                    INSERT INTO MV_FRESHNESS (ViewName, RefreshedAt, DurationMs)
+                    VALUES (%s, NOW(), %s)
+                    ON DUPLICATE KEY UPDATE RefreshedAt = VALUES(RefreshedAt), DurationMs = VALUES(DurationMs)
+                    """,
+                    (name, duration_ms),
+                )
+                conn.commit()
+                cache.invalidate_tables([view["table"]])
+                events.publish([view["table"]])
+                logger.info("refreshed %s in %d ms", name, duration_ms)
+                return True
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.execute("SELECT RELEASE_LOCK(%s)", (f"mv_refresh_{name}",))
+                cur.fetchone()
+        finally:
+            conn.close()
+    finally:
+        local.release()
+
+
+def _next_delay(interval):
+    return interval * (1 + random.uniform(-MV_REFRESH_JITTER, MV_REFRESH_JITTER))
+
+
+def request_refresh():
+    # Called by the change feed: refresh every view soon instead of waiting for its interval
+    _refresh_requested.set()
+
+
+def run_forever(stop=None):
+    # Start every view at a random offset so processes don't refresh in lockstep
+    due = {name: time.monotonic() + random.uniform(0, 5) for name in VIEWS}
+    last = {name: 0.0 for name in VIEWS}
+    while stop is None or not stop.is_set():
+        now = time.monotonic()
+        if _refresh_requested.is_set():
+            _refresh_requested.clear()
+            for name in VIEWS:
+                due[name] = min(due[name], max(now, last[name] + MV_MIN_REFRESH_GAP))
+        for name, view in VIEWS.items():
+            if now < due[name]:
+                continue
+            try:
+                refresh_view(name)
+            except Exception as e:
+                logger.warning("refresh %s failed: %s", name, e)
+            last[name] = time.monotonic()
+            due[name] = last[name] + _next_delay(view["interval"])
+        _refresh_requested.wait(max(0.5, min(due.values()) - time.monotonic()))
+
+
+def start():
+    global _started
+    if not MV_REFRESH_ENABLED:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=run_forever, name="mv-refresher", daemon=True).start()
+
+
+# ======================== READ SIDE ========================
+
+def freshness():
+    # ViewName -> refresh instant on the local monotonic clock, re-read at most every 5 s.
+    # Ages are computed by MySQL so app and database clocks don't need to agree.
+    if time.monotonic() < _freshness["expires"]:
+        return _freshness["value"]
+    try:
+        # A view is as old as its stalest shard
+        df = shards.query(
+            "SELECT ViewName, TIMESTAMPDIFF(SECOND, RefreshedAt, NOW()) AS age FROM MV_FRESHNESS",
+            by=["ViewName"], agg={"age": "max"},
+        )
+        now = time.monotonic()
+        value = {name: now - float(age) for name, age in zip(df["ViewName"], df["age"])}
+    except Exception:
+        value = {}
+    _freshness["value"] = value
+    _freshness["expires"] = time.monotonic() + 5
+    return value
+
+
+def data_age(names=None):
+    # Age in seconds of the stalest view, or None if nothing was refreshed yet
+    fresh = freshness()
+    stamps = [fresh[n] for n in (names or VIEWS) if n in fresh]
+    if not stamps:
+        return None
+    return max(0.0, time.monotonic() - min(stamps))
+
+
+def read_view(name, ttl=MV_REFRESH_INTERVAL):
+    # Reads the summary table (shared through the cache until the next refresh);
+    # until the first refresh lands, runs the aggregate live
+    view = VIEWS[name]
+    merge = view.get("merge", {})
+    if name in freshness():
+        return shards.query(f"SELECT * FROM {view['table']}", ttl=ttl, **merge)
+    return shards.query(view["query"], **merge)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_forever()
@@ -0,0 +1,227 @@
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+
+from mysql.connector import Error
+
+import db
+
+# Replays a statement log captured with DB_CAPTURE_FILE (see capture.py) against the
+# database named by DB_HOST / DB_PORT / DB_NAME, a test copy. Each captured session is
+# replayed in its original order on one connection; sessions are spread over
+# --concurrency workers by order of first appearance, so two runs of the same log issue
+# the same statements on the same workers. Statements keep their original spacing,
+# divided by --speed (0: back to back).
+# Latencies are raw statement times (no cache, scheduler or breaker), so two runs on
+# different schema or code versions compare the database side only:
+#   python replay.py run capture.jsonl --label avant --out avant.json
+#   python replay.py run capture.jsonl --label apres --out apres.json
+#   python replay.py compare avant.json apres.json
+
+
+def load(paths):
+    # Returns ({query id: sql}, statements sorted by capture time)
+    sql, statements = {}, []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # A capture cut mid-write leaves a partial last line
+                    continue
+                if item.get("k") == "sql":
+                    sql[item["id"]] = item["sql"]
+                elif item.get("k") == "q":
+                    statements.append(item)
+    statements = [s for s in statements if s["id"] in sql]
+    statements.sort(key=lambda s: (s["at"], s["sid"]))
+    return sql, statements
+
+
+def plan(statements, concurrency, reads_only=False):
+    # Worker index -> its statements in capture order
+    workers = [[] for _ in range(max(1, concurrency))]
+    assigned = {}
+    for statement in statements:
+        if reads_only and statement["w"]:
+            continue
+        worker = assigned.setdefault(statement["sid"], len(assigned) % len(workers))
+        workers[worker].append(statement)
+    return workers
+
+
+def _run_worker(statements, sql, origin, started, speed, results, lock):
+    conn = db.get_connection("primary")
+    try:
+        for statement in statements:
+            if speed:
+                delay = started + (statement["at"] - origin) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            lag = time.perf_counter() - (started + (statement["at"] - origin) / speed) if speed else 0.0
+            error = None
+            start = time.perf_counter()
+            try:
+                cur = conn.cursor()
+                cur.execute(sql[statement["id"]], statement["p"] or None)
+                if cur.with_rows:
+                    cur.fetchall()
+                if statement["w"]:
+                    conn.commit()
+                cur.close()
+            except Error as e:
+                error = str(e.errno or type(e).__name__)
+                try:
+                    conn.rollback()
+                except Error:
+                    conn.close()
+                    conn = db.get_connection("primary")
+            elapsed = time.perf_counter() - start
+            with lock:
+                entry = results[statement["id"]]
+                entry["latencies_ms"].append(round(elapsed * 1000, 3))
+                entry["captured_ms"].append(statement["ms"])
+                if error is not None:
+                    entry["errors"][error] = entry["errors"].get(error, 0) + 1
+                results["_lag"]["latencies_ms"].append(round(max(0.0, lag) * 1000, 3))
+    finally:
+        conn.close()
+
+
+def run(paths, label, speed=1.0, concurrency=8, reads_only=False, limit=None):
+    sql, statements = load(paths)
+    if limit:
+        statements = statements[:limit]
+    if not statements:
+        raise SystemExit("Journal vide : aucune requête à rejouer")
+    workers = plan(statements, concurrency, reads_only)
+    results = defaultdict(lambda: {"latencies_ms": [], "captured_ms": [], "errors": {}})
+    lock = threading.Lock()
+    origin = statements[0]["at"]
+    started = time.perf_counter() + 0.5
+    threads = [
+        threading.Thread(target=_run_worker, args=(work, sql, origin, started, speed, results, lock),
+                         name=f"replay-{i}", daemon=True)
+        for i, work in enumerate(workers) if work
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lag = results.pop("_lag", {"latencies_ms": []})
+    return {
+        "label": label,
+        "logs": list(paths),
+        "database": f"{db.DB_HOST}:{db.DB_PORT}/{db.DB_NAME}",
+        "speed": speed,
+        "concurrency": concurrency,
+        "reads_only": reads_only,
+        "duree_s": round(time.perf_counter() - started, 2),
+        "retard_p95_ms": _percentile(sorted(lag["latencies_ms"]), 0.95),
+        "statements": {qid: dict(entry, sql=" ".join(sql[qid].split())[:120]) for qid, entry in results.items()},
+    }
+
+
+# ======================== COMPARISON ========================
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _profile(values):
+    values = sorted(values)
+    return {
+        "n": len(values),
+        "p50": _percentile(values, 0.50),
+        "p95": _percentile(values, 0.95),
+        "p99": _percentile(values, 0.99),
+    }
+
+
+def _change(a, b):
+    return None if not a or b is None else round((b - a) / a * 100, 1)
+
+
+def compare(before, after):
+    # One row per statement present in both runs, plus "TOUT" over every statement;
+    # the largest p95 regressions first
+    rows = []
+    common = sorted(set(before["statements"]) & set(after["statements"]))
+    pooled = ([], [])
+    for qid in common:
+        a = before["statements"][qid]["latencies_ms"]
+        b = after["statements"][qid]["latencies_ms"]
+        pooled[0].extend(a)
+        pooled[1].extend(b)
+        rows.append((qid, before["statements"][qid]["sql"], _profile(a), _profile(b),
+                     sum(after["statements"][qid]["errors"].values())))
+    rows.append(("TOUT", "", _profile(pooled[0]), _profile(pooled[1]),
+                 sum(sum(s["errors"].values()) for s in after["statements"].values())))
+    table = [{
+        "requete": qid,
+        "sql": text,
+        "n": b["n"],
+        "p50_avant": a["p50"], "p50_apres": b["p50"], "p50_%": _change(a["p50"], b["p50"]),
+        "p95_avant": a["p95"], "p95_apres": b["p95"], "p95_%": _change(a["p95"], b["p95"]),
+        "p99_avant": a["p99"], "p99_apres": b["p99"], "p99_%": _change(a["p99"], b["p99"]),
+        "erreurs_apres": errors,
+    } for qid, text, a, b, errors in rows]
+    table[:-1] = sorted(table[:-1], key=lambda r: -(r["p95_%"] or 0))
+    return table
+
+
+def _print_comparison(before, after, table):
+    print(f"{before['label']} → {after['label']} (latences en ms)")
+    print(f"{'requete':<12}{'n':>7}{'p50':>10}{'Δ%':>8}{'p95':>10}{'Δ%':>8}{'p99':>10}{'Δ%':>8}{'err':>6}  sql")
+    for row in table:
+        print(
+            f"{row['requete']:<12}{row['n']:>7}"
+            f"{row['p50_apres'] or 0:>10.2f}{row['p50_%'] or 0:>8.1f}"
+            f"{row['p95_apres'] or 0:>10.2f}{row['p95_%'] or 0:>8.1f}"
+            f"{row['p99_apres'] or 0:>10.2f}{row['p99_%'] or 0:>8.1f}"
+            f"{row['erreurs_apres']:>6}  {row['sql'][:60]}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rejeu d'un journal de requêtes capturé (DB_CAPTURE_FILE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="rejouer un ou plusieurs journaux")
+    run_cmd.add_argument("logs", nargs="+")
+    run_cmd.add_argument("--label", default="rejeu")
+    run_cmd.add_argument("--out", required=True, help="fichier de résultats (JSON)")
+    run_cmd.add_argument("--speed", type=float, default=1.0, help="1 : vitesse d'origine, 4 : quatre fois plus vite, 0 : sans attente")
+    run_cmd.add_argument("--concurrency", type=int, default=8, help="connexions simultanées")
+    run_cmd.add_argument("--reads-only", action="store_true", help="ignorer les écritures")
+    run_cmd.add_argument("--limit", type=int, help="ne rejouer que les N premières requêtes")
+
+    compare_cmd = commands.add_parser("compare", help="comparer deux rejeux")
+    compare_cmd.add_argument("before")
+    compare_cmd.add_argument("after")
+    compare_cmd.add_argument("--json", help="écrire la comparaison dans ce fichier")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run(args.logs, args.label, args.speed, args.concurrency, args.reads_only, args.limit)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        total = sum(len(s["latencies_ms"]) for s in report["statements"].values())
+        errors = sum(sum(s["errors"].values()) for s in report["statements"].values())
+        print(f"{total} requête(s) rejouée(s) en {report['duree_s']} s, {errors} erreur(s), "
+              f"retard p95 {report['retard_p95_ms'] or 0:.0f} ms -> {args.out}")
+    else:
+        with open(args.before, encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.after, encoding="utf-8") as f:
+            after = json.load(f)
+        table = compare(before, after)
+        _print_comparison(before, after, table)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(table, f, ensure_ascii=False, indent=2)
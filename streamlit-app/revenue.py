@@ -0,0 +1,214 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import shards
+import analytics
+from db import run_query
+
+# Stays are expanded into room-nights with array operations only (np.repeat plus
+# cumulative offsets), so a stay crossing a month boundary counts in each month it
+# covers. Nights are accumulated per day x room type and per day x agency; weeks,
+# months and the metrics are rolled up from those small grids.
+# Bookings stream from the analytics snapshot in batches of REVENUE_BATCH_ROWS, and each
+# batch is expanded at most REVENUE_CHUNK_NIGHTS nights at a time to bound memory.
+REVENUE_BATCH_ROWS = int(os.environ.get("REVENUE_BATCH_ROWS", 500_000))
+REVENUE_CHUNK_NIGHTS = int(os.environ.get("REVENUE_CHUNK_NIGHTS", 4_000_000))
+REVENUE_CACHE_SIZE = 8
+
+GRAINS = ("jour", "semaine", "mois")
+DIMENSIONS = {"type": "Type", "agence": "Agence"}
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _day(value):
+    # datetime.date / "YYYY-MM-DD" -> days since 1970-01-01
+    return int((np.datetime64(str(value)[:10], "D") - _EPOCH).astype(np.int64))
+
+
+def rooms_by_type():
+    df = shards.query(
+        "SELECT Type, COUNT(*) AS n FROM ROOM GROUP BY Type ORDER BY Type", ttl=300,
+        by=["Type"], agg={"n": "sum"}, order="Type",
+    )
+    return df["Type"].tolist(), df["n"].to_numpy(dtype=np.int64)
+
+
+def agency_codes():
+    df = run_query("SELECT CodA FROM TRAVEL_AGENCY ORDER BY CodA", ttl=300)
+    return df["CodA"].to_numpy(dtype=np.int64)
+
+
+def expand(first_night, nights):
+    # Stay i covers nights first_night[i] .. first_night[i] + nights[i] - 1:
+    # returns (stay index, night) for every room-night, without a Python loop
+    total = int(nights.sum())
+    owner = np.repeat(np.arange(len(nights)), nights)
+    offset = np.arange(total) - np.repeat(np.cumsum(nights) - nights, nights)
+    return owner, first_night[owner] + offset
+
+
+def _chunks(nights, limit=REVENUE_CHUNK_NIGHTS):
+    # Slices of consecutive stays holding about `limit` nights each
+    cum = np.cumsum(nights)
+    if not len(cum) or cum[-1] <= limit:
+        return [slice(0, len(nights))]
+    cuts = np.searchsorted(cum, np.arange(limit, cum[-1], limit), side="right")
+    bounds = [0] + sorted(set(cuts.tolist()) - {0, len(nights)}) + [len(nights)]
+    return [slice(a, b) for a, b in zip(bounds, bounds[1:])]
+
+
+class _Grid:
+    # Nights and revenue per (day, room type) and (day, agency) over [lo, hi)
+    def __init__(self, lo, hi, n_types, n_agencies):
+        self.lo, self.hi = lo, hi
+        self.n_types, self.n_agencies = n_types, n_agencies
+        days = hi - lo
+        self.type_nights = np.zeros(days * n_types, dtype=np.int64)
+        self.type_revenue = np.zeros(days * n_types)
+        self.agency_nights = np.zeros(days * n_agencies, dtype=np.int64)
+        self.agency_revenue = np.zeros(days * n_agencies)
+
+    def add(self, start, end, cost, type_idx, agency_idx):
+        stay = end - start
+        valid = stay > 0
+        # Nightly rate over the whole stay, then clip the stay to the grid's window
+        rate = np.divide(cost, stay, out=np.zeros(len(cost)), where=valid)
+        first = np.maximum(start, self.lo)
+        nights = np.where(valid, np.minimum(end, self.hi) - first, 0).clip(min=0)
+        for part in _chunks(nights):
+            owner, night = expand(first[part] - self.lo, nights[part])
+            weights = rate[part][owner]
+            keys = night * self.n_types + type_idx[part][owner]
+            self.type_nights += np.bincount(keys, minlength=self.type_nights.size)
+            self.type_revenue += np.bincount(keys, weights, minlength=self.type_revenue.size)
+            keys = night * self.n_agencies + agency_idx[part][owner]
+            self.agency_nights += np.bincount(keys, minlength=self.agency_nights.size)
+            self.agency_revenue += np.bincount(keys, weights, minlength=self.agency_revenue.size)
+
+
+def _bounds(where, params):
+    row = analytics.run_analytics(f"""
+        SELECT
+            date_diff('day', DATE '1970-01-01', MIN(start_d)) AS lo,
+            date_diff('day', DATE '1970-01-01', MAX(end_d)) AS hi
+        FROM bookings
+        {where}
+    """, params).iloc[0]
+    return (None, None) if pd.isna(row["lo"]) else (int(row["lo"]), int(row["hi"]))
+
+
+def _build(agence, date_debut, date_fin, include_archive, types, codes):
+    where = "WHERE 1=1" if include_archive else "WHERE NOT Archived"
+    params = []
+    if agence is not None:
+        where += " AND TRAVEL_AGENCY_CodA = ?"
+        params.append(int(agence))
+    lo, hi = _bounds(where, params)
+    if lo is None:
+        return None
+    lo = _day(date_debut) if date_debut else lo
+    hi = _day(date_fin) if date_fin else hi
+    if hi <= lo:
+        return None
+    grid = _Grid(lo, hi, len(types) + 1, len(codes) + 1)
+
+    # Stays overlapping the window, not only those starting in it
+    reader = analytics.record_batches(f"""
+        SELECT
+            date_diff('day', DATE '1970-01-01', start_d) AS s,
+            date_diff('day', DATE '1970-01-01', end_d) AS e,
+            Cost AS c,
+            Type AS t,
+            TRAVEL_AGENCY_CodA AS a
+        FROM bookings
+        {where}
+          AND date_diff('day', DATE '1970-01-01', end_d) > ?
+          AND date_diff('day', DATE '1970-01-01', start_d) < ?
+    """, params + [lo, hi], REVENUE_BATCH_ROWS)
+    for batch in reader:
+        df = batch.to_pandas()
+        # Unknown types and agencies (-1) go to the trailing "autre" bucket
+        type_idx = pd.Categorical(df["t"], categories=types).codes.astype(np.int64)
+        agency_idx = pd.Categorical(df["a"], categories=codes).codes.astype(np.int64)
+        grid.add(
+            df["s"].to_numpy(np.int64), df["e"].to_numpy(np.int64), df["c"].to_numpy(np.float64),
+            np.where(type_idx < 0, len(types), type_idx), np.where(agency_idx < 0, len(codes), agency_idx),
+        )
+    return grid
+
+
+def _grid(agence, date_debut, date_fin, include_archive, types, codes):
+    key = (analytics.snapshot_version(), agence, str(date_debut), str(date_fin), include_archive,
+           tuple(types), tuple(codes.tolist()))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    grid = _build(agence, date_debut, date_fin, include_archive, types, codes)
+    with _cache_lock:
+        _cache[key] = grid
+        while len(_cache) > REVENUE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return grid
+
+
+def _period(days, grain):
+    dates = _EPOCH + days.astype("timedelta64[D]")
+    if grain == "mois":
+        return dates.astype("datetime64[M]").astype(str)
+    if grain == "semaine":
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        return (dates - ((days + 3) % 7).astype("timedelta64[D]")).astype(str)
+    return dates.astype(str)
+
+
+def metrics(grain="mois", by=None, agence=None, date_debut=None, date_fin=None, include_archive=False):
+    # Per period (and per room type or agency when `by` is set): room-nights sold, revenue,
+    # ADR = revenue / nights sold, occupancy and RevPAR over the rooms available.
+    # Availability is the current ROOM inventory; for agencies it is the whole hotel,
+    # so their occupancy reads as a share of capacity.
+    types, type_rooms = rooms_by_type()
+    codes = agency_codes()
+    grid = _grid(agence, date_debut, date_fin, include_archive, types, codes)
+    columns = ["Periode"] + ([DIMENSIONS[by]] if by else []) + ["Nuits", "CA", "ADR", "Occupation", "RevPAR"]
+    if grid is None:
+        return pd.DataFrame(columns=columns)
+
+    days = np.arange(grid.lo, grid.hi)
+    if by == "agence":
+        nights = grid.agency_nights.reshape(len(days), -1)
+        revenue = grid.agency_revenue.reshape(len(days), -1)
+        labels = codes.tolist() + ["autre"]
+        available = np.full(len(labels), type_rooms.sum())
+    else:
+        nights = grid.type_nights.reshape(len(days), -1)
+        revenue = grid.type_revenue.reshape(len(days), -1)
+        labels = types + ["autre"]
+        available = np.append(type_rooms, 0)
+        if by is None:
+            nights, revenue = nights.sum(axis=1, keepdims=True), revenue.sum(axis=1, keepdims=True)
+            labels, available = [None], np.array([type_rooms.sum()])
+
+    df = pd.DataFrame({
+        "Periode": np.repeat(_period(days, grain), len(labels)),
+        "dim": np.tile(np.arange(len(labels)), len(days)),
+        "Nuits": nights.ravel(),
+        "CA": revenue.ravel(),
+        "Disponibles": np.tile(available, len(days)),
+    })
+    df = df.groupby(["Periode", "dim"], sort=True, as_index=False).sum()
+    df = df[(df["Disponibles"] > 0) | (df["Nuits"] > 0)]
+    df["ADR"] = df["CA"] / df["Nuits"].where(df["Nuits"] > 0)
+    df["Occupation"] = df["Nuits"] / df["Disponibles"].where(df["Disponibles"] > 0)
+    df["RevPAR"] = df["CA"] / df["Disponibles"].where(df["Disponibles"] > 0)
+    if by:
+        df[DIMENSIONS[by]] = np.array(labels, dtype=object)[df["dim"].to_numpy()]
+    return df[columns].reset_index(drop=True)
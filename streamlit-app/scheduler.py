@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import threading
+from collections import deque
+
+# Concurrent statements per query class in this process. Beyond the limit, callers
+# queue in arrival order for up to SCHED_QUEUE_TIMEOUT seconds.
+LIMITS = {
+    "write": int(os.environ.get("SCHED_LIMIT_WRITE", 4)),
+    "point": int(os.environ.get("SCHED_LIMIT_POINT", 6)),
+    "listing": int(os.environ.get("SCHED_LIMIT_LISTING", 4)),
+    "analytics": int(os.environ.get("SCHED_LIMIT_ANALYTICS", 2)),
+}
+SCHED_QUEUE_TIMEOUT = float(os.environ.get("SCHED_QUEUE_TIMEOUT", 10))
+
+_WRITE_SQL = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|ALTER|DROP|TRUNCATE|CALL)\b", re.I)
+_ANALYTICS_SQL = re.compile(r"\bGROUP\s+BY\b|\bUNION\b|\b(SUM|AVG|BIT_XOR)\s*\(", re.I)
+_LIMIT_SQL = re.compile(r"\bLIMIT\s+(\d+|%s)\s*$", re.I)
+# LIMIT at or under this many rows makes a query a point lookup
+POINT_MAX_ROWS = 100
+
+
+class AdmissionTimeout(RuntimeError):
+    pass
+
+
+def classify(sql):
+    if _WRITE_SQL.match(sql):
+        return "write"
+    if _ANALYTICS_SQL.search(sql):
+        return "analytics"
+    m = _LIMIT_SQL.search(sql.strip())
+    if m and (m.group(1) == "%s" or int(m.group(1)) <= POINT_MAX_ROWS):
+        return "point"
+    return "listing"
+
+
+class _Gate:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.admitted = 0
+        self.timeouts = 0
+        self.coalesced = 0
+        self.waits = deque(maxlen=500)
+
+    def acquire(self, timeout):
+        # FIFO: a caller is admitted only once it heads the queue and a slot is free
+        start = time.monotonic()
+        ticket = object()
+        with self.cond:
+            self.queue.append(ticket)
+            try:
+                while self.queue[0] is not ticket or self.active >= self.limit:
+                    remaining = start + timeout - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise AdmissionTimeout(f"File d'attente {self.name} saturée ({len(self.queue)} requêtes)")
+                    self.cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                self.waits.append(time.monotonic() - start)
+            finally:
+                self.queue.remove(ticket)
+                self.cond.notify_all()
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            waits = sorted(self.waits)
+            return {
+                "classe": self.name,
+                "limite": self.limit,
+                "actives": self.active,
+                "en_attente": len(self.queue),
+                "admises": self.admitted,
+                "expirees": self.timeouts,
+                "mutualisees": self.coalesced,
+                "attente_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else None,
+                "attente_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else None,
+            }
+
+
+_gates = {name: _Gate(name, limit) for name, limit in LIMITS.items()}
+
+# key -> flight shared by identical in-flight reads
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+def _admitted(gate, call, timeout):
+    gate.acquire(timeout)
+    try:
+        return call()
+    finally:
+        gate.release()
+
+
+def _share(result):
+    # Every caller of a shared flight gets its own copy: pages mutate their frames
+    return result.copy() if hasattr(result, "copy") else result
+
+
+def run(qclass, call, key=None, timeout=SCHED_QUEUE_TIMEOUT):
+    # Runs call() within the class's concurrency limit. With a key, callers arriving
+    # while the same key is in flight wait for that execution instead of starting one.
+    gate = _gates[qclass]
+    if key is None:
+        return _admitted(gate, call, timeout)
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+        else:
+            flight.followers += 1
+
+    if not leader:
+        with gate.cond:
+            gate.coalesced += 1
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return _share(flight.result)
+
+    try:
+        flight.result = _admitted(gate, call, timeout)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+            shared = flight.followers > 0
+        flight.done.set()
+    return _share(flight.result) if shared else flight.result
+
+
+def stats():
+    return [gate.stats() for gate in _gates.values()]
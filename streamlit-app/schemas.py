@@ -0,0 +1,82 @@
+import threading
+from collections import deque
+
+import pandas as pd
+
+# Column -> target dtype for query results. "date" parses the varchar YYYY-MM-DD
+# columns once, vectorized, into datetime64[s] (the coarsest unit pandas supports).
+# Columns missing from a result are ignored, so one schema can serve several queries.
+
+BOOKING = {
+    "ROOM_CodR": "int32",
+    "Code_Chambre": "int32",
+    "StartDate": "date",
+    "EndDate": "date",
+    "Cost": "float64",
+    "Duree": "int16",
+    "Cout_Journalier": "float32",
+    "TRAVEL_AGENCY_CodA": "category",
+    "Code_Agence": "category",
+    "Type_Chambre": "category",
+    "Floor": "int16",
+    "SurfaceArea": "int16",
+}
+
+ROOM = {
+    "CodR": "int32",
+    "code": "int32",
+    "Floor": "int16",
+    "etage": "int16",
+    "SurfaceArea": "int16",
+    "superficie": "int16",
+    "Type": "category",
+    "type": "category",
+}
+
+AGENCY = {
+    "code_agence": "category",
+    "ville": "category",
+    "latitude": "float32",
+    "longitude": "float32",
+}
+
+_INTEGER = {"int16", "int32", "int64"}
+
+_report = deque(maxlen=50)
+_report_lock = threading.Lock()
+
+
+def _convert(col, dtype):
+    if dtype == "date":
+        return pd.to_datetime(col, format="%Y-%m-%d", errors="coerce").astype("datetime64[s]")
+    if dtype in _INTEGER:
+        col = pd.to_numeric(col, errors="coerce")
+        # Nullable integers keep NULLs instead of falling back to float64
+        return col.astype(dtype if not col.isna().any() else dtype.capitalize())
+    return col.astype(dtype)
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def apply_schema(df, schema, label=None):
+    before = memory_bytes(df)
+    for name, dtype in schema.items():
+        if name in df.columns:
+            df[name] = _convert(df[name], dtype)
+    after = memory_bytes(df)
+    df.attrs["memory_bytes"] = after
+    with _report_lock:
+        _report.append({
+            "query": label or ",".join(map(str, df.columns))[:60],
+            "rows": len(df),
+            "bytes_before": before,
+            "bytes_after": after,
+        })
+    return df
+
+
+def memory_report():
+    with _report_lock:
+        return list(_report)
@@ -0,0 +1,327 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Per-session memory accounting. Each Streamlit session keeps its own frames in
+# st.session_state (layout.live_data entries, the Réservations delta listings). A
+# sweeper measures them every SESSION_SWEEP_INTERVAL seconds and:
+#   - spills the frames of sessions idle for SESSION_IDLE_SECONDS to Parquet files,
+#     read back transparently on next access;
+#   - spills the largest frames of a session over SESSION_MEMORY_BUDGET_MB;
+#   - when the process RSS exceeds PROCESS_MEMORY_BUDGET_MB, evicts (drops) the frames
+#     of the least recently active sessions; their loaders fetch them again on demand.
+# The script thread reads and replaces its frames inside pinned(); the sweeper only swaps
+# a frame that is not pinned and is still the object it measured (compare-and-set), so a
+# newer frame is never overwritten by an older copy.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_SPILL_DIR = os.environ.get("SESSION_SPILL_DIR", os.path.join(BASE_DIR, ".cache", "sessions"))
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", 300))
+SESSION_MEMORY_BUDGET_MB = float(os.environ.get("SESSION_MEMORY_BUDGET_MB", 200))
+# 0: no process-wide limit
+PROCESS_MEMORY_BUDGET_MB = float(os.environ.get("PROCESS_MEMORY_BUDGET_MB", 0))
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", 30))
+# Frames under this size stay in memory: not worth a file
+SESSION_SPILL_MIN_BYTES = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+# session id -> {"state": weakref to the session's state, "lock", "page", "active"}
+_sessions = {}
+_lock = threading.Lock()
+_started = {"sweeper": False}
+_counters = {"spilled": 0, "restored": 0, "evicted": 0}
+
+
+class Spilled:
+    # Stand-in for a frame written to disk; load() returns an equal DataFrame
+    def __init__(self, path, attrs, nbytes):
+        self.path = path
+        self.attrs = attrs
+        self.nbytes = nbytes
+        # Frame loaded by restore(hold=True), dropped again by the next sweep
+        self.held = None
+
+    def load(self):
+        df = pd.read_parquet(self.path)
+        df.attrs.update(self.attrs)
+        with _lock:
+            _counters["restored"] += 1
+        return df
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _session_id():
+    from startup import _streamlit_session_id
+    return _streamlit_session_id()
+
+
+def touch(page):
+    # Called on every full rerun (start_page): registers the session and marks it active
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    with _lock:
+        entry = _sessions.get(ctx.session_id)
+        if entry is None or entry["state"]() is None:
+            # ctx.session_state is a per-run wrapper; the state it wraps lives as long as the session
+            state = getattr(ctx.session_state, "_state", ctx.session_state)
+            entry = _sessions[ctx.session_id] = {"state": weakref.ref(state), "lock": threading.RLock()}
+        entry["page"] = page
+        entry["active"] = time.monotonic()
+        if not _started["sweeper"]:
+            _started["sweeper"] = True
+            threading.Thread(target=_sweep_forever, name="session-sweeper", daemon=True).start()
+
+
+def restore(value, hold=False):
+    # hold: the caller leaves the stand-in in place (an idle session's live ticks); the
+    # loaded frame is kept on it until the next sweep so those ticks read the file once
+    if not isinstance(value, Spilled):
+        return value
+    if value.held is not None:
+        return value.held
+    df = value.load()
+    if hold:
+        value.held = df
+    return df
+
+
+def discard(value):
+    # Called once a restored frame has replaced its stand-in: the file is no longer read
+    if isinstance(value, Spilled):
+        value.discard()
+
+
+@contextmanager
+def pinned():
+    # Held by the script thread while it reads and replaces its session's frames
+    with _lock:
+        entry = _sessions.get(_session_id())
+    if entry is None:
+        yield
+        return
+    with entry["lock"]:
+        yield
+
+
+def idle(session_id=None):
+    with _lock:
+        entry = _sessions.get(session_id or _session_id())
+    return entry is not None and time.monotonic() - entry["active"] > SESSION_IDLE_SECONDS
+
+
+# ======================== MEASURING ========================
+
+def nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, Spilled):
+        return 0
+    return sys.getsizeof(value)
+
+
+class _Slot:
+    # One spillable frame in a session: a live_data entry or a delta listing
+    def __init__(self, name, get, set):
+        self.name = name
+        self.get = get
+        self.set = set
+
+
+def _set_live(entry, value):
+    # Without "data", live_data loads the entry again
+    if value is None:
+        entry.pop("data", None)
+    else:
+        entry["data"] = value
+
+
+def _slots(state):
+    slots = []
+    live = state["_live"] if "_live" in state else {}
+    for name, entry in list(live.items()):
+        slots.append(_Slot(f"live:{name}", lambda e=entry: e.get("data"), lambda v, e=entry: _set_live(e, v)))
+    listings = state["_listings"] if "_listings" in state else {}
+    for name, listing in list(listings.items()):
+        slots.append(_Slot(name, lambda l=listing: l.frame, lambda v, l=listing: setattr(l, "frame", v)))
+    return slots
+
+
+def _measure(state):
+    in_memory = on_disk = 0
+    for slot in _slots(state):
+        value = slot.get()
+        if isinstance(value, Spilled):
+            on_disk += value.nbytes
+        elif value is not None:
+            in_memory += nbytes(value)
+    return in_memory, on_disk
+
+
+def rss_bytes():
+    # Resident set size of this process (Linux /proc; peak RSS elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ======================== SPILLING / EVICTION ========================
+
+def _swap(entry, slot, value, replacement):
+    # Replaces value unless the script thread has the session pinned or has already
+    # replaced it; the script thread is never kept waiting
+    if not entry["lock"].acquire(blocking=False):
+        return False
+    try:
+        if slot.get() is not value:
+            return False
+        slot.set(replacement)
+        return True
+    finally:
+        entry["lock"].release()
+
+
+def _spill(session_id, entry, slot):
+    value = slot.get()
+    if not isinstance(value, pd.DataFrame):
+        return 0
+    size = nbytes(value)
+    folder = os.path.join(SESSION_SPILL_DIR, str(session_id))
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{abs(hash(slot.name)):x}-{time.time_ns()}.parquet")
+    value.to_parquet(path)
+    spilled = Spilled(path, dict(value.attrs), size)
+    if not _swap(entry, slot, value, spilled):
+        spilled.discard()
+        return 0
+    with _lock:
+        _counters["spilled"] += 1
+    return size
+
+
+def _evict(entry, slot):
+    # live_data reloads a missing entry; a listing without a frame reloads in full
+    value = slot.get()
+    if value is None or not _swap(entry, slot, value, None):
+        return 0
+    discard(value)
+    with _lock:
+        _counters["evicted"] += 1
+    return nbytes(value)
+
+
+def _release_held(state):
+    for slot in _slots(state):
+        value = slot.get()
+        if isinstance(value, Spilled):
+            value.held = None
+
+
+def _large_frames(state):
+    sized = [(nbytes(slot.get()), slot) for slot in _slots(state) if isinstance(slot.get(), pd.DataFrame)]
+    return sorted((pair for pair in sized if pair[0] >= SESSION_SPILL_MIN_BYTES), key=lambda p: p[0], reverse=True)
+
+
+def sweep():
+    now = time.monotonic()
+    with _lock:
+        sessions = list(_sessions.items())
+    budget = SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+    live = []
+    for session_id, entry in sessions:
+        state = entry["state"]()
+        if state is None:
+            # Session closed: forget it and its files
+            with _lock:
+                _sessions.pop(session_id, None)
+            shutil.rmtree(os.path.join(SESSION_SPILL_DIR, str(session_id)), ignore_errors=True)
+            continue
+        try:
+            _release_held(state)
+            in_memory, _ = _measure(state)
+            if now - entry["active"] > SESSION_IDLE_SECONDS:
+                for _, slot in _large_frames(state):
+                    in_memory -= _spill(session_id, entry, slot)
+            elif in_memory > budget:
+                for size, slot in _large_frames(state):
+                    if in_memory <= budget:
+                        break
+                    in_memory -= _spill(session_id, entry, slot)
+        except Exception as e:
+            logger.warning("session sweep failed for %s: %s", session_id, e)
+        live.append((entry, state))
+
+    if PROCESS_MEMORY_BUDGET_MB and rss_bytes() > PROCESS_MEMORY_BUDGET_MB * 1024 * 1024:
+        # Least recently active sessions first; RSS lags behind freed memory, so stop
+        # once the tracked frames freed cover the overshoot
+        overshoot = rss_bytes() - PROCESS_MEMORY_BUDGET_MB * 1024 * 1024
+        for entry, state in sorted(live, key=lambda pair: pair[0]["active"]):
+            for slot in _slots(state):
+                overshoot -= _evict(entry, slot)
+            if overshoot <= 0:
+                break
+        logger.warning("process over its memory budget: session frames evicted")
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            sweep()
+        except Exception as e:
+            logger.warning("session sweep failed: %s", e)
+
+
+# ======================== METRICS ========================
+
+def report():
+    now = time.monotonic()
+    with _lock:
+        sessions = list(_sessions.items())
+    rows = []
+    for session_id, entry in sessions:
+        state = entry["state"]()
+        if state is None:
+            continue
+        in_memory, on_disk = _measure(state)
+        rows.append({
+            "session": str(session_id)[:8],
+            "page": entry.get("page"),
+            "inactive_s": round(now - entry["active"]),
+            "memoire_mo": round(in_memory / 1024 / 1024, 2),
+            "disque_mo": round(on_disk / 1024 / 1024, 2),
+            "objets": len(_slots(state)),
+        })
+    return sorted(rows, key=lambda r: r["memoire_mo"], reverse=True)
+
+
+def process_stats():
+    rows = report()
+    with _lock:
+        counters = dict(_counters)
+    return {
+        "rss_mo": round(rss_bytes() / 1024 / 1024, 1),
+        "budget_processus_mo": PROCESS_MEMORY_BUDGET_MB or None,
+        "budget_session_mo": SESSION_MEMORY_BUDGET_MB,
+        "sessions": len(rows),
+        "sessions_inactives": sum(r["inactive_s"] > SESSION_IDLE_SECONDS for r in rows),
+        "frames_memoire_mo": round(sum(r["memoire_mo"] for r in rows), 2),
+        "frames_disque_mo": round(sum(r["disque_mo"] for r in rows), 2),
+        **counters,
+    }
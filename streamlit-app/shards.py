@@ -0,0 +1,324 @@
+import os
+import time
+import logging
+import argparse
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import db
+from db import get_connection, run_query
+
+# Multi-property layout: every MySQL instance (shard) runs the same schema. ROOM and
+# BOOKING rows live on the shard of their hotel (HOTEL.Shard); reference tables (CITY,
+# TRAVEL_AGENCY, HOTEL) are written to every shard so joins stay local. Room codes are
+# unique across the chain, so the existing keys (room, start date) stay valid.
+# Shard 1 is DB_HOST:DB_PORT and holds the authoritative HOTEL table; with DB_SHARDS unset
+# it is the only shard and nothing below adds a query or a thread.
+# DB_SHARDS: "2=host:port,3=host:port" (same credentials and schema as the primary)
+DB_SHARDS = {1: db.PRIMARY}
+for _entry in filter(None, (s.strip() for s in os.environ.get("DB_SHARDS", "").split(","))):
+    _shard, _, _endpoint = _entry.partition("=")
+    _host, _, _port = _endpoint.partition(":")
+    DB_SHARDS[int(_shard)] = (_host, int(_port or 3306))
+# Shards queried at once by a scatter-gather read
+SHARD_FANOUT = int(os.environ.get("SHARD_FANOUT", 8))
+SHARD_MAP_TTL = 60
+COPY_BATCH = 1000
+
+logger = logging.getLogger(__name__)
+
+_executor = {"pool": None}
+_executor_lock = threading.Lock()
+
+
+def enabled():
+    return len(DB_SHARDS) > 1
+
+
+def using(shard):
+    # Statements in this block go to the shard's instance (see db.on_endpoint)
+    return db.on_endpoint(DB_SHARDS[shard])
+
+
+# ======================== SHARD MAP ========================
+
+def hotels():
+    with using(1):
+        return run_query("SELECT CodH, Name, City_Address, Shard FROM HOTEL ORDER BY CodH", ttl=SHARD_MAP_TTL)
+
+
+def shard_of(hotel):
+    if not enabled():
+        return 1
+    df = hotels()
+    shard = df.loc[df["CodH"] == int(hotel), "Shard"]
+    return int(shard.iloc[0]) if len(shard) else 1
+
+
+def shard_of_room(room):
+    if not enabled():
+        return 1
+    rooms = query("SELECT CodR, HOTEL_CodH FROM ROOM", ttl=SHARD_MAP_TTL)
+    hotel = rooms.loc[rooms["CodR"] == int(room), "HOTEL_CodH"]
+    return shard_of(hotel.iloc[0]) if len(hotel) else 1
+
+
+# ======================== SCATTER-GATHER ========================
+
+def _pool():
+    with _executor_lock:
+        if _executor["pool"] is None:
+            _executor["pool"] = ThreadPoolExecutor(max_workers=SHARD_FANOUT, thread_name_prefix="shard")
+        return _executor["pool"]
+
+
+def _on(shard, call, session=None):
+    with using(shard), db.as_session(session):
+        return call()
+
+
+def scatter(call, shards=None):
+    # Runs call() once per shard, in parallel; returns {shard: result}. Each run keeps the
+    # caller's contextvars (log context, endpoint) and its session id, resolved here: the
+    # Streamlit session lives in the script thread's context, not in a contextvar, and is
+    # what read-your-writes and the cache bypass after a write go by.
+    # One failing shard fails the whole read: a chain-wide figure with a hotel missing
+    # would be wrong, not stale.
+    shards = sorted(DB_SHARDS) if shards is None else sorted(shards)
+    if len(shards) == 1:
+        return {shards[0]: _on(shards[0], call)}
+    session = db.session_id()
+    futures = {
+        shard: _pool().submit(contextvars.copy_context().run, _on, shard, call, session)
+        for shard in shards
+    }
+    return {shard: future.result() for shard, future in futures.items()}
+
+
+def concat(frames):
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    for column in frames[0].columns:
+        # concat turns categoricals with different categories into object
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+    for frame in frames:
+        if "stale_age" in frame.attrs:
+            df.attrs["stale_age"] = max(df.attrs.get("stale_age", 0), frame.attrs["stale_age"])
+    return df
+
+
+def gather(sql, params=None, shards=None, **kwargs):
+    # run_query on every shard, rows concatenated
+    return concat(scatter(lambda: run_query(sql, params, **kwargs), shards).values())
+
+
+def _bit_xor(values):
+    return int(np.bitwise_xor.reduce(values.dropna().astype(np.int64).to_numpy(), initial=0))
+
+
+# Merge functions for partial aggregates. AVG does not merge: select SUM and COUNT and
+# divide after the merge.
+AGGREGATES = {"sum": "sum", "min": "min", "max": "max", "bit_xor": _bit_xor}
+
+
+def combine(df, by=None, agg=None, order=None, ascending=True, limit=None):
+    # Merges per-shard results: re-aggregates `agg` ({column: "sum" | "min" | "max" |
+    # "bit_xor"}) over `by`, then sorts and cuts like the per-shard ORDER BY ... LIMIT
+    if agg:
+        funcs = {column: AGGREGATES[name] for column, name in agg.items()}
+        if by:
+            merged = df.groupby(by, as_index=False, sort=False, observed=True).agg(funcs)
+        else:
+            merged = pd.DataFrame({column: [df[column].agg(func)] for column, func in funcs.items()})
+        merged.attrs.update(df.attrs)
+        df = merged
+    if order:
+        df = df.sort_values(order, ascending=ascending, kind="stable")
+    if limit is not None:
+        df = df.head(limit)
+    return df.reset_index(drop=True)
+
+
+def query(sql, params=None, by=None, agg=None, order=None, ascending=True, limit=None, shards=None, **kwargs):
+    # Chain-wide run_query: `sql` runs on every shard (with its own GROUP BY / ORDER BY /
+    # LIMIT), the partial results are merged by combine()
+    df = gather(sql, params, shards, **kwargs)
+    if len(DB_SHARDS if shards is None else shards) == 1:
+        return df
+    return combine(df, by, agg, order, ascending, limit)
+
+
+# ======================== WRITES ========================
+
+def execute(sql, params=None, hotel=None, room=None):
+    # Write to the shard owning the hotel (or the room's hotel)
+    shard = shard_of(hotel) if hotel is not None else shard_of_room(room) if room is not None else 1
+    with using(shard):
+        return db.execute(sql, params)
+
+
+def broadcast(sql, params=None):
+    # Reference data (agencies, cities, hotels) is written to every shard, shard 1 first
+    rowcount = None
+    for shard in sorted(DB_SHARDS):
+        with using(shard):
+            count = db.execute(sql, params)
+        rowcount = count if rowcount is None else rowcount
+    return rowcount
+
+
+# ======================== REBALANCING ========================
+# Adding a node: declare it in DB_SHARDS (schema and reference tables loaded from
+# mysqlsampledatabase.sql), then move hotels onto it one at a time. A move:
+#   1. sets HOTEL.MovingTo everywhere: the BOOKING triggers then refuse writes to the
+#      hotel (an error for the writer, never a silently lost write);
+#   2. copies the hotel's rows to the target in one transaction, then switches HOTEL.Shard;
+#   3. deletes the rows left on any other shard, waits for every process's shard map to
+#      expire (SHARD_MAP_TTL: until then writes may still be routed to the old shard, where
+#      they are refused) and clears MovingTo.
+# Each step is idempotent and the state lives in HOTEL, so running --move again after a
+# crash finishes the move. Chain-wide reads count the hotel twice only between the copy
+# commit and the deletion of the source rows.
+# Writes already under way when MovingTo is set get this long to commit before the copy
+SHARD_MOVE_DRAIN = float(os.environ.get("SHARD_MOVE_DRAIN", 5))
+
+_HOTEL_TABLES = [
+    # (table, WHERE selecting the hotel's rows); copy in this order, delete in reverse
+    ("ROOM", "HOTEL_CodH = %s"),
+    ("HAS_AMENITIES", "ROOM_CodR IN (SELECT CodR FROM ROOM WHERE HOTEL_CodH = %s)"),
+    ("HAS_SPACES", "ROOM_CodR IN (SELECT CodR FROM ROOM WHERE HOTEL_CodH = %s)"),
+    ("BOOKING", "HOTEL_CodH = %s"),
+    ("BOOKING_ARCHIVE", "HOTEL_CodH = %s"),
+]
+
+
+def _mover(shard):
+    # Connection allowed to write a hotel being moved (see the BOOKING triggers)
+    with using(shard):
+        conn = get_connection("primary")
+    conn.cursor().execute("SET @hotel_move = 1")
+    return conn
+
+
+def _release(conn):
+    # Pooled connection: the flag must not follow it back into the pool
+    try:
+        conn.cursor().execute("SET @hotel_move = NULL")
+    finally:
+        conn.close()
+
+
+def _delete_rows(hotel, shard):
+    conn = _mover(shard)
+    try:
+        cur = conn.cursor()
+        for table, where in reversed(_HOTEL_TABLES):
+            cur.execute(f"DELETE FROM {table} WHERE {where}", (hotel,))
+        conn.commit()
+    finally:
+        _release(conn)
+
+
+def _copy(hotel, source, target):
+    # All tables in one target transaction: a failed copy leaves nothing behind
+    src = _mover(source)
+    dst = _mover(target)
+    copied = {}
+    try:
+        read = src.cursor()
+        write = dst.cursor()
+        for table, where in reversed(_HOTEL_TABLES):
+            # An attempt that stopped before the switch may have committed a copy
+            write.execute(f"DELETE FROM {table} WHERE {where}", (hotel,))
+        for table, where in _HOTEL_TABLES:
+            read.execute(f"SELECT * FROM {table} WHERE {where}", (hotel,))
+            columns = ", ".join(f"`{d[0]}`" for d in read.description)
+            placeholders = ", ".join(["%s"] * len(read.description))
+            copied[table] = 0
+            while True:
+                rows = read.fetchmany(COPY_BATCH)
+                if not rows:
+                    break
+                write.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+                copied[table] += len(rows)
+        dst.commit()
+    except Exception:
+        dst.rollback()
+        raise
+    finally:
+        _release(src)
+        _release(dst)
+    return copied
+
+
+def _move_state(hotel):
+    with using(1):
+        df = run_query("SELECT Shard, MovingTo FROM HOTEL WHERE CodH = %s", [int(hotel)], route="primary", qclass="point")
+    if df.empty:
+        raise ValueError(f"Hôtel inconnu : {hotel}")
+    moving = df.iloc[0]["MovingTo"]
+    return int(df.iloc[0]["Shard"]), None if pd.isna(moving) else int(moving)
+
+
+def move_hotel(hotel, target):
+    if target not in DB_SHARDS:
+        raise ValueError(f"Shard inconnu : {target}")
+    shard, moving = _move_state(hotel)
+    if moving is not None and moving != target:
+        raise ValueError(f"Hôtel {hotel} déjà en cours de déplacement vers le shard {moving}")
+    if shard == target and moving is None:
+        return {}
+    copied = {}
+    if moving is None:
+        broadcast("UPDATE HOTEL SET MovingTo = %s WHERE CodH = %s", (target, hotel))
+        time.sleep(SHARD_MOVE_DRAIN)
+    if shard != target:
+        copied = _copy(hotel, shard, target)
+        broadcast("UPDATE HOTEL SET Shard = %s WHERE CodH = %s", (target, hotel))
+    # Source rows, wherever an earlier attempt stopped
+    for other in sorted(DB_SHARDS):
+        if other != target:
+            _delete_rows(hotel, other)
+    time.sleep(SHARD_MAP_TTL)
+    broadcast("UPDATE HOTEL SET MovingTo = NULL WHERE CodH = %s", (hotel,))
+    logger.info("hotel %s moved from shard %s to %s: %s", hotel, shard, target, copied)
+    return copied
+
+
+def status():
+    # Rooms and hot bookings per hotel and shard, as found on each instance
+    parts = scatter(lambda: run_query("""
+        SELECT H.CodH, H.Name,
+               (SELECT COUNT(*) FROM ROOM R WHERE R.HOTEL_CodH = H.CodH) AS chambres,
+               (SELECT COUNT(*) FROM BOOKING B WHERE B.HOTEL_CodH = H.CodH) AS reservations
+        FROM HOTEL H
+        ORDER BY H.CodH
+    """, route="primary"))
+    frames = []
+    for shard, df in parts.items():
+        df = df[(df["chambres"] > 0) | (df["reservations"] > 0)].copy()
+        df.insert(0, "Shard", shard)
+        df.insert(1, "Instance", "{}:{}".format(*DB_SHARDS[shard]))
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    # python shards.py              -> rows per hotel and shard
+    # python shards.py --move 3 2   -> move hotel 3 onto shard 2
+    parser = argparse.ArgumentParser(description="Répartition des hôtels entre instances MySQL")
+    parser.add_argument("--move", nargs=2, type=int, metavar=("HOTEL", "SHARD"), help="déplacer un hôtel vers un shard")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.move:
+        for table, count in move_hotel(*args.move).items():
+            print(f"  {table:<16}{count:>8} ligne(s) copiée(s)")
+    print(status().to_string(index=False))
@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import types
+import logging
+import importlib
+import importlib.abc
+import threading
+
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_START = time.perf_counter()
+_lock = threading.Lock()
+_import_times = {}
+_page_timings = {}
+_prewarm_started = False
+
+
+# ======================== IMPORT PROFILING ========================
+
+def record_import(name, seconds):
+    with _lock:
+        _import_times[name] = _import_times.get(name, 0.0) + seconds
+
+
+def _timed(loader, name):
+    # The loader keeps its identity and everything else it offers (resources,
+    # get_code, is_package...): only this instance's exec_module is wrapped
+    exec_module = loader.exec_module
+
+    def timed_exec_module(module):
+        start = time.perf_counter()
+        try:
+            exec_module(module)
+        finally:
+            record_import(name, time.perf_counter() - start)
+
+    loader.exec_module = timed_exec_module
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    # Times top-level module execution (children included) while STARTUP_PROFILE=1
+    def find_spec(self, name, path, target=None):
+        if "." in name:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                # Built-in and frozen modules are loaded by a shared class: left alone
+                loader = spec.loader
+                if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+                    _timed(loader, name)
+                return spec
+        return None
+
+
+# Installed when this module is first imported: app.py and every page import it
+# right after streamlit, before the modules worth timing
+if STARTUP_PROFILE and not any(isinstance(f, _TimingFinder) for f in sys.meta_path):
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+# ======================== LAZY IMPORTS ========================
+
+def _use_agg_backend():
+    # Headless backend: skips GUI toolkit probing on first pyplot import
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+_BEFORE_IMPORT = {
+    "matplotlib.pyplot": _use_agg_backend,
+}
+
+
+class _LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            name = self.__name__
+            if name not in sys.modules and name in _BEFORE_IMPORT:
+                _BEFORE_IMPORT[name]()
+            start = time.perf_counter()
+            module = importlib.import_module(name)
+            record_import(name, time.perf_counter() - start)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name):
+    # Returns a stand-in that imports the real module on first attribute access
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
+
+
+# ======================== PAGE TIMINGS ========================
+
+def _streamlit_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else threading.get_ident()
+
+
+def start_page(page):
+    import utils
+    import profiler
+    utils.setup_logging()
+    utils.set_context(page=page, section=None)
+    # The caller is the page script: profiling covers this run until the script returns
+    profiler.maybe_start(page, sys._getframe(1).f_code.co_filename)
+    prewarm()
+    import db
+    db.set_session_provider(_streamlit_session_id)
+    import sessions
+    sessions.touch(page)
+    with _lock:
+        timing = _page_timings.setdefault(page, {"runs": 0})
+        timing["_start"] = time.perf_counter()
+        timing["runs"] += 1
+
+
+def mark_first_paint(page):
+    now = time.perf_counter()
+    with _lock:
+        timing = _page_timings.get(page)
+        if timing is None or "_start" not in timing:
+            return
+        elapsed = now - timing.pop("_start")
+        if "first_paint_cold" not in timing:
+            timing["first_paint_cold"] = elapsed
+            timing["since_process_start"] = now - _PROCESS_START
+            logger.info("first paint %s: %.3fs (process up %.3fs)", page, elapsed, now - _PROCESS_START)
+        timing["first_paint_last"] = elapsed
+
+
+def report():
+    with _lock:
+        imports = sorted(_import_times.items(), key=lambda kv: kv[1], reverse=True)
+        pages = {page: {k: v for k, v in t.items() if not k.startswith("_")} for page, t in _page_timings.items()}
+    return {
+        "imports": [{"module": name, "seconds": round(sec, 4)} for name, sec in imports],
+        "pages": [{"page": page, **t} for page, t in pages.items()],
+    }
+
+
+# ======================== PRE-WARM ========================
+
+def _prewarm():
+    # Imported here so that startup stays importable before the db layer
+    import db
+    import reference
+    import assets
+    import refresher
+    import changefeed
+    import archive
+
+    for name, task in (
+        ("pool", db.warm_pool),
+        ("reference", reference.warm),
+        ("assets", assets.warm_room_images),
+        ("refresher", refresher.start),
+        ("changefeed", changefeed.start),
+        ("archive", archive.start),
+    ):
+        start = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            logger.warning("prewarm %s failed: %s", name, e)
+        else:
+            logger.info("prewarm %s: %.3fs", name, time.perf_counter() - start)
+
+
+def prewarm():
+    global _prewarm_started
+    with _lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+    threading.Thread(target=_prewarm, name="prewarm", daemon=True).start()
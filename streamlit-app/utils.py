@@ -1,17 +1,165 @@
 import os
+import copy
 import json
+import time
+import queue
+import atexit
+import random
 import logging
-from datetime import datetime
+import threading
+import contextvars
+import logging.handlers
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.environ.get("LOG_FILE", os.path.join(BASE_DIR, "logs", "app.jsonl"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Size rotation by default; LOG_ROTATE_WHEN=midnight (or H, D...) switches to time rotation
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN", "")
+# Share of per-query events kept; warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
 
+# Fields copied from `extra=` into the JSON line when present
+EVENT_FIELDS = ("query_id", "qclass", "duration_ms", "rows", "route")
+
+_context = contextvars.ContextVar("log_context", default={})
+# Same context by thread id, for readers on other threads (profiler.py)
+_thread_contexts = {}
+_listener = {"listener": None, "dropped": 0}
+_setup_lock = threading.Lock()
+_clock = {"value": (None, "")}
 
 
 def load_config(config_file):
     with open(config_file, 'r') as f:
         return json.load(f)
 
-def setup_logging(log_file):
-    logging.basicConfig(filename=log_file, level=logging.INFO)
 
-def get_current_time():
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
\ No newline at end of file
+def get_current_time(timestamp=None):
+    # strftime runs at most once per second; other calls reuse the formatted string
+    second = int(time.time() if timestamp is None else timestamp)
+    cached_second, text = _clock["value"]
+    if cached_second != second:
+        text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        _clock["value"] = (second, text)
+    return text
+
+
+def set_context(**fields):
+    # page=..., section=...: attached to every record logged from this thread afterwards
+    context = {**_context.get(), **fields}
+    _context.set(context)
+    _thread_contexts[threading.get_ident()] = context
+
+
+def thread_context(thread_id):
+    return _thread_contexts.get(thread_id, {})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": f"{get_current_time(record.created)}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in ("page", "section") + EVENT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    # Runs in the caller's thread, before the record crosses the queue
+    def filter(self, record):
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class _SamplingFilter(logging.Filter):
+    # Records logged with extra={"sample": True} are kept with probability LOG_SAMPLE_RATE,
+    # and dropped outright while the queue is more than half full
+    def __init__(self, q):
+        super().__init__()
+        self.q = q
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        if self.q.qsize() > self.q.maxsize // 2:
+            return False
+        return LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Like QueueHandler.prepare (message merged, nothing unpicklable left), except
+        # the traceback stays in exc_text instead of being appended to msg
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _listener["dropped"] += 1
+
+
+def _file_handler(log_file):
+    os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(log_file=LOG_FILE, level=LOG_LEVEL):
+    # The calling thread only enqueues records; a listener thread formats and writes them.
+    # Safe to call on every rerun: the pipeline is installed once per process.
+    with _setup_lock:
+        if _listener["listener"] is not None:
+            return
+        q = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _DroppingQueueHandler(q)
+        handler.addFilter(_ContextFilter())
+        handler.addFilter(_SamplingFilter(q))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(handler)
+
+        listener = logging.handlers.QueueListener(q, _file_handler(log_file), respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        _listener["listener"] = listener
+
+
+def logging_stats():
+    listener = _listener["listener"]
+    return {
+        "actif": listener is not None,
+        "en_attente": listener.queue.qsize() if listener else 0,
+        "perdus": _listener["dropped"],
+        "echantillonnage": LOG_SAMPLE_RATE,
+    }